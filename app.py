@@ -1,27 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, Union
-import threading
+import base64
+import asyncio
+import json
+import logging
 import os
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from werkzeug.security import check_password_hash
 
-from models.database import (
-    init_db, get_user_messages, save_message, get_user_by_username,
-    create_user, add_task, get_user_tasks, update_task_status,
-    delete_task, get_task_stats
+from models.database import init_db
+from models.async_database import (
+    init_pool, close_pool, get_user_messages, get_user_messages_page,
+    iter_user_messages, import_messages, search_messages, save_message, get_user_by_username, insert_user,
+    add_task, get_user_tasks_with_stats, update_task_status, delete_task,
+    enqueue_training_job
 )
 from models.lstm_model import LSTMModelManager
+from models.training import TrainingScheduler
+from models.persistence import WeightWriter
+from models.warmup import ModelWarmer
+from models.task_cache import TaskListCache
+from models.auth import PasswordHasher, TokenCache, HashingOverloaded
+from models import metrics, profiler
+from models import diary_io
+from models.logs import setup_logging
 
 # ─── Config ───────────────────────────────────────────────────────────────────
+setup_logging()   # JSON lines via a background thread; see models/logs.py
+log = logging.getLogger("yourdiary.api")
+
 SECRET_KEY = os.getenv("SECRET_KEY", "yourdiary-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# "inline": train in this process on the training scheduler
+# "external": queue jobs in the DB for `python -m models.trainer` and hot-reload results
+TRAINING_MODE = os.getenv("TRAINING_MODE", "inline").lower()
+# Cached models are checked against the stored version in both modes, so
+# saves by other workers and weight-store rollbacks reach every process
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+# Keyset pagination for /api/diary/entries
+DEFAULT_ENTRIES_PAGE = 50
+MAX_ENTRIES_PAGE = 500
+# Ranked results are paged by offset — deep pages of a search are rarely useful
+MAX_SEARCH_PAGE = 100
+MAX_SEARCH_OFFSET = 1000
+
+# Users allowed to call /api/admin/* (comma-separated usernames; none by default)
+ADMIN_USERNAMES = {u.strip() for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u.strip()}
+
 ALLOWED_ORIGINS = os.getenv(
     "ALLOWED_ORIGINS",
     "http://localhost:5173,http://localhost:3000"
@@ -34,18 +68,27 @@ app = FastAPI(
     version="2.0.0"
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiler.TraceMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
 # ─── Auth Setup ───────────────────────────────────────────────────────────────
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
-model_manager = LSTMModelManager()
+password_hasher = PasswordHasher()
+token_cache = TokenCache()
+weight_writer = WeightWriter()
+model_manager = LSTMModelManager(weight_writer=weight_writer)
+training_scheduler = TrainingScheduler(model_manager.train_user_model_background)
+model_warmer = ModelWarmer(model_manager)
+task_cache = TaskListCache()
 
 
 # ─── Pydantic Schemas ─────────────────────────────────────────────────────────
@@ -88,32 +131,77 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Dependency that validates JWT and returns current user info."""
+    token = credentials.credentials
+    started = time.perf_counter()
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        # Tokens verified before (and not yet expired) skip signature checking
+        user = token_cache.get(token)
+        if user is not None:
+            return dict(user)
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("user_id")
         username: str = payload.get("username")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication token")
-        return {"user_id": user_id, "username": username}
+        user = {"user_id": user_id, "username": username}
+        token_cache.put(token, user, payload.get("exp"))
+        return dict(user)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    finally:
+        profiler.record("auth", time.perf_counter() - started)
+
+
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for operator-only routes: the user must be in ADMIN_USERNAMES."""
+    if current_user.get("username") not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
+async def _password_work(coro):
+    """Await a hashing call, turning an overloaded hasher into a 503."""
+    try:
+        return await coro
+    except HashingOverloaded:
+        raise HTTPException(status_code=503, detail="Too many sign-ins right now, please retry",
+                            headers={"Retry-After": "1"})
 
 
 # ─── Startup ──────────────────────────────────────────────────────────────────
 @app.on_event("startup")
 async def startup_event():
-    print("🌟 Starting YourDiary FastAPI")
+    log.info("starting YourDiary API")
     init_db()
+    await init_pool()
+    password_hasher.start()
     model_manager.load_base_model()
-    print("📝 YourDiary API ready at http://localhost:8000")
-    print("📖 API docs at http://localhost:8000/docs")
+    weight_writer.start()
+    # Preload recently active users' models in the background (see /api/ready)
+    model_warmer.start()
+    model_manager.start_reload_watcher(MODEL_RELOAD_INTERVAL)
+    if TRAINING_MODE != "external":
+        training_scheduler.start()
+    log.info("YourDiary API ready", extra={"training_mode": TRAINING_MODE, "docs": "/docs"})
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    model_warmer.stop()
+    # Let queued training finish so recent entries are not lost on redeploy
+    training_scheduler.shutdown(drain=True)
+    model_manager.stop_reload_watcher()
+    # Write out weights still buffered by the write-behind writer
+    weight_writer.shutdown()
+    password_hasher.shutdown()
+    await close_pool()
 
 
 # ─── Health Check ─────────────────────────────────────────────────────────────
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "YourDiary API v2.0 🌟",
         "docs": "/docs",
@@ -122,25 +210,50 @@ def root():
 
 @app.get("/api/health")
 def health():
-    return {"status": "healthy"}
+    training = training_scheduler.stats() if TRAINING_MODE != "external" else {"mode": "external"}
+    model = {"tier": model_manager.tier, "hidden_size": model_manager.hidden_size}
+    return {"status": "healthy", "model": model, "warmup": model_warmer.stats(),
+            "training": training, "weights": weight_writer.stats(),
+            "task_cache": task_cache.stats(), "auth": {"hashing": password_hasher.stats(),
+                                                      "token_cache": token_cache.stats()}}
+
+
+@app.get("/api/ready")
+def ready(warm: bool = False):
+    """
+    Readiness probe: the API serves requests as soon as it has started, while
+    models warm up in the background. warm=true answers 503 until warm-up
+    has finished, for deploys that should only take traffic with a warm cache.
+    """
+    warmup = model_warmer.stats()
+    if warm and not model_warmer.done:
+        return JSONResponse(status_code=503, content={"ready": False, "warmup": warmup})
+    return {"ready": True, "warmup": warmup}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # ─── Auth Routes ──────────────────────────────────────────────────────────────
 @app.post("/api/auth/signup", status_code=201)
-def signup(data: SignupRequest):
+async def signup(data: SignupRequest):
     if len(data.username) < 3:
         raise HTTPException(status_code=400, detail="Username must be at least 3 characters long")
     if len(data.password) < 4:
         raise HTTPException(status_code=400, detail="Password must be at least 4 characters long")
-    if not create_user(data.username, data.password):
+    hashed = await _password_work(password_hasher.hash(data.password))
+    if not await insert_user(data.username, hashed):
         raise HTTPException(status_code=409, detail="Username already exists. Please choose a different one.")
     return {"message": f"Welcome to YourDiary, {data.username}! Your personal AI assistant is ready."}
 
 
 @app.post("/api/auth/login", response_model=TokenResponse)
-def login(data: LoginRequest):
-    user = get_user_by_username(data.username)
-    if not user or not check_password_hash(user[2], data.password):
+async def login(data: LoginRequest):
+    user = await get_user_by_username(data.username)
+    if not user or not await _password_work(password_hasher.verify(user[2], data.password)):
         raise HTTPException(status_code=401, detail="Invalid username or password")
     token = create_access_token({"user_id": user[0], "username": data.username})
     return {"access_token": token, "token_type": "bearer", "username": data.username}
@@ -148,35 +261,134 @@ def login(data: LoginRequest):
 
 # ─── Diary Routes ─────────────────────────────────────────────────────────────
 @app.post("/api/diary/entry")
-def save_entry(data: DiaryEntryRequest, current_user: dict = Depends(get_current_user)):
+async def save_entry(data: DiaryEntryRequest, current_user: dict = Depends(get_current_user)):
     message = data.message.strip()
     if not message:
         raise HTTPException(status_code=400, detail="Diary entry cannot be empty")
 
-    save_message(current_user["user_id"], message)
-
-    recent_messages = get_user_messages(current_user["user_id"], limit=10)
-    message_texts = [msg[0] for msg in recent_messages]
-    total = len(get_user_messages(current_user["user_id"]))
+    total = await save_message(current_user["user_id"], message)
 
-    # Background AI training every 3 entries
+    # Background AI training every 3 entries (coalesced per user by the scheduler)
     if total % 3 == 0 and total > 0:
-        print(f"🎯 YourDiary: Training AI for user {current_user['user_id']} after {total} entries")
-        thread = threading.Thread(
-            target=model_manager.train_user_model_background,
-            args=(current_user["user_id"], message_texts)
-        )
-        thread.daemon = True
-        thread.start()
+        log.info("training queued", extra={"user_id": current_user["user_id"], "entries": total})
+        await queue_training(current_user["user_id"])
 
     return {"success": True, "total_entries": total}
 
 
+async def queue_training(user_id):
+    if TRAINING_MODE == "external":
+        await enqueue_training_job(user_id)
+    elif not training_scheduler.submit(user_id):
+        log.warning("training queue full, job skipped", extra={"user_id": user_id})
+
+
+@app.post("/api/diary/import")
+async def import_entries(
+    request: Request,
+    format: str = "ndjson",
+    train: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream NDJSON or CSV entries into the diary in batches."""
+    if format not in diary_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(diary_io.FORMATS)}")
+    user_id = current_user["user_id"]
+
+    imported, skipped, errors = 0, 0, []
+    async for rows, batch_errors in diary_io.iter_import_batches(request.stream(), format):
+        imported += await import_messages(user_id, rows)
+        skipped += len(batch_errors)
+        errors.extend(batch_errors[:diary_io.MAX_ERRORS_REPORTED - len(errors)])
+
+    # One coalesced training job for the whole import instead of one per 3 entries
+    if train and imported:
+        log.info("training queued after import", extra={"user_id": user_id, "imported": imported})
+        await queue_training(user_id)
+
+    return {"success": True, "imported": imported, "skipped": skipped, "errors": errors}
+
+
+@app.get("/api/diary/export")
+async def export_entries(format: str = "ndjson", current_user: dict = Depends(get_current_user)):
+    """Stream every entry (newest first) as NDJSON or CSV — re-importable as is."""
+    if format not in diary_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(diary_io.FORMATS)}")
+    user_id = current_user["user_id"]
+
+    async def lines():
+        yield diary_io.export_header(format)
+        async for _, message, timestamp in iter_user_messages(user_id):
+            yield diary_io.export_line(format, message, timestamp)
+
+    filename = f"yourdiary-{current_user['username']}.{format}"
+    return StreamingResponse(
+        lines(), media_type=diary_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def encode_entries_cursor(timestamp, entry_id):
+    """Opaque page cursor: base64url of [timestamp, id] of the last entry returned."""
+    raw = json.dumps([str(timestamp), entry_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_entries_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, entry_id = json.loads(raw)
+        return str(timestamp), int(entry_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/api/diary/entries")
-def get_entries(current_user: dict = Depends(get_current_user)):
-    messages = get_user_messages(current_user["user_id"])
+async def get_entries(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_ENTRIES_PAGE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    user_id = current_user["user_id"]
+    before = decode_entries_cursor(cursor) if cursor else None
+
+    # NDJSON: stream every entry (after the cursor) one line at a time
+    if format == "ndjson":
+        async def lines():
+            async for _, message, timestamp in iter_user_messages(user_id, before=before):
+                yield json.dumps({"message": message, "timestamp": str(timestamp)}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    # No paging parameters: full list, as before
+    if limit is None and before is None:
+        messages = await get_user_messages(user_id)
+        return {
+            "entries": [{"message": m[0], "timestamp": m[1]} for m in messages]
+        }
+
+    rows, next_key = await get_user_messages_page(user_id, limit or DEFAULT_ENTRIES_PAGE, before)
+    return {
+        "entries": [{"message": m, "timestamp": ts} for _, m, ts in rows],
+        "next_cursor": encode_entries_cursor(*next_key) if next_key else None
+    }
+
+
+@app.get("/api/diary/search")
+async def search_entries(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    current_user: dict = Depends(get_current_user)
+):
+    rows = await search_messages(current_user["user_id"], q, limit + 1, offset)
+    has_more = len(rows) > limit
     return {
-        "entries": [{"message": m[0], "timestamp": m[1]} for m in messages]
+        "results": [
+            {"id": i, "message": m, "timestamp": ts, "score": round(float(score), 4), "snippet": snippet}
+            for i, m, ts, score, snippet in rows[:limit]
+        ],
+        "next_offset": offset + limit if has_more and offset + limit <= MAX_SEARCH_OFFSET else None
     }
 
 
@@ -185,8 +397,8 @@ def get_suggestions(data: SuggestionRequest, current_user: dict = Depends(get_cu
     if len(data.text) < 2:
         return {"suggestions": []}
 
+    started = time.perf_counter()
     try:
-        print(f"🧠 YourDiary AI: Generating suggestions for user {current_user['user_id']}")
         user_model = model_manager.get_user_model(current_user["user_id"])
 
         if data.max_length == "sentence":
@@ -199,11 +411,18 @@ def get_suggestions(data: SuggestionRequest, current_user: dict = Depends(get_cu
                 data.text, num_suggestions=data.num_suggestions, max_length=max_len
             )
 
-        print(f"✅ Generated {len(suggestions)} suggestions")
+        # DEBUG only: at the default level this path does no logging work
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("suggestions generated", extra={
+                "user_id": current_user["user_id"],
+                "version": model_manager.user_versions.get(current_user["user_id"]),
+                "count": len(suggestions),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            })
         return {"suggestions": suggestions}
 
-    except Exception as e:
-        print(f"❌ AI Error: {e}")
+    except Exception:
+        log.exception("suggestion generation failed", extra={"user_id": current_user["user_id"]})
         fallback = [
             " feels meaningful to me",
             " brings me joy",
@@ -212,38 +431,96 @@ def get_suggestions(data: SuggestionRequest, current_user: dict = Depends(get_cu
         return {"suggestions": fallback[: data.num_suggestions]}
 
 
+@app.get("/api/diary/model")
+async def model_score(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """Cross-entropy / bits per char of the personal vs base model on recent entries."""
+    messages = await get_user_messages(current_user["user_id"], limit)
+    return await asyncio.to_thread(
+        model_manager.score_user_model, current_user["user_id"], [m for m, _ in messages]
+    )
+
+
 # ─── Task Routes ──────────────────────────────────────────────────────────────
-@app.get("/api/tasks")
-def get_tasks(current_user: dict = Depends(get_current_user)):
-    tasks = get_user_tasks(current_user["user_id"])
-    stats = get_task_stats(current_user["user_id"])
+async def _load_tasks(user_id):
+    tasks, stats = await get_user_tasks_with_stats(user_id)
     return {"tasks": tasks, "stats": stats}
 
 
+@app.get("/api/tasks")
+async def get_tasks(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    user_id = current_user["user_id"]
+    payload, etag = await task_cache.get_or_load(user_id, lambda: _load_tasks(user_id))
+
+    # Private: the list is per-user; clients must revalidate with If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return payload
+
+
 @app.post("/api/tasks", status_code=201)
-def create_task(data: TaskCreateRequest, current_user: dict = Depends(get_current_user)):
+async def create_task(data: TaskCreateRequest, current_user: dict = Depends(get_current_user)):
     if not data.title.strip():
         raise HTTPException(status_code=400, detail="Task title is required")
     due = data.due_date if data.due_date else None
-    if add_task(current_user["user_id"], data.title, data.description, data.priority, due):
+    if await add_task(current_user["user_id"], data.title, data.description, data.priority, due):
+        task_cache.invalidate(current_user["user_id"])
         return {"success": True}
     raise HTTPException(status_code=500, detail="Failed to create task")
 
 
 @app.patch("/api/tasks/{task_id}/status")
-def update_task(task_id: int, data: TaskStatusRequest, current_user: dict = Depends(get_current_user)):
-    if update_task_status(task_id, data.status, current_user["user_id"]):
+async def update_task(task_id: int, data: TaskStatusRequest, current_user: dict = Depends(get_current_user)):
+    if await update_task_status(task_id, data.status, current_user["user_id"]):
+        task_cache.invalidate(current_user["user_id"])
         return {"success": True}
     raise HTTPException(status_code=404, detail="Task not found")
 
 
 @app.delete("/api/tasks/{task_id}")
-def remove_task(task_id: int, current_user: dict = Depends(get_current_user)):
-    if delete_task(task_id, current_user["user_id"]):
+async def remove_task(task_id: int, current_user: dict = Depends(get_current_user)):
+    if await delete_task(task_id, current_user["user_id"]):
+        task_cache.invalidate(current_user["user_id"])
         return {"success": True}
     raise HTTPException(status_code=404, detail="Task not found")
 
 
+# ─── Admin Routes ─────────────────────────────────────────────────────────────
+@app.get("/api/admin/profile", response_class=Response)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=1, le=1000),
+    idle: bool = False,
+    admin: dict = Depends(require_admin),
+):
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks
+    (one "frame;frame;... count" line per stack) for flamegraph tools.
+    idle=true keeps threads that are only waiting (locks, queues, select).
+    """
+    sampler = profiler.Sampler(interval=interval_ms / 1000, include_idle=idle)
+    try:
+        sampler.start()
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    log.info("profile started", extra={"admin": admin["username"], "seconds": seconds})
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stacks = sampler.stop()
+    stats = sampler.stats()
+    log.info("profile finished", extra=stats)
+    return Response(stacks, media_type="text/plain; charset=utf-8", headers={
+        "X-Profile-Samples": str(stats["samples"]),
+        "X-Profile-Interval-Ms": str(stats["interval_ms"]),
+    })
+
+
 # ─── Run ──────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,2 @@
+# YourDiary benchmarks — run modules with `python -m benchmarks.<name>`;
+# `python -m benchmarks` runs the kernel microbenchmarks (kernels.py)
@@ -0,0 +1,5 @@
+"""Kernel microbenchmarks: `python -m benchmarks --help` (see benchmarks/kernels.py)."""
+
+from benchmarks.kernels import main
+
+main()
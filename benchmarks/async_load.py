@@ -0,0 +1,188 @@
+"""
+async_load.py — Concurrent throughput of the diary/task routes under uvicorn.
+
+Usage:
+  python -m benchmarks.async_load
+  python -m benchmarks.async_load --concurrency 16 64 256 --duration 10
+  python -m benchmarks.async_load --baseline HEAD~1    # compare with an older tree
+
+Starts the real app under uvicorn on a throwaway SQLite file (or DATABASE_URL
+if set), signs up a handful of users, then keeps `concurrency` requests in
+flight for `duration` seconds with a mix of:
+  GET /api/diary/entries?limit=20, GET /api/tasks, POST /api/diary/entry
+
+While the load runs, a probe requests GET / every 20 ms. That route does no
+I/O, so its latency shows how long requests wait for the event loop.
+
+With --baseline REF the same load runs against `git archive REF` first.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 20
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _export_tree(ref, dest):
+    """Extract `git archive ref` into dest (the working tree is left untouched)."""
+    archive = os.path.join(dest, "tree.tar")
+    subprocess.run(["git", "-C", ROOT, "archive", "-o", archive, ref], check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(dest)
+    os.remove(archive)
+    return dest
+
+
+def _start_server(source_dir, workdir, port):
+    env = dict(os.environ, SQLITE_PATH=os.path.join(workdir, "load.db"),
+               TRAINING_MODE="external", PYTHONPATH=source_dir)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=source_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def _login_users(client):
+    headers = []
+    for i in range(USERS):
+        creds = {"username": f"load_{i}", "password": "benchmark"}
+        await client.post("/api/auth/signup", json=creds)
+        token = (await client.post("/api/auth/login", json=creds)).json()["access_token"]
+        h = {"Authorization": f"Bearer {token}"}
+        for j in range(10):
+            await client.post("/api/diary/entry", json={"message": f"Seed entry {j}."}, headers=h)
+        await client.post("/api/tasks", json={"title": f"Task {i}"}, headers=h)
+        headers.append(h)
+    return headers
+
+
+async def _run_load(base_url, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        headers = await _login_users(client)
+        latencies = {"entries": [], "tasks": [], "entry": []}
+        probe = []
+        errors = [0]
+        stop_at = time.monotonic() + duration
+
+        async def worker(n):
+            rng = random.Random(n)
+            while time.monotonic() < stop_at:
+                h = rng.choice(headers)
+                kind = rng.choice(("entries", "entries", "tasks", "entry"))
+                t0 = time.perf_counter()
+                if kind == "entries":
+                    r = await client.get("/api/diary/entries", params={"limit": 20}, headers=h)
+                elif kind == "tasks":
+                    r = await client.get("/api/tasks", headers=h)
+                else:
+                    r = await client.post("/api/diary/entry", json={"message": "A load test entry."}, headers=h)
+                latencies[kind].append(time.perf_counter() - t0)
+                if r.status_code >= 400:
+                    errors[0] += 1
+
+        async def prober():
+            async with httpx.AsyncClient(base_url=base_url, timeout=60) as probe_client:
+                while time.monotonic() < stop_at:
+                    t0 = time.perf_counter()
+                    await probe_client.get("/")
+                    probe.append(time.perf_counter() - t0)
+                    await asyncio.sleep(0.02)
+
+        started = time.perf_counter()
+        await asyncio.gather(prober(), *(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "rps": total / elapsed,
+        "errors": errors[0],
+        "p50_ms": {k: _percentile(v, 50) * 1000 for k, v in latencies.items()},
+        "p99_ms": {k: _percentile(v, 99) * 1000 for k, v in latencies.items()},
+        "probe_p50_ms": _percentile(probe, 50) * 1000,
+        "probe_p99_ms": _percentile(probe, 99) * 1000,
+    }
+
+
+def run_target(label, source_dir, concurrency_levels, duration):
+    results = []
+    for concurrency in concurrency_levels:
+        with tempfile.TemporaryDirectory() as workdir:
+            port = _free_port()
+            proc = _start_server(source_dir, workdir, port)
+            try:
+                r = asyncio.run(_run_load(f"http://127.0.0.1:{port}", concurrency, duration))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+        r["label"] = label
+        results.append(r)
+        print(f"{label:<10}{concurrency:>6}{r['rps']:>10.0f}"
+              f"{r['p50_ms']['entries']:>10.1f}{r['p99_ms']['entries']:>10.1f}"
+              f"{r['p99_ms']['entry']:>10.1f}{r['probe_p50_ms']:>10.1f}{r['probe_p99_ms']:>10.1f}"
+              f"{r['errors']:>8}", flush=True)
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description="Concurrent load test of the diary/task routes")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256],
+                   help="In-flight request counts to test (default: 16 64 256)")
+    p.add_argument("--duration", type=float, default=8.0, help="Seconds per run (default: 8)")
+    p.add_argument("--baseline", type=str, default=None,
+                   help="Git ref to run the same load against first (e.g. HEAD~1)")
+    args = p.parse_args()
+
+    print(f"{'tree':<10}{'conc':>6}{'req/s':>10}{'list p50':>10}{'list p99':>10}"
+          f"{'save p99':>10}{'probe p50':>10}{'probe p99':>10}{'errors':>8}")
+    results = []
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tree:
+            results += run_target(args.baseline[:10], _export_tree(args.baseline, tree),
+                                  args.concurrency, args.duration)
+    results += run_target("current", ROOT, args.concurrency, args.duration)
+
+    if args.baseline:
+        print()
+        for old, new in zip(results[:len(args.concurrency)], results[len(args.concurrency):]):
+            print(f"concurrency {new['concurrency']:>4}: throughput x{new['rps'] / old['rps']:.2f}, "
+                  f"probe p99 {old['probe_p99_ms']:.1f} → {new['probe_p99_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
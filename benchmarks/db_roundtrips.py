@@ -0,0 +1,121 @@
+"""
+db_roundtrips.py — Request latency and DB round trips, pooled vs unpooled.
+
+Usage:
+  python -m benchmarks.db_roundtrips
+  python -m benchmarks.db_roundtrips --requests 1000
+  DATABASE_URL=postgresql://... python -m benchmarks.db_roundtrips
+
+Runs the real /api/diary/entry handler N times in two fresh processes:
+DB_POOL=0 (a new connection per DB call — the old behaviour) and DB_POOL=1
+(pooled / persistent connections). Uses a throwaway SQLite file unless
+DATABASE_URL is set. Reports latency percentiles, connections opened and,
+on SQLite, statements executed per request.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run_child(n_requests):
+    """Executed inside the subprocess — DB_POOL is already set in the env."""
+    from models import database as db
+
+    statements = [0]
+    if not db.DATABASE_URL:
+        connect = db._connect_sqlite
+
+        def _traced():
+            conn = connect()
+            conn.set_trace_callback(lambda _sql: statements.__setitem__(0, statements[0] + 1))
+            return conn
+
+        db._connect_sqlite = _traced
+
+    import app
+    username = f"bench_{os.getpid()}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_db()
+        db.insert_user(username, "!")    # never signs in, so no password hash
+    user_id = db.get_user_by_username(username)[0]
+    current_user = {"user_id": user_id, "username": username}
+
+    async def _requests():
+        out = []
+        for i in range(n_requests):
+            req = app.DiaryEntryRequest(message=f"Benchmark entry {i}: a quiet day, some reading.")
+            t0 = time.perf_counter()
+            await app.save_entry(req, current_user)
+            out.append(time.perf_counter() - t0)
+        return out
+
+    before = dict(db.DB_STATS)
+    base_statements = statements[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies = asyncio.run(_requests())
+
+    connects = db.DB_STATS["connects"] - before["connects"]
+    result = {
+        "pooling": db.POOLING,
+        "backend": "postgresql" if db.DATABASE_URL else "sqlite",
+        "requests": n_requests,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "connects_per_request": connects / n_requests,
+        "checkouts_per_request": (db.DB_STATS["checkouts"] - before["checkouts"]) / n_requests,
+    }
+    if not db.DATABASE_URL:
+        result["statements_per_request"] = (statements[0] - base_statements) / n_requests
+    print(json.dumps(result))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark DB round trips per request, pooled vs unpooled")
+    p.add_argument("--requests", type=int, default=300, help="Requests per mode (default: 300)")
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        run_child(args.requests)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pooling in ("0", "1"):
+            env = dict(os.environ, DB_POOL=pooling, SQLITE_PATH=os.path.join(tmp, f"bench_{pooling}.db"))
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.db_roundtrips", "--child", "--requests", str(args.requests)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'conn/req':>10}{'stmt/req':>10}")
+    for r in results:
+        mode = "pooled" if r["pooling"] else "unpooled"
+        stmts = r.get("statements_per_request")
+        print(f"{mode:<10}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['connects_per_request']:>10.2f}{(f'{stmts:.2f}' if stmts is not None else '-'):>10}")
+    before, after = results
+    if after["p50_ms"] > 0:
+        print(f"\np50 speed-up: {before['p50_ms'] / after['p50_ms']:.1f}x "
+              f"({before['backend']}, {args.requests} requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+import_export.py — Bulk import / export throughput vs one request per entry.
+
+Usage:
+  python -m benchmarks.import_export
+  python -m benchmarks.import_export --entries 100000 --baseline-sample 2000
+  DATABASE_URL=postgresql://... python -m benchmarks.import_export
+
+Against a throwaway SQLite file (unless DATABASE_URL is set), through the
+ASGI stack in-process:
+  1. POST /api/diary/entry for a sample of entries — the old way; the time
+     for the full count is extrapolated from the sample
+  2. POST /api/diary/import with the full count streamed as NDJSON
+  3. GET /api/diary/export of everything, streamed back
+Training is not started, so only the HTTP + database path is measured.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+
+def _entry(i):
+    return f"Entry {i}: slept well, walked to the river, wrote two pages and read a chapter."
+
+
+async def _bench(n_entries, sample):
+    import httpx
+    import app
+    from models import database as db
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_db()
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        headers = []
+        for name in ("bench_single", "bench_bulk"):
+            creds = {"username": name, "password": "benchmark"}
+            await client.post("/api/auth/signup", json=creds)
+            token = (await client.post("/api/auth/login", json=creds)).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+        single, bulk = headers
+
+        # 1. One request per entry
+        started = time.perf_counter()
+        for i in range(sample):
+            await client.post("/api/diary/entry", json={"message": _entry(i)}, headers=single)
+        per_entry = (time.perf_counter() - started) / sample
+
+        # 2. Streamed import
+        async def body():
+            chunk = []
+            for i in range(n_entries):
+                chunk.append(f'{{"message": "{_entry(i)}", "timestamp": "2024-01-01 00:00:00"}}\n')
+                if len(chunk) == 500:
+                    yield "".join(chunk).encode()
+                    chunk = []
+            if chunk:
+                yield "".join(chunk).encode()
+
+        started = time.perf_counter()
+        r = await client.post("/api/diary/import", params={"train": "false"}, content=body(), headers=bulk)
+        import_s = time.perf_counter() - started
+        imported = r.json()["imported"]
+
+        # 3. Streamed export
+        started = time.perf_counter()
+        exported, size = 0, 0
+        async with client.stream("GET", "/api/diary/export", headers=bulk) as resp:
+            async for line in resp.aiter_lines():
+                if line:
+                    exported += 1
+                    size += len(line) + 1
+        export_s = time.perf_counter() - started
+
+    return per_entry, imported, import_s, exported, size, export_s
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark bulk diary import/export")
+    p.add_argument("--entries", type=int, default=100_000, help="Entries to import/export (default: 100000)")
+    p.add_argument("--baseline-sample", type=int, default=1000,
+                   help="Entries posted one by one to estimate the old path (default: 1000)")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("SQLITE_PATH", os.path.join(tmp, "import.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            per_entry, imported, import_s, exported, size, export_s = asyncio.run(
+                _bench(args.entries, args.baseline_sample))
+
+    projected = per_entry * args.entries
+    print(f"{'path':<28}{'entries':>10}{'seconds':>10}{'entries/s':>12}")
+    print(f"{'POST /entry (projected)':<28}{args.entries:>10}{projected:>10.1f}{1 / per_entry:>12.0f}")
+    print(f"{'POST /import (ndjson)':<28}{imported:>10}{import_s:>10.1f}{imported / import_s:>12.0f}")
+    print(f"{'GET /export (ndjson)':<28}{exported:>10}{export_s:>10.1f}{exported / export_s:>12.0f}")
+    print(f"\nimport speed-up: {projected / import_s:.0f}x   export size: {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+kernels.py — Microbenchmarks of the LSTM, the sampler and model loading.
+
+Usage:
+  python -m benchmarks                                  # run every kernel, print a table
+  python -m benchmarks --json results.json              # also write machine-readable results
+  python -m benchmarks --compare baseline.json          # flag regressions against a saved run
+  python -m benchmarks --filter completions --repeat 9
+
+Kernels (all in-process, no server, no network):
+  encode                      OneHotEncoder.encode of a 500-char text
+  forw_prop[t=1|t=500]        training forward pass over 1 / 500 timesteps
+  back_prop[t=25]             backward pass + update after a 25-step forward pass
+  train_incremental           one call on a 300-char text (10 windows of 25)
+  get_completions[prompt=N]   3 suggestions of 20 chars after an N-char prompt
+  till_period[prompt=N]       3 suggestions up to the next period
+  save_weights_to_bytes / load_weights_from_bytes
+  get_user_model[cold|warm]   first access (weight store read on a temp SQLite
+                              file) vs cached
+
+Every sample reseeds numpy and random with --seed, so each one does the same
+work (sampling-dependent kernels generate the same text every time). Weights
+come from base_model.npz when present, otherwise from the seeded random init.
+
+Each kernel runs --repeat samples of enough calls to last --min-time seconds;
+the median per call is compared. With --compare, a kernel whose median is
+more than --threshold slower than the baseline is a regression and the exit
+status is 1.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("today morning walk coffee river work meeting friend dinner book rain sunny tired happy "
+         "garden music call family train city quiet evening run park lunch letter plan felt").split()
+PROMPT_LENGTHS = (10, 100, 500)
+
+
+def _diary_text(length, seed):
+    rng = random.Random(seed)
+    words, size = [], 0
+    while size < length:
+        sentence = " ".join(rng.choices(WORDS, k=rng.randint(5, 12))).capitalize() + "."
+        words.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(words)[:length]
+
+
+def _seed(seed):
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+# ─── Timing ───────────────────────────────────────────────────────────────────
+
+def measure(run, prep=None, repeat=7, min_time=0.2, seed=0):
+    """
+    Time run() per call. prep(), if given, runs untimed before every call.
+    Returns {median_s, min_s, mean_s, stdev_s, loops, repeat}.
+    """
+    def sample(loops):
+        _seed(seed)
+        total = 0.0
+        for _ in range(loops):
+            if prep is not None:
+                prep()
+            t0 = time.perf_counter()
+            run()
+            total += time.perf_counter() - t0
+        return total
+
+    loops = 1
+    while True:                        # calibrate like timeit.autorange
+        elapsed = sample(loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    per_call = [sample(loops) / loops for _ in range(repeat)]
+    return {
+        "median_s": statistics.median(per_call),
+        "min_s": min(per_call),
+        "mean_s": statistics.fmean(per_call),
+        "stdev_s": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+# ─── Kernels ──────────────────────────────────────────────────────────────────
+
+def _base_model(weights, seed):
+    from models.lstm_model import LSTM, voc
+    _seed(seed)
+    model = LSTM(voc, hidden_size=128)
+    if weights and os.path.exists(weights):
+        model.load_weights(weights)
+    return model
+
+
+def lstm_kernels(base, seed):
+    """(name, run, prep) for every kernel that needs only a model."""
+    encoder = base.one_hot_encoder
+    text500 = _diary_text(500, seed)
+    x1, x500 = encoder.encode(text500[:1]), encoder.encode(text500)
+    x26 = encoder.encode(text500[:26])
+
+    trainable = base.clone()
+    frozen = base.clone().freeze()
+    blob = base.save_weights_to_bytes()
+    target = base.clone()
+
+    kernels = [
+        ("encode", lambda: encoder.encode(text500), None),
+        ("forw_prop[t=1]", lambda: trainable.forw_prop(x1), None),
+        ("forw_prop[t=500]", lambda: trainable.forw_prop(x500), None),
+        ("back_prop[t=25]", lambda: trainable.back_prop(x26[1:], 0.005),
+         lambda: trainable.forw_prop(x26[:-1])),
+        ("train_incremental", lambda: trainable.train_incremental(text500[:300], 25, 0.005), None),
+    ]
+    for n in PROMPT_LENGTHS:
+        prompt = _diary_text(n, seed + n)
+        kernels.append((f"get_completions[prompt={n}]",
+                        lambda p=prompt: frozen.get_completions(p, num_suggestions=3, max_length=20),
+                        None))
+    for n in PROMPT_LENGTHS:
+        prompt = _diary_text(n, seed + n)
+        kernels.append((f"till_period[prompt={n}]",
+                        lambda p=prompt: frozen.get_completions_till_period(p, num_suggestions=3),
+                        None))
+    kernels += [
+        ("save_weights_to_bytes", base.save_weights_to_bytes, None),
+        ("load_weights_from_bytes", lambda: target.load_weights_from_bytes(blob), None),
+    ]
+    return kernels
+
+
+@contextlib.contextmanager
+def manager_kernels(base, seed):
+    """get_user_model cold/warm against a throwaway SQLite weight store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+        os.environ["DATABASE_URL"] = ""
+        from models import database as db, weight_store
+        from models.lstm_model import LSTMModelManager
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_db()
+            db.insert_user("bench", "!")    # never signs in, so no password hash
+        user_id = db.get_user_by_username("bench")[0]
+
+        manager = LSTMModelManager(cache_size=4)
+        manager.base_model = base
+        weight_store.set_base(base.weight_arrays())
+        trained = base.clone()
+        _seed(seed)
+        trained.train_stream(_diary_text(2000, seed), seq_length=25, learning_rate=0.005,
+                             max_windows=40)
+        weight_store.save_versions([(user_id, trained.weight_arrays(), 10, None, None)])
+
+        def evict():
+            manager.user_models.pop(user_id, None)
+            manager.user_versions.pop(user_id, None)
+            weight_store._cache.clear()
+
+        try:
+            yield [
+                ("get_user_model[cold]", lambda: manager.get_user_model(user_id), evict),
+                ("get_user_model[warm]", lambda: manager.get_user_model(user_id), None),
+            ]
+        finally:
+            db.close_connections()
+
+
+# ─── Reporting ────────────────────────────────────────────────────────────────
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def _meta(args):
+    weights = args.weights if args.weights and os.path.exists(args.weights) else None
+    digest = None
+    if weights:
+        with open(weights, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "weights": digest or "random",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold, out=sys.stdout):
+    """Print current vs baseline medians. Returns the names that regressed."""
+    regressed = []
+    print(f"\n{'kernel':<32}{'baseline':>12}{'current':>12}{'change':>9}", file=out)
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<32}{'—':>12}{_format_time(r['median_s']):>12}{'new':>9}", file=out)
+            continue
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(f"{name:<32}{_format_time(old['median_s']):>12}{_format_time(r['median_s']):>12}"
+              f"{(ratio - 1) * 100:>+8.1f}%{flag}", file=out)
+    return regressed
+
+
+def main():
+    p = argparse.ArgumentParser(description="YourDiary kernel microbenchmarks")
+    p.add_argument("--filter", type=str, default=None, help="Only run kernels whose name contains this")
+    p.add_argument("--repeat", type=int, default=7, help="Samples per kernel (default: 7)")
+    p.add_argument("--min-time", type=float, default=0.2, help="Seconds per sample (default: 0.2)")
+    p.add_argument("--seed", type=int, default=1234, help="numpy/random seed (default: 1234)")
+    p.add_argument("--weights", type=str, default=os.path.join(ROOT, "base_model.npz"),
+                   help="Model weights (default: base_model.npz; random init if missing)")
+    p.add_argument("--json", type=str, default=None, help="Write results to this file ('-' = stdout)")
+    p.add_argument("--compare", type=str, default=None, help="Baseline JSON from an earlier --json run")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="Slowdown counted as a regression (default: 0.10 = 10%%)")
+    args = p.parse_args()
+
+    base = _base_model(args.weights, args.seed)
+    wanted = (lambda name: args.filter in name) if args.filter else (lambda name: True)
+    out = sys.stderr if args.json == "-" else sys.stdout
+
+    results = {}
+    print(f"{'kernel':<32}{'median':>12}{'min':>12}{'±stdev':>9}{'loops':>8}", file=out)
+
+    def run_all(kernels):
+        for name, run, prep in kernels:
+            if not wanted(name):
+                continue
+            r = measure(run, prep, repeat=args.repeat, min_time=args.min_time, seed=args.seed)
+            results[name] = r
+            spread = r["stdev_s"] / r["mean_s"] * 100 if r["mean_s"] else 0.0
+            print(f"{name:<32}{_format_time(r['median_s']):>12}{_format_time(r['min_s']):>12}"
+                  f"{spread:>8.1f}%{r['loops']:>8}", file=out, flush=True)
+
+    run_all(lstm_kernels(base, args.seed))
+    if wanted("get_user_model[cold]") or wanted("get_user_model[warm]"):
+        with manager_kernels(base, args.seed) as kernels:
+            run_all(kernels)
+
+    report = {"meta": _meta(args), "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changed = [k for k in ("numpy", "machine", "cpus", "weights")
+                   if baseline.get("meta", {}).get(k) != report["meta"][k]]
+        if changed:
+            print(f"\n⚠️  baseline was recorded with a different {', '.join(changed)}", file=out)
+        regressed = compare(results, baseline, args.threshold, out)
+        if regressed:
+            print(f"\n{len(regressed)} regression(s) over {args.threshold:.0%}: {', '.join(regressed)}",
+                  file=out)
+            sys.exit(1)
+        print(f"\nno regressions over {args.threshold:.0%}", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+load_test.py — End-to-end load test of the real app with simulated diary users.
+
+Usage:
+  python -m benchmarks.load_test
+  python -m benchmarks.load_test --users 10 50 100 --duration 60
+  python -m benchmarks.load_test --speed 4 --json load.json      # 4x faster humans
+  python -m benchmarks.load_test --database-url postgresql://localhost/yourdiary_load
+
+Starts `app:app` under uvicorn on a throwaway SQLite file, with inline
+training, as in production. With --database-url it runs against that
+PostgreSQL database instead, using usernames unique to the run. Then each
+simulated user behaves like the frontend:
+  - signs up and logs in;
+  - types diary entries word by word at --cps characters per second; a pause
+    longer than the editor's 600 ms debounce requests suggestions for the text
+    so far (20 chars, or "sentence" for some users), sometimes accepting one;
+  - saves the entry, which queues background training every 3 entries;
+  - now and then opens the entries list or the tasks page, and creates,
+    completes or deletes tasks.
+Users start staggered over --ramp seconds. --speed divides every human
+delay, so a few users can produce the load of many.
+
+Reported per run (one per --users value):
+  - requests/s and p50/p95/p99/max per route, plus errors;
+  - the server's CPU (process tree: API, password-hash workers) as % of one
+    core, and its RSS at the end and at its peak;
+  - training jobs completed (from /api/health).
+The load generator shares the machine, so on small boxes it competes with the
+server for CPU; read CPU % alongside the client count.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.async_load import ROOT, _free_port, _percentile
+
+SUGGESTION_DEBOUNCE = 0.6       # frontend/src/pages/Home.jsx
+
+WORDS = ("today i walked to the river with my sister and we talked about work the weather was "
+         "cold but the coffee was good tomorrow i want to finish the book and call mom about "
+         "dinner felt tired after the meeting so i went for a long run in the park").split()
+
+
+# ─── Server process ───────────────────────────────────────────────────────────
+
+def _start_app(workdir, port, database_url=None, training_mode="inline"):
+    env = dict(os.environ, SQLITE_PATH=os.path.join(workdir, "load.db"),
+               DATABASE_URL=database_url or "", TRAINING_MODE=training_mode,
+               WEIGHTS_FS_MIRROR="0", PYTHONPATH=ROOT)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process and its children from /proc."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.last_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._cpu_start = self._wall_start = 0.0
+        self.cpu_percent = None
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _tree(self):
+        children = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                children.setdefault(ppid, []).append(int(entry))
+        pids, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(children.get(pid, ()))
+        return pids
+
+    def _read(self):
+        cpu, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu += sum(int(x) for x in fields[11:15]) / self._tick   # utime stime cutime cstime
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            rss += int(line.split()[1]) * 1024
+            except (OSError, IndexError, ValueError):
+                continue
+        return cpu, rss
+
+    def start(self):
+        if not os.path.isdir("/proc"):
+            return
+        self._cpu_start, _ = self._read()
+        self._wall_start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            _, rss = self._read()
+            self.last_rss = rss
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        cpu, rss = self._read()
+        self.last_rss = rss
+        self.peak_rss = max(self.peak_rss, rss)
+        self.cpu_percent = (cpu - self._cpu_start) / (time.monotonic() - self._wall_start) * 100
+
+
+# ─── Simulated users ──────────────────────────────────────────────────────────
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(self, client, method, path, route=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, path, **kwargs)
+            failed = r.status_code >= 400
+        except httpx.HTTPError:
+            r, failed = None, True
+        key = f"{method} {route or path}"
+        self.latencies.setdefault(key, []).append(time.perf_counter() - t0)
+        if failed:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        return r
+
+
+async def _pause(seconds, speed):
+    await asyncio.sleep(seconds / speed)
+
+
+async def _compose(client, rec, h, rng, args):
+    """Type a 1–3 sentence entry, fetching suggestions on every debounce pause."""
+    max_length = "sentence" if rng.random() < 0.2 else 20
+    text = ""
+    for _ in range(rng.randint(1, 3)):
+        for word in rng.choices(WORDS, k=rng.randint(6, 14)):
+            await _pause(len(word) / args.cps, args.speed)
+            text += (word if not text or text.endswith(" ") else " " + word)
+            if rng.random() < 0.3:                 # stopped to think: debounce fires
+                await _pause(SUGGESTION_DEBOUNCE + rng.expovariate(1.0), args.speed)
+                r = await rec.call(client, "POST", "/api/diary/suggestions", headers=h,
+                                   json={"text": text, "max_length": max_length, "num_suggestions": 3})
+                if r is not None and r.status_code == 200 and rng.random() < 0.2:
+                    text += (r.json()["suggestions"] or [""])[0]
+        text = text.rstrip() + ". "
+    return text.strip()
+
+
+async def _tasks_page(client, rec, h, rng, args):
+    r = await rec.call(client, "GET", "/api/tasks", headers=h)
+    tasks = r.json().get("tasks", []) if r is not None and r.status_code == 200 else []
+    await _pause(rng.uniform(1, 4), args.speed)
+    roll = rng.random()
+    if roll < 0.5 or not tasks:
+        await rec.call(client, "POST", "/api/tasks", headers=h, json={
+            "title": " ".join(rng.choices(WORDS, k=4)).capitalize(),
+            "priority": rng.choice(("low", "medium", "high")),
+        })
+    elif roll < 0.85:
+        task = rng.choice(tasks)
+        await rec.call(client, "PATCH", f"/api/tasks/{task['id']}/status", route="/api/tasks/{id}/status",
+                       headers=h, json={"status": rng.choice(("in_progress", "completed"))})
+    else:
+        task = rng.choice(tasks)
+        await rec.call(client, "DELETE", f"/api/tasks/{task['id']}", route="/api/tasks/{id}", headers=h)
+
+
+async def _user(n, client, rec, stop_at, args, run_id):
+    rng = random.Random(args.seed * 1000 + n)
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    creds = {"username": f"lt{run_id}_{n}", "password": "load-test"}
+    await rec.call(client, "POST", "/api/auth/signup", json=creds)
+    r = await rec.call(client, "POST", "/api/auth/login", json=creds)
+    if r is None or r.status_code != 200:
+        return
+    h = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    while time.monotonic() < stop_at:
+        text = await _compose(client, rec, h, rng, args)
+        if time.monotonic() >= stop_at:
+            break
+        await rec.call(client, "POST", "/api/diary/entry", headers=h, json={"message": text})
+        await _pause(rng.uniform(2, 8), args.speed)
+        if rng.random() < 0.3:
+            await rec.call(client, "GET", "/api/diary/entries", headers=h, params={"limit": 20})
+            await _pause(rng.uniform(2, 6), args.speed)
+        if rng.random() < 0.3:
+            await _tasks_page(client, rec, h, rng, args)
+
+
+async def _run_users(base_url, users, args, run_id):
+    limits = httpx.Limits(max_connections=users + 4, max_keepalive_connections=users + 4)
+    rec = Recorder()
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        stop_at = time.monotonic() + args.ramp + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(_user(n, client, rec, stop_at, args, run_id) for n in range(users)))
+        elapsed = time.perf_counter() - started
+        health = (await client.get("/api/health")).json()
+    return rec, elapsed, health
+
+
+def run_level(users, args):
+    run_id = f"{int(time.time()) % 100000}{users}"
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        proc = _start_app(workdir, port, args.database_url, args.training_mode)
+        sampler = ProcessSampler(proc.pid)
+        sampler.start()
+        try:
+            rec, elapsed, health = asyncio.run(
+                _run_users(f"http://127.0.0.1:{port}", users, args, run_id))
+        finally:
+            sampler.stop()
+            proc.terminate()
+            proc.wait(timeout=60)
+
+    routes = {}
+    for key, samples in sorted(rec.latencies.items()):
+        routes[key] = {
+            "count": len(samples),
+            "rps": len(samples) / elapsed,
+            "errors": rec.errors.get(key, 0),
+            "p50_ms": _percentile(samples, 50) * 1000,
+            "p95_ms": _percentile(samples, 95) * 1000,
+            "p99_ms": _percentile(samples, 99) * 1000,
+            "max_ms": max(samples) * 1000,
+        }
+    training = health.get("training", {})
+    return {
+        "users": users,
+        "elapsed_s": elapsed,
+        "rps": sum(r["count"] for r in routes.values()) / elapsed,
+        "errors": sum(r["errors"] for r in routes.values()),
+        "server_cpu_percent": sampler.cpu_percent,
+        "server_rss_mb": sampler.last_rss / 2 ** 20,
+        "server_peak_rss_mb": sampler.peak_rss / 2 ** 20,
+        "training_completed": training.get("completed"),
+        "routes": routes,
+    }
+
+
+def _print_level(r):
+    cpu = f"{r['server_cpu_percent']:.0f}%" if r["server_cpu_percent"] is not None else "n/a"
+    print(f"\n{r['users']} users, {r['elapsed_s']:.0f} s: {r['rps']:.1f} req/s, {r['errors']} errors, "
+          f"server CPU {cpu}, RSS {r['server_rss_mb']:.0f} MB (peak {r['server_peak_rss_mb']:.0f} MB), "
+          f"{r['training_completed']} training jobs")
+    print(f"  {'route':<36}{'count':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'err':>6}")
+    for key, s in r["routes"].items():
+        print(f"  {key:<36}{s['count']:>7}{s['rps']:>8.2f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+              f"{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}{s['errors']:>6}", flush=True)
+
+
+def main():
+    p = argparse.ArgumentParser(description="End-to-end load test with simulated diary users")
+    p.add_argument("--users", type=int, nargs="+", default=[10, 40],
+                   help="Concurrent simulated users, one run per value (default: 10 40)")
+    p.add_argument("--duration", type=float, default=30.0, help="Seconds of load after ramp-up (default: 30)")
+    p.add_argument("--ramp", type=float, default=5.0, help="Seconds over which users start (default: 5)")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="Divide human think/typing time by this (default: 1 = real time)")
+    p.add_argument("--cps", type=float, default=5.0, help="Typing speed, chars per second (default: 5)")
+    p.add_argument("--seed", type=int, default=7, help="Random seed for user behaviour (default: 7)")
+    p.add_argument("--training-mode", choices=("inline", "external"), default="inline",
+                   help="TRAINING_MODE for the server (default: inline)")
+    p.add_argument("--database-url", type=str, default=None,
+                   help="PostgreSQL URL to use instead of a temporary SQLite file")
+    p.add_argument("--json", type=str, default=None, help="Write all results to this file")
+    args = p.parse_args()
+
+    results = []
+    for users in args.users:
+        r = run_level(users, args)
+        _print_level(r)
+        results.append(r)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
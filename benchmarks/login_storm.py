@@ -0,0 +1,143 @@
+"""
+login_storm.py — Suggestion latency while a burst of logins hashes passwords.
+
+Usage:
+  python -m benchmarks.login_storm
+  python -m benchmarks.login_storm --storm 64 --duration 10
+  python -m benchmarks.login_storm --baseline HEAD~1    # compare with an older tree
+
+Starts the real app under uvicorn on a throwaway SQLite file, then measures
+POST /api/diary/suggestions latency from a few steady clients twice:
+  quiet   suggestions only
+  storm   the same, while --storm clients log in back to back
+Logins that the server refuses as overloaded (503) are counted separately.
+Also reports how long get_current_user takes for a repeated token.
+
+With --baseline REF the same runs go against `git archive REF` first.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.async_load import ROOT, _export_tree, _free_port, _percentile, _start_server
+
+STORM_USERS = 8
+TEXT = "Today I walked to the river and"
+
+
+async def _setup(client):
+    creds = {"username": "writer", "password": "benchmark"}
+    await client.post("/api/auth/signup", json=creds)
+    token = (await client.post("/api/auth/login", json=creds)).json()["access_token"]
+    writer = {"Authorization": f"Bearer {token}"}
+    for i in range(5):
+        await client.post("/api/diary/entry", json={"message": f"Seed entry {i}."}, headers=writer)
+    await client.post("/api/diary/suggestions", json={"text": TEXT}, headers=writer)  # load model
+    for i in range(STORM_USERS):
+        await client.post("/api/auth/signup", json={"username": f"storm_{i}", "password": "benchmark"})
+    return writer
+
+
+async def _phase(client, writer, clients, storm, duration):
+    stop_at = time.monotonic() + duration
+    suggest, logins = [], {"ok": 0, "refused": 0, "failed": 0}
+
+    async def suggester():
+        while time.monotonic() < stop_at:
+            t0 = time.perf_counter()
+            await client.post("/api/diary/suggestions", json={"text": TEXT, "max_length": 10},
+                              headers=writer)
+            suggest.append(time.perf_counter() - t0)
+
+    async def login(n):
+        creds = {"username": f"storm_{n % STORM_USERS}", "password": "benchmark"}
+        while time.monotonic() < stop_at:
+            r = await client.post("/api/auth/login", json=creds)
+            key = "ok" if r.status_code == 200 else "refused" if r.status_code == 503 else "failed"
+            logins[key] += 1
+            if r.status_code == 503:
+                await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(suggester() for _ in range(clients)), *(login(n) for n in range(storm)))
+    elapsed = time.perf_counter() - started
+    return {
+        "suggest_p50_ms": _percentile(suggest, 50) * 1000,
+        "suggest_p99_ms": _percentile(suggest, 99) * 1000,
+        "suggest_rps": len(suggest) / elapsed,
+        "logins_per_s": logins["ok"] / elapsed,
+        "refused": logins["refused"],
+        "failed": logins["failed"],
+    }
+
+
+async def _auth_overhead(client, writer, repeat=300):
+    """Server-side time of an authenticated no-op-ish request, token reused."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await client.get("/api/tasks", headers=writer)
+        samples.append(time.perf_counter() - t0)
+    return _percentile(samples, 50) * 1000
+
+
+async def _run(base_url, clients, storm, duration):
+    limits = httpx.Limits(max_connections=clients + storm + 4,
+                          max_keepalive_connections=clients + storm + 4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        writer = await _setup(client)
+        quiet = await _phase(client, writer, clients, 0, duration)
+        stormy = await _phase(client, writer, clients, storm, duration)
+        tasks_ms = await _auth_overhead(client, writer)
+    return quiet, stormy, tasks_ms
+
+
+def run_target(label, source_dir, clients, storm, duration):
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        proc = _start_server(source_dir, workdir, port)
+        try:
+            quiet, stormy, tasks_ms = asyncio.run(
+                _run(f"http://127.0.0.1:{port}", clients, storm, duration))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    for phase, r in (("quiet", quiet), ("storm", stormy)):
+        print(f"{label:<10}{phase:<7}{r['suggest_p50_ms']:>10.1f}{r['suggest_p99_ms']:>10.1f}"
+              f"{r['suggest_rps']:>10.1f}{r['logins_per_s']:>10.1f}{r['refused']:>9}{r['failed']:>8}",
+              flush=True)
+    print(f"{label:<10}GET /api/tasks p50 with a reused token: {tasks_ms:.2f} ms", flush=True)
+    return quiet, stormy
+
+
+def main():
+    p = argparse.ArgumentParser(description="Suggestion latency during a login storm")
+    p.add_argument("--clients", type=int, default=2, help="Steady suggestion clients (default: 2)")
+    p.add_argument("--storm", type=int, default=32, help="Concurrent login loops (default: 32)")
+    p.add_argument("--duration", type=float, default=8.0, help="Seconds per phase (default: 8)")
+    p.add_argument("--baseline", type=str, default=None,
+                   help="Git ref to run the same load against first (e.g. HEAD~1)")
+    args = p.parse_args()
+
+    print(f"{'tree':<10}{'phase':<7}{'sugg p50':>10}{'sugg p99':>10}{'sugg/s':>10}"
+          f"{'logins/s':>10}{'refused':>9}{'failed':>8}")
+    results = []
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tree:
+            results.append(run_target(args.baseline[:10], _export_tree(args.baseline, tree),
+                                      args.clients, args.storm, args.duration))
+    results.append(run_target("current", ROOT, args.clients, args.storm, args.duration))
+
+    if args.baseline:
+        (old_quiet, old_storm), (new_quiet, new_storm) = results
+        print(f"\nsuggestion p99 under the storm: {old_storm['suggest_p99_ms']:.0f} ms → "
+              f"{new_storm['suggest_p99_ms']:.0f} ms (quiet: {old_quiet['suggest_p99_ms']:.0f} → "
+              f"{new_quiet['suggest_p99_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+search.py — Diary search latency as history grows: full-text index vs LIKE.
+
+Usage:
+  python -m benchmarks.search
+  python -m benchmarks.search --sizes 1000 10000 100000 200000
+
+Fills one user's diary on a throwaway SQLite file in steps, and after each
+step times search_messages() for a rare, a common and a missing word, first through
+the FTS5 index and then through the LIKE-scan fallback. Another user's
+entries of the same size sit in the same table, as in production.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+WORDS = ("morning walk coffee river work meeting friend dinner book rain sunny tired happy "
+         "garden music call family train city quiet evening run park lunch letter plan "
+         "movie sleep cook market laugh worry hope travel beach snow paint study").split()
+RARE = "lighthouse"      # in ~0.5% of entries
+COMMON = "coffee"        # drawn like every other vocabulary word
+MISSING = "zeppelin"     # in no entry — a LIKE scan reads the whole history
+
+
+def _entries(rng, n):
+    rows = []
+    for _ in range(n):
+        words = rng.choices(WORDS, k=rng.randint(8, 30))
+        if rng.random() < 0.005:
+            words.insert(rng.randrange(len(words)), RARE)
+        rows.append((" ".join(words).capitalize() + ".", "2024-01-01 00:00:00"))
+    return rows
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark diary search: FTS vs LIKE")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                   help="History sizes to measure at (default: 1000 10000 100000)")
+    p.add_argument("--repeat", type=int, default=20, help="Searches per measurement (default: 20)")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLITE_PATH"] = os.path.join(tmp, "search.db")
+        os.environ["DATABASE_URL"] = ""
+        from models import database as db
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_db()
+            for name in ("searcher", "neighbour"):
+                db.insert_user(name, "!")    # never signs in, so no password hash
+        user_id = db.get_user_by_username("searcher")[0]
+        other_id = db.get_user_by_username("neighbour")[0]
+        fts = db._fts_sqlite if db._fts_sqlite is not None else True
+        rng = random.Random(42)
+
+        print(f"{'entries':>9}" + "".join(f"{f'{kind} {word}':>14}" for kind in ("FTS", "LIKE")
+                                          for word in ("rare", "common", "missing")) + "   (p50 ms)")
+        filled = 0
+        for size in sorted(args.sizes):
+            for uid in (user_id, other_id):
+                remaining = size - filled
+                while remaining > 0:
+                    batch = _entries(rng, min(remaining, 5000))
+                    db.import_messages(uid, batch)
+                    remaining -= len(batch)
+            filled = size
+
+            timings = []
+            for use_fts in (True, False):
+                db._fts_sqlite = fts and use_fts
+                for word in (RARE, COMMON, MISSING):
+                    timings.append(_time(lambda: db.search_messages(user_id, word, 20, 0), args.repeat))
+            db._fts_sqlite = None
+            print(f"{size:>9}" + "".join(f"{t:>14.2f}" for t in timings))
+        db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+weight_store.py — Bytes written per training round and database growth:
+versioned weight store vs whole-BLOB saves.
+
+Usage:
+  python -m benchmarks.weight_store
+  python -m benchmarks.weight_store --users 3 --rounds 20 --keep 5
+
+Trains each user's model for a number of real incremental rounds (the same
+train_stream call the app makes) and saves every round three ways, each in
+its own throwaway SQLite file:
+  overwrite   the old scheme — one npz BLOB per user, rewritten every round
+  snapshots   keeping history the naive way — a full npz per version,
+              pruned to the newest --keep per user
+  store       models.weight_store — deltas + keyframes, pruned to --keep,
+              then garbage-collected
+Also times reconstruction of the latest version, cold (empty payload cache)
+and warm.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+WORDS = ("morning walk coffee river work meeting friend dinner book rain sunny tired happy "
+         "garden music call family train city quiet evening run park lunch letter plan").split()
+
+
+def _file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def _legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE user_models (user_id INTEGER PRIMARY KEY, weights BLOB NOT NULL)")
+    conn.execute("CREATE TABLE model_history (user_id INTEGER, version INTEGER, weights BLOB, "
+                 "PRIMARY KEY (user_id, version))")
+    return conn
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the versioned weight store")
+    p.add_argument("--users", type=int, default=3, help="Users to train (default: 3)")
+    p.add_argument("--rounds", type=int, default=20, help="Training rounds per user (default: 20)")
+    p.add_argument("--keep", type=int, default=5, help="Versions kept per user (default: 5)")
+    p.add_argument("--windows", type=int, default=60, help="Training windows per round (default: 60)")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLITE_PATH"] = os.path.join(tmp, "store.db")
+        os.environ["DATABASE_URL"] = ""
+        from models import database as db, weight_store
+        from models.lstm_model import LSTMModelManager
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_db()
+            manager = LSTMModelManager()
+            manager.load_base_model()
+            user_ids = []
+            for i in range(args.users):
+                db.insert_user(f"bench_{i}", "!")    # never signs in, so no password hash
+                user_ids.append(db.get_user_by_username(f"bench_{i}")[0])
+
+        legacy = _legacy_db(os.path.join(tmp, "legacy.db"))
+        written = {"overwrite": 0, "snapshots": 0, "store": 0}
+        rng = random.Random(7)
+        models = {u: manager.base_model.clone() for u in user_ids}
+        save_s = []
+
+        for rnd in range(1, args.rounds + 1):
+            for user_id in user_ids:
+                text = " ".join(rng.choices(WORDS, k=300))
+                model = models[user_id].clone()
+                loss, _ = model.train_stream(text, seq_length=25, learning_rate=0.005,
+                                             max_windows=args.windows)
+                models[user_id] = model
+
+                npz = model.save_weights_to_bytes()
+                with legacy:
+                    legacy.execute("INSERT INTO user_models VALUES (?, ?) ON CONFLICT (user_id) "
+                                   "DO UPDATE SET weights = excluded.weights", (user_id, npz))
+                    legacy.execute("INSERT INTO model_history VALUES (?, ?, ?)", (user_id, rnd, npz))
+                    legacy.execute("DELETE FROM model_history WHERE user_id = ? AND version <= ?",
+                                   (user_id, rnd - args.keep))
+                written["overwrite"] += len(npz)
+                written["snapshots"] += len(npz)
+
+                t0 = time.perf_counter()
+                result = weight_store.save_versions(
+                    [(user_id, model.weight_arrays(), rnd, None, loss)], keep=args.keep)
+                save_s.append(time.perf_counter() - t0)
+                written["store"] += result["bytes"]
+        legacy.close()
+
+        versions, blobs, freed = weight_store.gc(args.keep)
+        stats = db.get_weight_store_stats()
+
+        # Sizes of just the weight data in each scheme
+        conn = sqlite3.connect(os.path.join(tmp, "legacy.db"))
+        overwrite_bytes = conn.execute("SELECT SUM(LENGTH(weights)) FROM user_models").fetchone()[0]
+        snapshot_bytes = conn.execute("SELECT SUM(LENGTH(weights)) FROM model_history").fetchone()[0]
+        conn.close()
+
+        cold, warm = [], []
+        for user_id in user_ids * 3:
+            weight_store._cache.clear()
+            t0 = time.perf_counter()
+            weight_store.load_user_weights(user_id)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            weight_store.load_user_weights(user_id)
+            warm.append(time.perf_counter() - t0)
+        db.close_connections()
+
+    saves = args.users * args.rounds
+    print(f"{args.users} users x {args.rounds} rounds, keeping {args.keep} versions per user\n")
+    print(f"{'scheme':<12}{'bytes/round':>14}{'stored weights':>17}{'history':>10}")
+    print(f"{'overwrite':<12}{written['overwrite'] / saves:>14,.0f}{overwrite_bytes:>17,}{'none':>10}")
+    print(f"{'snapshots':<12}{written['snapshots'] / saves:>14,.0f}{snapshot_bytes:>17,}"
+          f"{args.keep:>10}")
+    print(f"{'store':<12}{written['store'] / saves:>14,.0f}{stats['stored_bytes']:>17,}"
+          f"{args.keep:>10}")
+    print(f"\nstore: {stats['keyframes']} keyframes + {stats['deltas']} deltas after GC "
+          f"(removed {blobs} blobs, {freed:,} bytes)")
+    save_s.sort()
+    print(f"save p50 {save_s[len(save_s) // 2] * 1000:.1f} ms   "
+          f"load latest: cold p50 {sorted(cold)[len(cold) // 2] * 1000:.1f} ms, "
+          f"warm p50 {sorted(warm)[len(warm) // 2] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
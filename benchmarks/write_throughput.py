@@ -0,0 +1,124 @@
+"""
+write_throughput.py — Concurrent /api/diary/entry throughput on SQLite,
+with and without group commit.
+
+Usage:
+  python -m benchmarks.write_throughput
+  python -m benchmarks.write_throughput --entries 5000 --concurrency 8 64
+
+For each concurrency level, runs the real app in two fresh processes:
+SQLITE_GROUP_COMMIT=0 (every write commits on its own DB-thread connection)
+and SQLITE_GROUP_COMMIT=1 (writes are batched by the single writer thread).
+Requests go through the ASGI stack in-process (no sockets), so the numbers
+reflect the app and the database, not the HTTP client. Reports entries/s,
+latency percentiles, failed requests and writes per commit.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run_child(n_entries, concurrency):
+    """Executed inside the subprocess — SQLITE_GROUP_COMMIT is already set in the env."""
+    import httpx
+    from models import database as db
+    import app
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_db()
+
+    async def _load():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            headers = []
+            for i in range(concurrency):
+                creds = {"username": f"writer_{i}", "password": "benchmark"}
+                await client.post("/api/auth/signup", json=creds)
+                token = (await client.post("/api/auth/login", json=creds)).json()["access_token"]
+                headers.append({"Authorization": f"Bearer {token}"})
+
+            per_worker = n_entries // concurrency
+            latencies, failures = [], [0]
+
+            async def worker(h):
+                for i in range(per_worker):
+                    t0 = time.perf_counter()
+                    r = await client.post("/api/diary/entry", headers=h,
+                                          json={"message": f"Entry {i}: wrote a little, read a little."})
+                    latencies.append(time.perf_counter() - t0)
+                    if r.status_code != 200:
+                        failures[0] += 1
+
+            before = dict(db.DB_STATS)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(h) for h in headers))
+            elapsed = time.perf_counter() - started
+            return latencies, failures[0], elapsed, before
+
+    # Training is not started (no lifespan) — silence its "queue full" notes
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies, failures, elapsed, before = asyncio.run(_load())
+
+    commits = db.DB_STATS["commits"] - before["commits"]
+    grouped = db.DB_STATS["group_writes"] - before["group_writes"]
+    print(json.dumps({
+        "group_commit": db._get_sqlite_writer() is not None,
+        "concurrency": concurrency,
+        "entries": len(latencies),
+        "entries_per_s": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "failed": failures,
+        "writes_per_commit": grouped / commits if commits else 1.0,
+    }))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark concurrent diary-entry writes on SQLite")
+    p.add_argument("--entries", type=int, default=2000, help="Entries per run (default: 2000)")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[8, 64],
+                   help="Concurrent writers to test (default: 8 64)")
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        run_child(args.entries, args.concurrency[0])
+        return
+
+    print(f"{'mode':<14}{'conc':>6}{'entries/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}{'writes/commit':>15}")
+    for concurrency in args.concurrency:
+        results = []
+        for group in ("0", "1"):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, SQLITE_GROUP_COMMIT=group, DATABASE_URL="",
+                           SQLITE_PATH=os.path.join(tmp, "writes.db"))
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.write_throughput", "--child",
+                     "--entries", str(args.entries), "--concurrency", str(concurrency)],
+                    env=env, capture_output=True, text=True, check=True
+                ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            results.append(r)
+            mode = "group commit" if r["group_commit"] else "per-write"
+            print(f"{mode:<14}{concurrency:>6}{r['entries_per_s']:>11.0f}{r['p50_ms']:>9.2f}"
+                  f"{r['p99_ms']:>9.2f}{r['failed']:>8}{r['writes_per_commit']:>15.1f}")
+        before, after = results
+        print(f"{'':<14}{'':>6}  → x{after['entries_per_s'] / before['entries_per_s']:.2f} throughput\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+YourDiary — Async Database Layer
+Coroutine versions of the request-path functions in models.database, with the
+same names, arguments and return values, for use from async routes.
+
+  - PostgreSQL: an asyncpg pool (DB_POOL_SIZE connections) when asyncpg is
+    installed; otherwise the psycopg2 functions run on dedicated DB threads
+  - SQLite:     reads run on a few dedicated DB threads (ASYNC_DB_THREADS),
+    each keeping its own persistent connection; writes are handed straight
+    to the group-commit writer thread and awaited without holding a thread
+
+Nothing blocks the event loop, and database calls no longer tie up the
+shared AnyIO threadpool that sync routes (suggestions) run on.
+
+Call `await init_pool()` on startup and `await close_pool()` on shutdown.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from models import database as db
+from models import metrics, profiler
+
+log = logging.getLogger(__name__)
+
+try:
+    import asyncpg
+except ImportError:          # optional — only needed with DATABASE_URL
+    asyncpg = None
+
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "4"))
+
+_pool = None         # asyncpg pool (PostgreSQL + asyncpg only)
+_executor = None     # dedicated DB threads for everything else
+
+
+# ─── Lifecycle ────────────────────────────────────────────────────────────────
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = db.DB_POOL_SIZE if db.DATABASE_URL else ASYNC_DB_THREADS
+        _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="yourdiary-db")
+    return _executor
+
+
+async def init_pool():
+    """Open the asyncpg pool (PostgreSQL) — SQLite needs no setup."""
+    global _pool
+    if not db.DATABASE_URL or _pool is not None:
+        return
+    if asyncpg is None:
+        log.warning("asyncpg not installed, PostgreSQL calls run on DB threads")
+        return
+    _pool = await asyncpg.create_pool(
+        db._pg_url(),
+        min_size=1,
+        max_size=db.DB_POOL_SIZE,
+        max_inactive_connection_lifetime=db.DB_POOL_MAX_LIFETIME,
+    )
+    log.info("asyncpg pool ready", extra={"connections": db.DB_POOL_SIZE})
+
+
+async def close_pool():
+    global _pool, _executor
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def _run(fn, *args, **kwargs):
+    """Run a sync models.database function on the dedicated DB threads."""
+    loop = asyncio.get_running_loop()
+    # The coroutine calling us is timed already (see Query timing below)
+    fn = getattr(fn, "__wrapped__", fn)
+    # Carry context variables over, so a traced request sees its DB spans
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+async def _write(op, *args):
+    """Await op on the SQLite group-commit writer (or a DB thread if it is off)."""
+    try:
+        future = db.submit_write(op, *args, block=False)
+    except queue.Full:
+        # Writer backed up: wait for room on a DB thread, never on the loop
+        future = await _run(db.submit_write, op, *args)
+    if future is None:
+        return await _run(db._write, op, *args)
+    return await asyncio.wrap_future(future)
+
+
+def _acquire():
+    return _pool.acquire(timeout=db.DB_POOL_TIMEOUT)
+
+
+def _numbered(template, **parts):
+    """A models.database {ph} template with asyncpg's $1, $2, ... placeholders."""
+    mark = "\0"
+    pieces = template.format(ph=mark, **{k: v.format(ph=mark) for k, v in parts.items()}).split(mark)
+    return pieces[0] + "".join(f"${n}{piece}" for n, piece in enumerate(pieces[1:], 1))
+
+
+# asyncpg statements, built once from the same templates the sync layer runs
+_USER_BY_NAME = _numbered(db._USER_BY_NAME)
+_INSERT_USER = _numbered(db._INSERT_USER)
+_SAVE_MESSAGE = _numbered(db._SAVE_MESSAGE_PG)
+_ADD_ENTRY_COUNT = _numbered(db._ADD_ENTRY_COUNT)
+_RECENT_MESSAGES = _numbered(db._RECENT_MESSAGES)
+_RECENT_MESSAGES_LIMIT = _numbered(db._RECENT_MESSAGES + " LIMIT {ph}")
+_MESSAGES_PAGE = _numbered(db._MESSAGES_PAGE, after="")
+_MESSAGES_PAGE_AFTER = _numbered(db._MESSAGES_PAGE, after=db._PAGE_AFTER)
+_MESSAGES_NEWEST = _numbered(db._MESSAGES_NEWEST, after="")
+_MESSAGES_NEWEST_AFTER = _numbered(db._MESSAGES_NEWEST, after=db._PAGE_AFTER)
+_SEARCH = _numbered(db._SEARCH_PG)
+_INSERT_TASK = _numbered(db._INSERT_TASK)
+_USER_TASKS_WITH_STATS = _numbered(db._USER_TASKS_WITH_STATS)
+_UPDATE_TASK_STATUS = _numbered(db._UPDATE_TASK_STATUS)
+_DELETE_TASK = _numbered(db._DELETE_TASK)
+_ENQUEUE_TRAINING_JOB = _numbered(db._ENQUEUE_TRAINING_JOB)
+
+
+def _as_timestamp(value):
+    # Cursors carry timestamps as strings; asyncpg wants datetime objects
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _rowcount(status):
+    # asyncpg returns the command tag, e.g. "UPDATE 1"
+    try:
+        return int(status.split()[-1])
+    except (AttributeError, ValueError, IndexError):
+        return 0
+
+
+# ─── Users ────────────────────────────────────────────────────────────────────
+
+async def get_user_by_username(username):
+    """Return (id, username, hashed_password) or None."""
+    if _pool is None:
+        return await _run(db.get_user_by_username, username)
+    async with _acquire() as conn:
+        row = await conn.fetchrow(_USER_BY_NAME, username)
+    return tuple(row) if row else None
+
+
+async def insert_user(username, hashed):
+    """Insert a user with an already-hashed password. False if username taken."""
+    if _pool is None:
+        return await _run(db.insert_user, username, hashed)
+    try:
+        async with _acquire() as conn:
+            await conn.execute(_INSERT_USER, username, hashed)
+        return True
+    except Exception:
+        return False
+
+
+async def save_message(user_id, message):
+    """Save a diary entry; returns the user's new total entry count."""
+    if _pool is None:
+        return await _write(db._save_message_op, user_id, message)
+    async with _acquire() as conn:
+        count = await conn.fetchval(_SAVE_MESSAGE, user_id, message)
+    return int(count) if count is not None else 0
+
+
+async def import_messages(user_id, rows):
+    """Bulk-insert (message, timestamp) rows; returns the count — see models.database."""
+    if not rows:
+        return 0
+    if _pool is None:
+        if db.DATABASE_URL:
+            return await _run(db.import_messages, user_id, rows)
+        return await _write(db._import_messages_op, user_id, rows)
+    async with _acquire() as conn:
+        async with conn.transaction():
+            await conn.copy_records_to_table(
+                "user_messages",
+                records=[(user_id, message, _as_timestamp(ts)) for message, ts in rows],
+                columns=["user_id", "message", "timestamp"],
+            )
+            await conn.execute(_ADD_ENTRY_COUNT, len(rows), user_id)
+    return len(rows)
+
+
+async def get_user_messages(user_id, limit=None):
+    """Return list of (message, timestamp) tuples, newest first."""
+    if _pool is None:
+        return await _run(db.get_user_messages, user_id, limit)
+    async with _acquire() as conn:
+        if limit:
+            rows = await conn.fetch(_RECENT_MESSAGES_LIMIT, user_id, limit)
+        else:
+            rows = await conn.fetch(_RECENT_MESSAGES, user_id)
+    return [tuple(r) for r in rows]
+
+
+async def get_user_messages_page(user_id, limit, before=None):
+    """Keyset page of (id, message, timestamp) rows plus the next key — see models.database."""
+    if _pool is None:
+        return await _run(db.get_user_messages_page, user_id, limit, before)
+    async with _acquire() as conn:
+        if before is None:
+            rows = await conn.fetch(_MESSAGES_PAGE, user_id, limit + 1)
+        else:
+            rows = await conn.fetch(
+                _MESSAGES_PAGE_AFTER, user_id, _as_timestamp(before[0]), int(before[1]), limit + 1
+            )
+    rows = [tuple(r) for r in rows]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1][2], rows[-1][0])
+
+
+async def iter_user_messages(user_id, before=None, batch_size=500):
+    """Async-iterate (id, message, timestamp) for every entry, newest first."""
+    if _pool is None:
+        while True:
+            rows, before = await get_user_messages_page(user_id, batch_size, before)
+            for row in rows:
+                yield row
+            if before is None:
+                return
+
+    async with _acquire() as conn:
+        async with conn.transaction():
+            if before is None:
+                cursor = conn.cursor(_MESSAGES_NEWEST, user_id, prefetch=batch_size)
+            else:
+                cursor = conn.cursor(
+                    _MESSAGES_NEWEST_AFTER, user_id, _as_timestamp(before[0]), int(before[1]),
+                    prefetch=batch_size
+                )
+            async for row in cursor:
+                yield tuple(row)
+
+
+async def search_messages(user_id, query, limit=20, offset=0):
+    """Ranked full-text search: [(id, message, timestamp, score, snippet)] — see models.database."""
+    if _pool is None:
+        return await _run(db.search_messages, user_id, query, limit, offset)
+    params = db._search_params(user_id, query, limit, offset, is_pg=True)
+    if params is None:
+        return []
+    async with _acquire() as conn:
+        rows = await conn.fetch(_SEARCH, *params)
+    return db._with_snippets([tuple(r) for r in rows], query)
+
+
+# ─── Tasks ────────────────────────────────────────────────────────────────────
+
+async def add_task(user_id, title, description="", priority="medium", due_date=None):
+    """Create a new task. Returns True on success."""
+    try:
+        if _pool is None:
+            return await _write(db._add_task_op, user_id, title, description, priority, due_date)
+        async with _acquire() as conn:
+            await conn.execute(
+                _INSERT_TASK, user_id, title, description, priority, _as_date(due_date)
+            )
+        return True
+    except Exception as e:
+        log.error("adding task failed", extra={"user_id": user_id, "error": str(e)})
+        return False
+
+
+async def get_user_tasks_with_stats(user_id):
+    """Return (tasks, stats) for a user in a single query."""
+    if _pool is None:
+        return await _run(db.get_user_tasks_with_stats, user_id)
+    async with _acquire() as conn:
+        rows = await conn.fetch(_USER_TASKS_WITH_STATS, date.today(), user_id)
+    if not rows:
+        return [], db._task_stats_from((0, 0, 0, 0))
+    rows = [tuple(r) for r in rows]
+    return [db._task_row_to_dict(row) for row in rows], db._task_stats_from(rows[0][7:11])
+
+
+async def update_task_status(task_id, status, user_id):
+    """Update a task's status. Returns True if a row was affected."""
+    try:
+        if _pool is None:
+            return await _write(db._update_task_status_op, task_id, status, user_id)
+        async with _acquire() as conn:
+            result = await conn.execute(_UPDATE_TASK_STATUS, status, task_id, user_id)
+        return _rowcount(result) > 0
+    except Exception as e:
+        log.error("updating task failed", extra={"user_id": user_id, "task_id": task_id, "error": str(e)})
+        return False
+
+
+async def delete_task(task_id, user_id):
+    """Delete a task. Returns True if a row was deleted."""
+    try:
+        if _pool is None:
+            return await _write(db._delete_task_op, task_id, user_id)
+        async with _acquire() as conn:
+            result = await conn.execute(_DELETE_TASK, task_id, user_id)
+        return _rowcount(result) > 0
+    except Exception as e:
+        log.error("deleting task failed", extra={"user_id": user_id, "task_id": task_id, "error": str(e)})
+        return False
+
+
+# ─── Training Jobs ────────────────────────────────────────────────────────────
+
+async def enqueue_training_job(user_id, priority=0):
+    """Queue a training job for the standalone trainer. Returns True on success."""
+    if _pool is None:
+        return await _run(db.enqueue_training_job, user_id, priority)
+    try:
+        async with _acquire() as conn:
+            await conn.execute(_ENQUEUE_TRAINING_JOB, user_id, priority)
+        return True
+    except Exception as e:
+        log.error("enqueuing training job failed", extra={"user_id": user_id, "error": str(e)})
+        return False
+
+
+# ─── Query timing ─────────────────────────────────────────────────────────────
+# Every public coroutine above reports its duration (DB thread or pool wait,
+# queries and commit) to yourdiary_db_query_seconds{function="..."}, as the
+# sync functions in models.database do, and to the "db" span of a traced
+# request. The sync function it runs on a DB thread is not timed again.
+
+_UNTIMED = {"init_pool", "close_pool"}
+
+
+def _timed(fn, histogram):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            histogram.observe(elapsed)
+            profiler.record("db", elapsed)
+    return wrapper
+
+
+for _name, _fn in list(globals().items()):
+    if (inspect.iscoroutinefunction(_fn) and _fn.__module__ == __name__ and not _name.startswith("_")
+            and _name not in _UNTIMED):
+        globals()[_name] = _timed(_fn, metrics.DB_QUERY.labels(_name))
@@ -0,0 +1,184 @@
+"""
+YourDiary — Auth Helpers
+Keeps password hashing and JWT verification off the request hot path.
+
+PasswordHasher runs werkzeug's (deliberately slow, ~0.1 s) hashes in a small
+process pool instead of the threadpool that sync routes such as suggestions
+share. At most PASSWORD_HASH_WORKERS hashes run at once, in processes with a
+lower CPU priority (PASSWORD_HASH_NICE), so a login storm cannot starve
+suggestion requests of threads or CPU. Requests beyond that wait in a
+bounded queue; past PASSWORD_HASH_QUEUE waiters they are refused with
+HashingOverloaded (503 in the API) instead of piling up.
+
+TokenCache remembers tokens whose signature has already been verified, until
+they expire, so repeat requests skip JWT decoding.
+
+Configure with environment variables:
+  PASSWORD_HASH_WORKERS=2    hashing processes (= max concurrent hashes)
+  PASSWORD_HASH_QUEUE=64     max requests waiting for a hashing slot
+  PASSWORD_HASH_NICE=10      niceness added to hashing processes (0 = off)
+  TOKEN_CACHE_SIZE=10000     verified tokens kept (least recently used evicted)
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_WORKERS = max(1, int(os.getenv("PASSWORD_HASH_WORKERS", "2")))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", "10"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class HashingOverloaded(RuntimeError):
+    """Too many requests are already waiting for a password hash."""
+
+
+def _init_hash_worker(nice):
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+# ─── Password hashing ─────────────────────────────────────────────────────────
+
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_waiting=PASSWORD_HASH_QUEUE,
+                 nice=PASSWORD_HASH_NICE):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.nice = nice
+
+        self._pool = None
+        self._slots = None            # asyncio.Semaphore, bound to the running loop
+        self._waiting = 0
+        self._running = 0
+
+        self._hashed = 0
+        self._verified = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the worker processes (spawned, so no threads are forked)."""
+        if self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_hash_worker,
+            initargs=(self.nice,),
+        )
+        # Spawn every worker now rather than on the first login
+        for future in [self._pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._slots = None
+
+    # ─── Hashing ──────────────────────────────────────────────────────────────
+
+    async def hash(self, password):
+        hashed = await self._submit(generate_password_hash, password)
+        self._hashed += 1
+        return hashed
+
+    async def verify(self, hashed, password):
+        ok = await self._submit(check_password_hash, hashed, password)
+        self._verified += 1
+        return ok
+
+    async def _submit(self, fn, *args):
+        if self._pool is None:
+            self.start()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        if self._waiting >= self.max_waiting:
+            self._rejected += 1
+            raise HashingOverloaded("too many password checks in progress")
+
+        self._waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - queued_at
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+        self._running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    def stats(self):
+        done = self._hashed + self._verified
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "waiting": self._waiting,
+            "hashed": self._hashed,
+            "verified": self._verified,
+            "rejected": self._rejected,
+            "wait_avg_s": round(self._wait_total / done, 4) if done else 0.0,
+            "wait_max_s": round(self._wait_max, 4),
+        }
+
+
+# ─── Verified tokens ──────────────────────────────────────────────────────────
+
+class TokenCache:
+    """LRU of token → claims for tokens whose signature was already checked."""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()   # token → (claims, expires_at)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, token):
+        """Return the cached claims, or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[token]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self._hits += 1
+            return claims
+
+    def put(self, token, claims, expires_at):
+        """Remember verified claims until expires_at (a Unix timestamp, or None)."""
+        with self._lock:
+            self._entries[token] = (claims, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
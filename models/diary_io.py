@@ -0,0 +1,140 @@
+"""
+YourDiary — Diary Import / Export
+Streaming parsers and writers for POST /api/diary/import and
+GET /api/diary/export.
+
+Formats (one entry per record, timestamp optional on import):
+  ndjson  {"message": "...", "timestamp": "2024-05-01 21:30:00"}
+  csv     header row "message,timestamp", RFC 4180 quoting (multi-line ok)
+
+Request bodies are parsed chunk by chunk, so an import of any size is held
+in memory only one batch (IMPORT_BATCH entries) at a time.
+"""
+
+import codecs
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+IMPORT_BATCH = 1000
+MAX_ERRORS_REPORTED = 20
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def normalize_timestamp(value):
+    """
+    Parse an ISO-8601 timestamp into the DB's "YYYY-MM-DD HH:MM:SS" (UTC).
+    Returns None for empty values; raises ValueError for invalid ones.
+    """
+    if value is None or str(value).strip() == "":
+        return None
+    ts = datetime.fromisoformat(str(value).strip())
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def now_timestamp():
+    # Same format and clock (UTC) as CURRENT_TIMESTAMP
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ─── Import ───────────────────────────────────────────────────────────────────
+
+async def iter_lines(chunks):
+    """Turn an async iterator of byte chunks into decoded lines (newline kept)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def _ndjson_records(lines):
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError("expected a JSON object")
+            yield number, obj.get("message"), obj.get("timestamp")
+        except ValueError as e:
+            yield number, None, ValueError(str(e))
+
+
+async def _csv_records(lines):
+    """CSV records; a quoted field may span lines, so lines are joined until quotes balance."""
+    header = None
+    number = 0
+    pending, pending_start = "", 0
+    async for line in lines:
+        number += 1
+        if not pending:
+            pending_start = number
+        pending += line
+        if pending.count('"') % 2:
+            continue                                  # inside a quoted field
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        fields = next(csv.reader(io.StringIO(record)))
+        if header is None:
+            header = [f.strip().lower() for f in fields]
+            if "message" not in header:
+                header = ["message", "timestamp"]     # headerless file
+            else:
+                continue
+        row = dict(zip(header, fields))
+        yield pending_start, row.get("message"), row.get("timestamp")
+    if pending.strip():
+        yield pending_start, None, ValueError("unterminated quoted field")
+
+
+async def iter_import_batches(chunks, fmt, batch_size=IMPORT_BATCH):
+    """
+    Parse a streamed body into batches of (message, timestamp) rows.
+    Yields (rows, errors) where errors is a list of "line N: reason" strings
+    for records that were skipped.
+    """
+    records = _ndjson_records(iter_lines(chunks)) if fmt == "ndjson" else _csv_records(iter_lines(chunks))
+    rows, errors = [], []
+    imported_at = now_timestamp()
+    async for number, message, timestamp in records:
+        try:
+            if isinstance(timestamp, Exception):
+                raise timestamp
+            if not isinstance(message, str) or not message.strip():
+                raise ValueError("missing message")
+            rows.append((message.strip(), normalize_timestamp(timestamp) or imported_at))
+        except ValueError as e:
+            errors.append(f"line {number}: {e}")
+        if len(rows) >= batch_size:
+            yield rows, errors
+            rows, errors = [], []
+    if rows or errors:
+        yield rows, errors
+
+
+# ─── Export ───────────────────────────────────────────────────────────────────
+
+def export_header(fmt):
+    return "message,timestamp\r\n" if fmt == "csv" else ""
+
+
+def export_line(fmt, message, timestamp):
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow([message, str(timestamp)])
+        return out.getvalue()
+    return json.dumps({"message": message, "timestamp": str(timestamp)}) + "\n"
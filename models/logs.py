@@ -0,0 +1,181 @@
+"""
+YourDiary — Logging
+Structured, non-blocking logging for the API and the trainer.
+
+Modules log through the standard library (logging.getLogger(__name__)) and
+pass their data as fields, not in the message text:
+
+  log.info("personal model loaded", extra={"user_id": 7, "version": 12, "duration_ms": 9.4})
+
+setup_logging() routes every record through a QueueHandler: the calling
+thread only puts the record on an in-memory queue, and a single listener
+thread formats it and writes it to stdout. Output is one JSON object per line
+(or plain text with LOG_FORMAT=text):
+
+  {"ts": "2025-01-01T12:00:00.123Z", "level": "INFO", "logger": "models.lstm_model",
+   "msg": "personal model loaded", "user_id": 7, "version": 12, "duration_ms": 9.4}
+
+Per-request messages on the suggestion path are DEBUG, so at the default
+level a suggestion request does no logging work beyond a level check.
+Repeated messages (same logger and message) are rate-limited: at most
+LOG_RATE_LIMIT per LOG_RATE_WINDOW seconds; the next one that gets through
+carries a "suppressed" count.
+
+Configure with environment variables:
+  LOG_LEVEL=INFO                   default level
+  LOG_LEVELS=models.database=DEBUG,models.training=WARNING
+                                   per-module overrides (comma-separated)
+  LOG_FORMAT=json                  json | text
+  LOG_RATE_LIMIT=20                records per message per window (0 = no limit)
+  LOG_RATE_WINDOW=10               seconds
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS}
+
+
+# ─── Formatters ───────────────────────────────────────────────────────────────
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+                  .replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = (f"{time.strftime('%H:%M:%S', time.localtime(record.created))} "
+                f"{record.levelname:<7} {record.name}: {record.getMessage()}")
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+# ─── Rate limiting ────────────────────────────────────────────────────────────
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most `limit` records per (logger, message) per `window` s."""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counts = {}    # (logger, msg) → [window_start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                self._counts[key] = [now, 1, 0]
+                if len(self._counts) > 10000:
+                    self._counts = {k: v for k, v in self._counts.items() if now - v[0] < self.window}
+            elif state[1] < self.limit:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+# ─── Queue handler ────────────────────────────────────────────────────────────
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue a copy of the record with its message and traceback resolved,
+    leaving all formatting to the listener thread."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=None, levels=None, fmt=None):
+    """Install the queue handler on the root logger (idempotent)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(TextFormatter() if (fmt or LOG_FORMAT) == "text" else JsonFormatter())
+
+        records = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+        for name, module_level in (levels if levels is not None else _parse_levels(LOG_LEVELS)).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
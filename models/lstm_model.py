@@ -1,5 +1,13 @@
+import logging
 import numpy as np
 import os
+import threading
+import time
+from collections import OrderedDict
+
+from models import metrics, profiler
+
+log = logging.getLogger(__name__)
 
 # EXACT 89-character vocabulary from your Sherlock Holmes book training
 voc = [
@@ -61,6 +69,9 @@ class LSTM:
         self.h = np.zeros((hidden_size, 1))
         self.c = np.zeros((hidden_size, 1))
 
+        # Fused gate matrices, set by freeze() on immutable snapshots
+        self._fused = None
+
     def sigmoid(self, x):
         return 1 / (1 + np.exp(-np.clip(x, -500, 500)))
 
@@ -83,6 +94,8 @@ class LSTM:
 
         h_prev = self.h.copy()
         c_prev = self.c.copy()
+        # Initial state — non-zero when a hidden state is carried across windows
+        self.c_init = c_prev
 
         for timestep in range(t):
             x_t = inp[timestep].reshape(-1, 1)
@@ -113,8 +126,14 @@ class LSTM:
         self.c = c_prev
         return self.y_vec
 
-    def back_prop(self, targets, learning_rate=0.01):
-        """Backward propagation - EXACT MATCH"""
+    def back_prop(self, targets, learning_rate=0.01, temperature=1.0):
+        """
+        Backward propagation - EXACT MATCH
+        targets may be one-hot rows or probability distributions (distillation).
+        With temperature T != 1 the loss is taken on softmax(y / T) and scaled
+        by T² (Hinton et al.) — dy is multiplied by T — so the gradient size
+        stays comparable.
+        """
         t = len(targets)
         dW_i = np.zeros_like(self.W_i)
         dW_f = np.zeros_like(self.W_f)
@@ -134,11 +153,15 @@ class LSTM:
         for timestep in reversed(range(t)):
             target = targets[timestep].reshape(-1, 1)
             y_pred = self.y_vec[timestep]
+            if temperature != 1.0:
+                y_pred = y_pred / temperature
             exp_scores = np.exp(y_pred - np.max(y_pred))
             probs = exp_scores / np.sum(exp_scores)
             total_loss += -np.sum(target * np.log(probs + 1e-8))
 
             dy = probs - target
+            if temperature != 1.0:
+                dy = dy * temperature
             dW_hy += dy @ self.h_vec[timestep].T
             db_y += dy
 
@@ -156,7 +179,7 @@ class LSTM:
                 c_prev = self.c_vec[timestep-1]
             else:
                 h_prev = np.zeros_like(h_current)
-                c_prev = np.zeros_like(c_current)
+                c_prev = getattr(self, 'c_init', np.zeros_like(c_current))
 
             do_raw = dh * self.tanh(c_current)
             do = do_raw * output_gate * (1 - output_gate)
@@ -230,6 +253,32 @@ class LSTM:
 
         return total_loss / sequences_trained if sequences_trained > 0 else 0
 
+    def train_stream(self, text_data, seq_length=25, learning_rate=0.005, max_windows=None):
+        """
+        Truncated BPTT over consecutive, non-overlapping windows of text_data.
+        The hidden state is carried from one window into the next (gradients
+        are not), so every character is trained on exactly once.
+        Returns (average loss, number of chars consumed). Consumed chars are
+        a multiple of seq_length; the tail is left for the next round.
+        """
+        n_windows = (len(text_data) - 1) // seq_length
+        if max_windows is not None:
+            n_windows = min(n_windows, max_windows)
+        if n_windows <= 0:
+            return 0, 0
+
+        encoded = self.one_hot_encoder.encode(text_data[:n_windows * seq_length + 1])
+        self.h = np.zeros((self.hidden_size, 1))
+        self.c = np.zeros((self.hidden_size, 1))
+        total_loss = 0
+
+        for w in range(n_windows):
+            start = w * seq_length
+            self.forw_prop(encoded[start:start + seq_length])
+            total_loss += self.back_prop(encoded[start + 1:start + seq_length + 1], learning_rate)
+
+        return total_loss / n_windows, n_windows * seq_length
+
     def save_weights(self, filename):
         """Save weights to .npz file."""
         try:
@@ -238,7 +287,7 @@ class LSTM:
                      b_i=self.b_i, b_f=self.b_f, b_c=self.b_c, b_o=self.b_o, b_y=self.b_y,
                      h=self.h, c=self.c)
         except Exception as e:
-            print(f"YourDiary Error saving weights: {e}")
+            log.error("saving weights failed", extra={"path": filename, "error": str(e)})
 
     def load_weights(self, filename):
         """Load weights from .npz file."""
@@ -248,8 +297,15 @@ class LSTM:
             self.W_hy = data['W_hy']; self.b_i = data['b_i']; self.b_f = data['b_f']
             self.b_c = data['b_c']; self.b_o = data['b_o']; self.b_y = data['b_y']
             self.h = data['h']; self.c = data['c']
+            self._fused = None
         except Exception as e:
-            print(f"YourDiary Error loading weights: {e}")
+            log.error("loading weights failed", extra={"path": filename, "error": str(e)})
+
+    @staticmethod
+    def hidden_size_of(filename):
+        """Hidden size of the weights saved in an .npz file (read from W_hy's shape)."""
+        with np.load(filename) as data:
+            return int(data['W_hy'].shape[1])
 
     def save_weights_to_bytes(self) -> bytes:
         """Serialize all weights to an in-memory npz binary blob."""
@@ -270,7 +326,151 @@ class LSTM:
         self.W_hy = npz['W_hy']; self.b_i = npz['b_i']; self.b_f = npz['b_f']
         self.b_c = npz['b_c']; self.b_o = npz['b_o']; self.b_y = npz['b_y']
         self.h = npz['h']; self.c = npz['c']
+        self._fused = None
+
 
+    # ─── Snapshots ────────────────────────────────────────────────────────────
+
+    WEIGHT_NAMES = ('W_i', 'W_f', 'W_c', 'W_o', 'W_hy', 'b_i', 'b_f', 'b_c', 'b_o', 'b_y')
+
+    def weight_arrays(self):
+        """All saved arrays in a fixed order: {name: ndarray} (weight store input)."""
+        return {name: getattr(self, name) for name in self.WEIGHT_NAMES + ('h', 'c')}
+
+    def set_weight_arrays(self, arrays):
+        """Restore weights from a {name: ndarray} dict (copied, so they stay writable)."""
+        for name in self.WEIGHT_NAMES + ('h', 'c'):
+            setattr(self, name, np.array(arrays[name], dtype=np.float64))
+        self._fused = None
+
+    def clone(self):
+        """Return an independent, writable copy of this model (for training)."""
+        other = LSTM(self.voc, self.hidden_size)
+        for name in self.WEIGHT_NAMES + ('h', 'c'):
+            setattr(other, name, getattr(self, name).copy())
+        return other
+
+    def freeze(self):
+        """
+        Mark weights read-only and precompute fused inference matrices.
+        A frozen model is an immutable snapshot: inference keeps all state in
+        local variables, so any number of threads can share it without locks.
+        """
+        for name in self.WEIGHT_NAMES:
+            getattr(self, name).flags.writeable = False
+        self._fused = self._fuse_gates()
+        return self
+
+    def _fuse_gates(self):
+        """Stack the four gate matrices so one matmul computes every gate."""
+        H = self.hidden_size
+        W = np.vstack([self.W_f, self.W_i, self.W_c, self.W_o])
+        b = np.vstack([self.b_f, self.b_i, self.b_c, self.b_o])
+        return W[:, :H].copy(), W[:, H:].copy(), b
+
+    def _step(self, char_idx, h, c, fused):
+        """
+        One inference timestep with caller-owned state. char_idx is the
+        one-hot position of the input char (None for out-of-vocab → zeros).
+        Returns (y, h, c) without touching any attribute of self.
+        """
+        W_h, W_x, b = fused
+        H = self.hidden_size
+        z = W_h @ h + b
+        if char_idx is not None:
+            z = z + W_x[:, char_idx:char_idx + 1]
+        forget_gate = self.sigmoid(z[:H])
+        input_gate = self.sigmoid(z[H:2 * H])
+        candidate_gate = self.tanh(z[2 * H:3 * H])
+        output_gate = self.sigmoid(z[3 * H:])
+        c = forget_gate * c + input_gate * candidate_gate
+        h = output_gate * self.tanh(c)
+        return self.W_hy @ h + self.b_y, h, c
+
+    def _encode_prompt(self, text, fused):
+        """Run the prompt from a zero state. Returns the (y, h, c) after it."""
+        h = np.zeros((self.hidden_size, 1))
+        c = np.zeros((self.hidden_size, 1))
+        y = None
+        for char in text:
+            y, h, c = self._step(self.one_hot_encoder.char_to_idx.get(char), h, c, fused)
+        return y, h, c
+
+    def _sample(self, y, temperature):
+        """Sample a vocabulary index from output logits y at a temperature."""
+        if y is None:
+            y = np.random.randn(self.vocab_size)
+        scaled_output = y.flatten() / temperature
+        exp_scores = np.exp(scaled_output - np.max(scaled_output))
+        probabilities = exp_scores / np.sum(exp_scores)
+        return np.random.choice(len(probabilities), p=probabilities)
+
+    def _inference_weights(self):
+        # Frozen snapshots reuse their fused matrices; mutable models
+        # (e.g. mid-training in train.py) pay the fusion cost per call
+        fused = getattr(self, '_fused', None)
+        return fused if fused is not None else self._fuse_gates()
+
+    # ─── Evaluation ───────────────────────────────────────────────────────────
+
+    def evaluate(self, texts, batch_size=64):
+        """
+        Next-char cross-entropy on held-out text: forward only, no gradients,
+        and no attribute of self is touched (safe on frozen snapshots).
+
+        texts is one string — split into batch_size contiguous streams that
+        run side by side, each keeping its state for its whole length — or a
+        list of strings (e.g. diary entries), each scored from a zero state
+        like a suggestion prompt. Out-of-vocabulary chars are skipped.
+        Returns {"chars", "loss" (nats/char), "bpc", "accuracy"}; the metrics
+        are None when there is nothing to score.
+        """
+        char_to_idx = self.one_hot_encoder.char_to_idx
+        if isinstance(texts, str):
+            idx = np.array([char_to_idx[ch] for ch in texts if ch in char_to_idx], dtype=np.intp)
+            length = -(-len(idx) // batch_size) if len(idx) else 0
+            # Consecutive streams overlap by one char: each one's last target is the next one's first input
+            sequences = [idx[i:i + length + 1] for i in range(0, max(len(idx) - 1, 0), max(length, 1))]
+        else:
+            sequences = [np.array([char_to_idx[ch] for ch in text if ch in char_to_idx], dtype=np.intp)
+                         for text in texts]
+        sequences = sorted((s for s in sequences if len(s) > 1), key=len)
+
+        W_h, W_x, b = self._inference_weights()
+        H = self.hidden_size
+        total_loss, correct, chars = 0.0, 0, 0
+        for start in range(0, len(sequences), batch_size):
+            batch = sequences[start:start + batch_size]
+            steps = len(batch[-1]) - 1
+            # (batch, steps) inputs/targets; -1 pads the shorter sequences
+            inputs = np.full((len(batch), steps), -1, dtype=np.intp)
+            targets = np.full((len(batch), steps), -1, dtype=np.intp)
+            for row, seq in enumerate(batch):
+                inputs[row, :len(seq) - 1] = seq[:-1]
+                targets[row, :len(seq) - 1] = seq[1:]
+
+            h = np.zeros((H, len(batch)))
+            c = np.zeros((H, len(batch)))
+            columns = np.arange(len(batch))
+            for t in range(steps):
+                z = W_h @ h + b + W_x[:, inputs[:, t]]
+                c = self.sigmoid(z[:H]) * c + self.sigmoid(z[H:2 * H]) * self.tanh(z[2 * H:3 * H])
+                h = self.sigmoid(z[3 * H:]) * self.tanh(c)
+                y = self.W_hy @ h + self.b_y
+                y = y - y.max(axis=0)
+                log_norm = np.log(np.exp(y).sum(axis=0))
+                valid = targets[:, t] >= 0
+                target = targets[valid, t]
+                total_loss -= float((y[target, columns[valid]] - log_norm[valid]).sum())
+                correct += int((y[:, valid].argmax(axis=0) == target).sum())
+                chars += len(target)
+
+        if not chars:
+            return {"chars": 0, "loss": None, "bpc": None, "accuracy": None}
+        loss = total_loss / chars
+        return {"chars": chars, "loss": loss, "bpc": float(loss / np.log(2)), "accuracy": correct / chars}
+
+    # ─── Suggestions ──────────────────────────────────────────────────────────
 
     def get_completions(self, text, num_suggestions=3, max_length=20):
         """Generate diary writing suggestions using your trained model"""
@@ -282,25 +482,23 @@ class LSTM:
             return self._generate_diary_suggestions(num_suggestions, max_length)
 
         try:
-            input_encoded = self.one_hot_encoder.encode(filtered_text)
+            fused = self._inference_weights()
+            # The prompt state is identical for every suggestion — encode it once
+            started = time.perf_counter()
+            state = self._encode_prompt(filtered_text, fused)
+            timings = {"encode": time.perf_counter() - started, "decode": 0.0, "sample": 0.0}
 
             for suggestion_idx in range(num_suggestions):
-                # Reset LSTM state for each suggestion
-                self.h = np.zeros((self.hidden_size, 1))
-                self.c = np.zeros((self.hidden_size, 1))
-
-                # Process input text - EXACT SAME AS YOUR generate_text METHOD
-                if len(input_encoded) > 0:
-                    self.forw_prop(input_encoded)
-
-                # Generate completion using the EXACT SAME METHOD
-                completion = self._generate_sequence_like_original(max_length, temperature=0.8)
+                completion = self._generate_sequence_like_original(
+                    max_length, temperature=0.8, state=state, fused=fused, timings=timings
+                )
 
                 if completion.strip() and completion not in suggestions:
                     suggestions.append(completion)
+            _observe_suggestion(timings)
 
         except Exception as e:
-            print(f"Error generating completions: {e}")
+            log.warning("completion generation failed", extra={"error": str(e)})
             return self._generate_diary_suggestions(num_suggestions, max_length)
 
         # Fill remaining suggestions if needed
@@ -311,24 +509,34 @@ class LSTM:
 
         return suggestions[:num_suggestions]
 
-    def _generate_sequence_like_original(self, num_chars, temperature=1.0):
-        """Generate sequence EXACTLY like your original generate_text method"""
+    def _generate_sequence_like_original(self, num_chars, temperature=1.0, state=None, fused=None,
+                                         timings=None):
+        """
+        Sample num_chars characters starting from a (y, h, c) prompt state.
+        If given, timings["sample"] / timings["decode"] accumulate the seconds
+        spent sampling and in forward steps.
+        """
+        fused = fused if fused is not None else self._inference_weights()
+        y, h, c = state if state is not None else (None, np.zeros((self.hidden_size, 1)),
+                                                   np.zeros((self.hidden_size, 1)))
         generated = ""
-        
+        sample_s = decode_s = 0.0
+        clock = time.perf_counter
+
         for _ in range(num_chars):
-            # EXACT SAME LOGIC AS YOUR generate_text METHOD
-            last_output = self.y_vec[-1].flatten() if hasattr(self, 'y_vec') else np.random.randn(self.vocab_size)
-            scaled_output = last_output / temperature
-            exp_scores = np.exp(scaled_output - np.max(scaled_output))
-            probabilities = exp_scores / np.sum(exp_scores)
-            next_char_idx = np.random.choice(len(probabilities), p=probabilities)
-            next_char = self.voc[next_char_idx]
-            generated += next_char
-            
+            t0 = clock()
+            next_char_idx = self._sample(y, temperature)
+            t1 = clock()
+            generated += self.voc[next_char_idx]
+
             # Continue with single character forward pass
-            next_input = self.one_hot_encoder.encode(next_char)
-            self.forw_prop(next_input)
-            
+            y, h, c = self._step(next_char_idx, h, c, fused)
+            sample_s += t1 - t0
+            decode_s += clock() - t1
+
+        if timings is not None:
+            timings["sample"] += sample_s
+            timings["decode"] += decode_s
         return generated
 
     def _generate_diary_suggestions(self, num_suggestions, max_length):
@@ -365,19 +573,17 @@ class LSTM:
             return self._generate_diary_sentences(num_suggestions)
 
         try:
-            input_encoded = self.one_hot_encoder.encode(filtered_text)
+            fused = self._inference_weights()
+            started = time.perf_counter()
+            state = self._encode_prompt(filtered_text, fused)
+            timings = {"encode": time.perf_counter() - started, "decode": 0.0, "sample": 0.0}
 
             for suggestion_idx in range(num_suggestions):
-                self.h = np.zeros((self.hidden_size, 1))
-                self.c = np.zeros((self.hidden_size, 1))
-
-                if len(input_encoded) > 0:
-                    self.forw_prop(input_encoded)
-                
-                completion = self._generate_until_period()
+                completion = self._generate_until_period(state=state, fused=fused, timings=timings)
 
                 if completion.strip() and completion not in suggestions:
                     suggestions.append(completion)
+            _observe_suggestion(timings)
 
         except Exception as e:
             return self._generate_diary_sentences(num_suggestions)
@@ -389,18 +595,21 @@ class LSTM:
 
         return suggestions[:num_suggestions]
 
-    def _generate_until_period(self):
-        """Generate text until period"""
+    def _generate_until_period(self, state=None, fused=None, timings=None):
+        """Generate text until period (timings: see _generate_sequence_like_original)"""
+        fused = fused if fused is not None else self._inference_weights()
+        y, h, c = state if state is not None else (None, np.zeros((self.hidden_size, 1)),
+                                                   np.zeros((self.hidden_size, 1)))
         completion = ''
         temperature = 0.8
+        sample_s = decode_s = 0.0
+        clock = time.perf_counter
 
         for _ in range(80):
             try:
-                last_output = self.y_vec[-1].flatten() if hasattr(self, 'y_vec') else np.random.randn(self.vocab_size)
-                scaled_output = last_output / temperature
-                exp_scores = np.exp(scaled_output - np.max(scaled_output))
-                probabilities = exp_scores / np.sum(exp_scores)
-                next_char_idx = np.random.choice(len(probabilities), p=probabilities)
+                t0 = clock()
+                next_char_idx = self._sample(y, temperature)
+                sample_s += clock() - t0
                 next_char = self.voc[next_char_idx]
                 completion += next_char
 
@@ -410,12 +619,16 @@ class LSTM:
                     break
 
                 # Continue forward pass
-                next_input = self.one_hot_encoder.encode(next_char)
-                self.forw_prop(next_input)
+                t0 = clock()
+                y, h, c = self._step(next_char_idx, h, c, fused)
+                decode_s += clock() - t0
 
             except Exception as e:
                 break
 
+        if timings is not None:
+            timings["sample"] += sample_s
+            timings["decode"] += decode_s
         return completion
 
     def _generate_diary_sentences(self, num_suggestions):
@@ -431,71 +644,266 @@ class LSTM:
         return sentences[:num_suggestions]
 
 
+_SUGGESTION_STAGES = {stage: metrics.SUGGESTION_STAGE.labels(stage)
+                      for stage in ("encode", "decode", "sample")}
+
+
+def _observe_suggestion(timings):
+    for stage, seconds in timings.items():
+        _SUGGESTION_STAGES[stage].observe(seconds)
+        profiler.record(stage, seconds)
+
+
+# ─── Incremental training stream ──────────────────────────────────────────────
+
+TRAIN_SEQ_LENGTH = 25
+TRAIN_MAX_WINDOWS = int(os.getenv("TRAIN_MAX_WINDOWS", "200"))    # compute cap per round
+TRAIN_MAX_MESSAGES = int(os.getenv("TRAIN_MAX_MESSAGES", "500"))  # fetch cap per round
+
+
+def _build_training_stream(rows, cursor_id, cursor_offset):
+    """
+    Join (id, message) rows into one training stream, skipping the part of
+    the cursor message already trained on. Each message contributes its text
+    plus a trailing space. Returns (text, spans) where spans lists
+    (message_id, start_offset, length) for mapping positions back to a cursor.
+    """
+    pieces, spans = [], []
+    for msg_id, message in rows:
+        start = cursor_offset if msg_id == cursor_id else 0
+        piece = (message + " ")[start:]
+        if piece:
+            pieces.append(piece)
+            spans.append((msg_id, start, len(piece)))
+    return "".join(pieces), spans
+
+
+def _advance_cursor(spans, consumed):
+    """Map `consumed` chars of the stream back to a (message_id, offset) cursor."""
+    for msg_id, start, length in spans:
+        if consumed < length:
+            return msg_id, start + consumed
+        consumed -= length
+    msg_id, start, length = spans[-1]
+    return msg_id, start + length
+
+
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "200"))   # max user models in memory
+
+# Serving tier: "full" serves the 128-unit base model; "small" a distilled
+# student (python train.py --distill-from base_model.npz --hidden 64) that is
+# faster and several times smaller per cached user
+MODEL_TIER = os.getenv("MODEL_TIER", "full").lower()
+BASE_MODEL_PATHS = {
+    "full": os.getenv("BASE_MODEL_PATH", "base_model.npz"),
+    "small": os.getenv("SMALL_MODEL_PATH", "base_model_small.npz"),
+}
+DEFAULT_HIDDEN_SIZE = 128
+
+_LOAD_LOCK_STRIPES = 64   # cold loads of users in different stripes run in parallel
+
+_CACHE_HIT = metrics.MODEL_CACHE.labels("hit")
+_CACHE_MISS = metrics.MODEL_CACHE.labels("miss")
+
+
+def _observe_load(user_id, source, started, version=None):
+    elapsed = time.perf_counter() - started
+    metrics.MODEL_LOAD.labels(source).observe(elapsed)
+    profiler.record("model_load", elapsed)
+    log.info("personal model loaded", extra={"user_id": user_id, "source": source,
+                                             "version": version, "duration_ms": round(elapsed * 1000, 2)})
+
+
 class LSTMModelManager:
-    def __init__(self):
+    def __init__(self, weight_writer=None, cache_size=MODEL_CACHE_SIZE, tier=MODEL_TIER):
+        """
+        weight_writer: optional models.persistence.WeightWriter. When given,
+        trained weights are saved write-behind instead of inline.
+        tier: "full" or "small" — which base model (and model size) to serve.
+        """
         self.base_model = None
-        self.user_models = {}  # in-memory cache: {user_id: LSTM}
+        self.tier = tier if tier in BASE_MODEL_PATHS else "full"
+        self.hidden_size = DEFAULT_HIDDEN_SIZE
+        self.weight_writer = weight_writer
+        if weight_writer is not None:
+            weight_writer.on_saved = self._saved
+            weight_writer.on_conflict = self._forget
+        self.cache_size = max(1, cache_size)
+        self.user_models = OrderedDict()   # in-memory LRU cache: {user_id: LSTM}
+        self.user_versions = {}   # weight version each cached model was loaded at
+        # Striped by user_id, so one cold load per user runs at a time
+        self._load_locks = [threading.Lock() for _ in range(_LOAD_LOCK_STRIPES)]
+        self._reload_thread = None
+        self._reload_stop = threading.Event()
+        metrics.MODEL_CACHE_SIZE.set_function(lambda: len(self.user_models))
 
     def load_base_model(self):
-        """Load or create base LSTM model from pre-trained weights."""
-        self.base_model = LSTM(voc, hidden_size=128)
-
-        if os.path.exists("base_model.npz"):
+        """Load or create base LSTM model from pre-trained weights (for self.tier)."""
+        path = BASE_MODEL_PATHS[self.tier]
+        if self.tier != "full" and not os.path.exists(path):
+            log.warning("small model not found, serving the full model", extra={"path": path})
+            self.tier, path = "full", BASE_MODEL_PATHS["full"]
+
+        self.hidden_size = DEFAULT_HIDDEN_SIZE
+        if os.path.exists(path):
             try:
-                self.base_model.load_weights("base_model.npz")
-                print("✅ YourDiary AI: Base model loaded successfully")
+                self.hidden_size = LSTM.hidden_size_of(path)
+                self.base_model = LSTM(voc, hidden_size=self.hidden_size)
+                self.base_model.load_weights(path)
+                log.info("base model loaded", extra={"path": path, "tier": self.tier,
+                                                     "hidden_size": self.hidden_size})
             except Exception as e:
-                print(f"⚠️ YourDiary AI: Error loading base model: {e}")
-                print("ℹ️  Using fresh AI weights — will learn from your writing!")
+                log.warning("base model load failed, using fresh weights", extra={"error": str(e)})
         else:
-            print("ℹ️  YourDiary AI: No base_model.npz found — using fresh weights")
+            log.info("no base model found, using fresh weights", extra={"path": path})
+        if self.base_model is None:
+            self.hidden_size = DEFAULT_HIDDEN_SIZE
+            self.base_model = LSTM(voc, hidden_size=self.hidden_size)
+
+        # New users' first saved versions are stored as deltas against the base
+        from models import weight_store
+        weight_store.set_base(self.base_model.weight_arrays())
 
     def get_user_model(self, user_id):
         """
         Return the in-memory model for user_id.
         On first access, loading priority is:
-          1. Database (BLOB/BYTEA)  — works on Render/production
-          2. Filesystem (.npz file) — local dev fallback
-          3. Base model copy        — brand new user
+          1. Database (weight store) — works on Render/production
+          2. Filesystem (.npz file)  — local dev fallback
+          3. Base model copy         — brand new user
         """
-        if user_id not in self.user_models:
-            self.user_models[user_id] = LSTM(voc, hidden_size=128)
-            loaded = False
+        model = self.user_models.get(user_id)
+        if model is not None:
+            self._touch(user_id)
+            _CACHE_HIT.inc()
+            return model
+
+        with self._load_lock(user_id):
+            model = self.user_models.get(user_id)
+            if model is None:
+                _CACHE_MISS.inc()
+                model, version = self._load_user_model(user_id)
+                model = self._publish(user_id, model, version)
+            else:
+                _CACHE_HIT.inc()   # loaded by a concurrent request
+
+        return model
+
+    def preload(self, user_id):
+        """
+        Load user_id's model into the cache ahead of its first request
+        (models.warmup), without counting a cache lookup. The model enters the
+        LRU as least recently used, so it never pushes out a model a request
+        has used. Returns "cached", "full" (no free slot) or "loaded".
+        """
+        if user_id in self.user_models:
+            return "cached"
+        with self._load_lock(user_id):
+            if user_id in self.user_models:
+                return "cached"
+            if len(self.user_models) >= self.cache_size:
+                return "full"
+            model, version = self._load_user_model(user_id)
+            self._publish(user_id, model, version, recent=False)
+        return "loaded"
+
+    # ─── Cache (LRU of immutable snapshots) ───────────────────────────────────
+
+    def _touch(self, user_id):
+        try:
+            self.user_models.move_to_end(user_id)
+        except KeyError:
+            pass  # evicted concurrently — caller still holds its snapshot
+
+    def _load_lock(self, user_id):
+        return self._load_locks[hash(user_id) % len(self._load_locks)]
 
-            # ── 1. Try database storage ────────────────────────────────────────
+    def _publish(self, user_id, model, version=None, recent=True):
+        """
+        Freeze and install a model as user_id's snapshot, evicting LRU overflow.
+        recent=False installs it as the least recently used (warm-up).
+        """
+        model.freeze()
+        if version is not None:
+            self.user_versions[user_id] = version
+        self.user_models[user_id] = model
+        if recent:
+            self._touch(user_id)
+        else:
+            self.user_models.move_to_end(user_id, last=False)
+        while len(self.user_models) > self.cache_size:
+            try:
+                evicted_id, _ = self.user_models.popitem(last=False)
+            except KeyError:
+                break
+            self._evict(evicted_id)
+        return model
+
+    def _saved(self, user_id, version):
+        """WeightWriter callback: user_id's cached weights are now stored as `version`."""
+        if user_id in self.user_models:
+            self.user_versions[user_id] = version
+
+    def _forget(self, user_id):
+        """Drop user_id's snapshot without saving; the next request reloads it."""
+        self.user_models.pop(user_id, None)
+        self.user_versions.pop(user_id, None)
+
+    def _evict(self, user_id):
+        """Drop cache bookkeeping for user_id; the writer saves its unsaved weights."""
+        self.user_versions.pop(user_id, None)
+        if self.weight_writer is not None:
+            self.weight_writer.write_evicted(user_id)
+
+    def _load_user_model(self, user_id):
+        """Build a user's model from storage. Returns (LSTM, version)."""
+        started = time.perf_counter()
+        # ── 0. Unsaved weights still waiting in the write-behind buffer ────────
+        pending = self.weight_writer.pending(user_id) if self.weight_writer else None
+        if pending is not None:
+            _observe_load(user_id, "pending", started, pending.base_version)
+            return pending.model, pending.base_version
+
+        model = LSTM(voc, hidden_size=self.hidden_size)
+
+        # ── 1. Try database storage (versioned weight store) ───────────────────
+        try:
+            from models import weight_store
+            weights, entry_count, version = weight_store.load_user_weights(user_id)
+            if weights is not None and weights["W_hy"].shape[1] != self.hidden_size:
+                # Trained under the other tier — restart from this tier's base
+                log.info("stored model has another size, using base", extra={
+                    "user_id": user_id, "stored_hidden": int(weights["W_hy"].shape[1]),
+                    "hidden_size": self.hidden_size})
+                weights = None
+            if weights is not None:
+                model.set_weight_arrays(weights)
+                _observe_load(user_id, "store", started, version)
+                return model, version
+        except Exception as e:
+            log.warning("model load from DB failed", extra={"user_id": user_id, "error": str(e)})
+
+        # ── 2. Fallback: filesystem .npz ───────────────────────────────────────
+        user_path = f"yourdiary_users/user_{user_id}.npz"
+        if os.path.exists(user_path):
             try:
-                from models.database import load_user_model_weights
-                weights_bytes, entry_count = load_user_model_weights(user_id)
-                if weights_bytes:
-                    self.user_models[user_id].load_weights_from_bytes(weights_bytes)
-                    print(f"✅ YourDiary AI: Personal model loaded from DB for user {user_id} "
-                          f"(trained on {entry_count} entries)")
-                    loaded = True
+                if LSTM.hidden_size_of(user_path) == self.hidden_size:
+                    model.load_weights(user_path)
+                    _observe_load(user_id, "file", started, 0)
+                    return model, 0
             except Exception as e:
-                print(f"⚠️ YourDiary AI: DB model load failed for user {user_id}: {e}")
-
-            # ── 2. Fallback: filesystem .npz ───────────────────────────────────
-            if not loaded:
-                user_path = f"yourdiary_users/user_{user_id}.npz"
-                if os.path.exists(user_path):
-                    try:
-                        self.user_models[user_id].load_weights(user_path)
-                        print(f"✅ YourDiary AI: Personal model loaded from file for user {user_id}")
-                        loaded = True
-                    except Exception as e:
-                        print(f"⚠️ YourDiary AI: File model load failed for user {user_id}: {e}")
-
-            # ── 3. Fallback: copy base model ───────────────────────────────────
-            if not loaded:
-                self.copy_base_to_user(user_id)
-
-        return self.user_models[user_id]
-
-    def copy_base_to_user(self, user_id):
+                log.warning("model load from file failed", extra={"user_id": user_id, "error": str(e)})
+
+        # ── 3. Fallback: copy base model ───────────────────────────────────────
+        self.copy_base_to_user(user_id, model)
+        _observe_load(user_id, "base", started, 0)
+        return model, 0
+
+    def copy_base_to_user(self, user_id, model):
         """Initialize a user's model by copying base model weights."""
-        if self.base_model and user_id in self.user_models:
+        if self.base_model:
             try:
-                m = self.user_models[user_id]
+                m = model
                 m.W_i  = self.base_model.W_i.copy()
                 m.W_f  = self.base_model.W_f.copy()
                 m.W_c  = self.base_model.W_c.copy()
@@ -506,64 +914,205 @@ class LSTMModelManager:
                 m.b_c  = self.base_model.b_c.copy()
                 m.b_o  = self.base_model.b_o.copy()
                 m.b_y  = self.base_model.b_y.copy()
-                print(f"📋 YourDiary AI: Base model copied to new user {user_id}")
             except Exception as e:
-                print(f"⚠️ YourDiary AI: Error copying base model: {e}")
+                log.error("copying base model failed", extra={"user_id": user_id, "error": str(e)})
+
+    # ─── Evaluation ───────────────────────────────────────────────────────────
 
-    def train_user_model_background(self, user_id, diary_entries):
+    def score_user_model(self, user_id, texts):
+        """
+        Score a user's personal model and the base model on texts (their
+        recent entries) with LSTM.evaluate. Entries the model has already
+        trained on score optimistically; the gap to the base model shows how
+        much the personal model has adapted.
         """
-        Background training loop — called in a daemon thread every 3 diary entries.
+        personal = self.get_user_model(user_id)
+        return {
+            "version": self.user_versions.get(user_id),
+            "personal": personal.evaluate(texts),
+            "base": self.base_model.evaluate(texts) if self.base_model is not None else None,
+        }
+
+    def _training_base(self, user_id):
+        """
+        The snapshot a training round should start from. A cached model can be
+        stale: another trainer process may have saved a newer version since it
+        was loaded, so unless it has unsaved weights it is checked against the
+        stored version and reloaded if that moved.
+        """
+        pending = self.weight_writer.pending(user_id) if self.weight_writer else None
+        if pending is None and user_id in self.user_models:
+            from models.database import get_user_model_versions
+            stored = get_user_model_versions([user_id]).get(user_id)
+            if stored is not None and stored != self.user_versions.get(user_id, 0):
+                with self._load_lock(user_id):
+                    model, version = self._load_user_model(user_id)
+                    return self._publish(user_id, model, version)
+        return self.get_user_model(user_id)
+
+    # ─── Hot reload (retrained elsewhere, or rolled back) ─────────────────────
+
+    def refresh_changed_models(self):
+        """
+        Reload cached models whose stored version moved past the cached one:
+        retrained by the standalone trainer or another API process, or rolled
+        back. One version query covers every cached user; only changed models
+        are rebuilt, off the request path, and swapped in atomically. Models
+        with unsaved weights are left to the WeightWriter, whose write is
+        refused if the head moved and then drops them from the cache.
+        Returns the list of reloaded user ids.
+        """
+        from models.database import get_user_model_versions
+        cached = list(self.user_models.keys())
+        versions = get_user_model_versions(cached)
+        reloaded = []
+        for user_id, version in versions.items():
+            if version <= self.user_versions.get(user_id, 0) or user_id not in self.user_models:
+                continue
+            if self.weight_writer is not None and self.weight_writer.pending(user_id) is not None:
+                continue
+            model, loaded_version = self._load_user_model(user_id)
+            self._publish(user_id, model, loaded_version)
+            reloaded.append(user_id)
+        if reloaded:
+            log.info("reloaded retrained models", extra={"count": len(reloaded)})
+        return reloaded
+
+    def start_reload_watcher(self, interval=5.0):
+        """Poll for retrained models every `interval` seconds in a daemon thread."""
+        if self._reload_thread is not None:
+            return
+
+        def _watch():
+            while not self._reload_stop.wait(interval):
+                try:
+                    self.refresh_changed_models()
+                except Exception as e:
+                    log.warning("model reload check failed", extra={"error": str(e)})
+
+        self._reload_stop.clear()
+        self._reload_thread = threading.Thread(target=_watch, name="yourdiary-reload", daemon=True)
+        self._reload_thread.start()
+
+    def stop_reload_watcher(self):
+        self._reload_stop.set()
+        if self._reload_thread is not None:
+            self._reload_thread.join(timeout=5)
+            self._reload_thread = None
+
+    def train_user_model_background(self, user_id, payload=None):
+        """
+        Background training job — run by the TrainingScheduler every 3 diary entries.
 
         Flow:
-          1. Run LSTM incremental training on recent diary text
-          2. Save updated weights → database  (persists across Render redeploys)
-          3. Save updated weights → filesystem (local dev convenience)
+          1. Read only the text past the user's training cursor
+          2. Stream it through the LSTM in windows with a carried hidden state
+             on a private copy of the model
+          3. Publish the copy by swapping the cached reference (atomic)
+          4. Save updated weights + advanced cursor → database (write-behind
+             when a WeightWriter is configured, inline otherwise)
+
+        Suggestion requests keep using the previous snapshot until the swap,
+        so they never observe half-updated weights. An inline save only lands
+        if the stored version is still the one training started from; if
+        another process saved first, the round is discarded and its text is
+        trained again on top of their version by the next job.
+
+        Returns "trained", "skipped" (not enough new text) or "conflict"
+        (round discarded); errors are raised to the caller, which records
+        the job as failed. `payload` is unused.
         """
+        started = time.perf_counter()
+        from models import weight_store
+        from models.database import load_training_cursor, get_messages_from
+        pending = self.weight_writer.pending(user_id) if self.weight_writer else None
+        if pending is not None and pending.cursor:
+            cursor_id, cursor_offset = pending.cursor   # DB copy is not written yet
+        else:
+            cursor_id, cursor_offset = load_training_cursor(user_id)
+        rows = get_messages_from(user_id, cursor_id, limit=TRAIN_MAX_MESSAGES)
+        training_text, spans = _build_training_stream(rows, cursor_id, cursor_offset)
+
+        if len(training_text) <= TRAIN_SEQ_LENGTH:
+            log.debug("not enough new text to train", extra={"user_id": user_id})
+            return "skipped"
+
+        # ── LSTM incremental training (truncated BPTT over new text) ───────────
+        user_model = self._training_base(user_id).clone()
+        base_version = self.user_versions.get(user_id, 0)
+        loss, consumed = user_model.train_stream(
+            training_text, seq_length=TRAIN_SEQ_LENGTH, learning_rate=0.005,
+            max_windows=TRAIN_MAX_WINDOWS
+        )
+        new_cursor = _advance_cursor(spans, consumed)
+        metrics.TRAINING_LOSS.observe(loss)
+
+        # Count total entries for tracking
         try:
-            print(f"🎯 YourDiary AI: Training personalized model for user {user_id}")
-            user_model = self.get_user_model(user_id)
-            training_text = " ".join(diary_entries)
-
-            if len(training_text) < 25:
-                print(f"⏭️  YourDiary AI: Not enough text to train user {user_id} yet")
-                return
-
-            # ── LSTM incremental training ──────────────────────────────────────
-            loss = user_model.train_incremental(
-                training_text, seq_length=25, learning_rate=0.005
-            )
-            print(f"📊 YourDiary AI: User {user_id} training loss = {loss:.4f}")
-
-            # Count total entries for tracking
-            try:
-                from models.database import get_user_messages
-                entry_count = len(get_user_messages(user_id))
-            except Exception:
-                entry_count = len(diary_entries)
-
-            # ── 1. Save to database (primary — survives redeploys) ─────────────
-            try:
-                from models.database import save_user_model_weights
-                weights_bytes = user_model.save_weights_to_bytes()
-                if save_user_model_weights(user_id, weights_bytes, entry_count):
-                    print(f"💾 YourDiary AI: Weights saved to DB for user {user_id} "
-                          f"({len(weights_bytes):,} bytes, {entry_count} entries)")
-                else:
-                    print(f"⚠️  YourDiary AI: Failed to save weights to DB for user {user_id}")
-            except Exception as e:
-                print(f"⚠️  YourDiary AI: DB save error for user {user_id}: {e}")
-
-            # ── 2. Save to filesystem (fallback for local dev) ─────────────────
+            from models.database import get_entry_count
+            entry_count = get_entry_count(user_id)
+        except Exception:
+            entry_count = 0
+
+        # ── Publish: a single reference swap, readers never lock ───────────────
+        # Marked dirty first, so a concurrent eviction + reload finds it
+        # The version is known at once for an inline save; write-behind
+        # reports it through _saved() when the flush lands
+        version = None
+        if self.weight_writer is not None:
+            self.weight_writer.mark_dirty(user_id, user_model, entry_count, new_cursor, loss,
+                                          base_version)
+        else:
             try:
-                os.makedirs("yourdiary_users", exist_ok=True)
-                user_model.save_weights(f"yourdiary_users/user_{user_id}.npz")
-                print(f"💾 YourDiary AI: Weights also saved to filesystem for user {user_id}")
-            except Exception as e:
-                print(f"⚠️  YourDiary AI: Filesystem save error: {e}")
-
-            print(f"🎉 YourDiary AI: User {user_id}'s personal model updated successfully!")
-
+                version = self._save_now(user_id, user_model, entry_count, new_cursor, loss,
+                                         base_version)
+            except weight_store.VersionConflict:
+                self._forget(user_id)
+                log.warning("model saved elsewhere while training, round discarded", extra={
+                    "user_id": user_id, "version": base_version})
+                return "conflict"
+            if version is None:
+                # The stored cursor didn't move: publishing would retrain this text
+                raise RuntimeError(f"saving weights for user {user_id} failed, round discarded")
+        self._publish(user_id, user_model, version)
+
+        log.info("personal model trained", extra={
+            "user_id": user_id, "version": version, "base_version": base_version,
+            "loss": round(float(loss), 4),
+            "windows": consumed // TRAIN_SEQ_LENGTH, "entries": entry_count,
+            "cursor": list(new_cursor), "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        return "trained"
+
+    def _save_now(self, user_id, user_model, entry_count, cursor, loss=None, expected_version=None):
+        """
+        Inline persistence, used when no write-behind writer is configured.
+        Returns the new stored version, or None (nothing written) if the
+        database save failed.
+        Raises weight_store.VersionConflict if the stored version is no longer
+        expected_version, without writing anything.
+        """
+        # ── 1. Save to database (primary — survives redeploys) ─────────────────
+        from models import weight_store
+        try:
+            written = weight_store.save_versions(
+                [(user_id, user_model.weight_arrays(), entry_count, cursor, loss, expected_version)]
+            )
+            error = None
+        except Exception as e:
+            written, error = None, str(e)
+        if written is None:
+            log.warning("saving weights to DB failed", extra={"user_id": user_id, "error": error})
+            return None
+        if user_id in written["conflicts"]:
+            raise weight_store.VersionConflict(f"user {user_id} is past version {expected_version}")
+        log.info("weights saved", extra={"user_id": user_id, "version": written["heads"][user_id],
+                                         "bytes": written["bytes"], "entries": entry_count})
+
+        # ── 2. Save to filesystem (fallback for local dev) ─────────────────────
+        try:
+            os.makedirs("yourdiary_users", exist_ok=True)
+            user_model.save_weights(f"yourdiary_users/user_{user_id}.npz")
         except Exception as e:
-            print(f"❌ YourDiary AI: Training error for user {user_id}: {e}")
-            import traceback
-            traceback.print_exc()
\ No newline at end of file
+            log.warning("saving weights to filesystem failed", extra={"user_id": user_id, "error": str(e)})
+        return written["heads"][user_id]
@@ -0,0 +1,289 @@
+"""
+YourDiary — Metrics
+In-process counters, gauges and histograms, rendered in the Prometheus text
+exposition format by GET /metrics. No client library or external service:
+every metric lives in this process and is read on scrape.
+
+Usage:
+  from models import metrics
+  metrics.MODEL_CACHE.labels("hit").inc()
+  metrics.TRAINING_RUN.observe(1.25)
+  with metrics.DB_QUERY.labels("save_message").time():
+      ...
+
+All metrics are registered below, so this file is the list of what the API
+exports. Label values must come from small fixed sets (stage, route
+template, function name) — never user ids or free text.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+LOSS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0)
+
+_REGISTRY = []
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+# ─── Metric types ─────────────────────────────────────────────────────────────
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def labels(self, *values):
+        """The child metric for one combination of label values."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}_total{_format_labels(labelnames, values)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_fn")
+
+    def __init__(self):
+        self._value = 0.0
+        self._fn = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, fn):
+        """Read the value from fn() at scrape time instead."""
+        self._fn = fn
+
+    def samples(self, name, labelnames, values):
+        value = self._value
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                return []
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, fn):
+        self._default().set_function(fn)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)   # last slot: above the largest bound
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self._bounds + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', _format_value(bound))])} "
+                         f"{cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+def render():
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ─── YourDiary metrics ────────────────────────────────────────────────────────
+
+HTTP_REQUEST = Histogram(
+    "yourdiary_http_request_duration_seconds",
+    "Request latency by route template, method and status code.",
+    ("method", "route", "status"))
+
+SUGGESTION_STAGE = Histogram(
+    "yourdiary_suggestion_stage_seconds",
+    "Time per suggestion request in each stage: prompt encode, decode steps, sampling.",
+    ("stage",))
+
+MODEL_CACHE = Counter(
+    "yourdiary_model_cache_requests",
+    "Personal model lookups served from memory (hit) or loaded from storage (miss).",
+    ("result",))
+MODEL_LOAD = Histogram(
+    "yourdiary_model_load_seconds",
+    "Cold load time of a personal model, by where it came from.",
+    ("source",), buckets=LATENCY_BUCKETS)
+MODEL_CACHE_SIZE = Gauge(
+    "yourdiary_model_cache_models",
+    "Personal models currently held in memory.")
+
+TRAINING_QUEUE_WAIT = Histogram(
+    "yourdiary_training_queue_wait_seconds",
+    "Time a training job waited in the scheduler queue before running.",
+    buckets=SLOW_BUCKETS)
+TRAINING_RUN = Histogram(
+    "yourdiary_training_run_seconds",
+    "Time spent running one training job.",
+    buckets=SLOW_BUCKETS)
+TRAINING_LOSS = Histogram(
+    "yourdiary_training_loss",
+    "Mean cross-entropy loss of each training round.",
+    buckets=LOSS_BUCKETS)
+TRAINING_JOBS = Counter(
+    "yourdiary_training_jobs",
+    "Training jobs by outcome.",
+    ("result",))
+TRAINING_QUEUE_DEPTH = Gauge(
+    "yourdiary_training_queue_depth",
+    "Users waiting for a training job.")
+
+DB_QUERY = Histogram(
+    "yourdiary_db_query_seconds",
+    "Time spent in each models.database function (including waiting for a connection).",
+    ("function",))
+
+
+# ─── HTTP middleware ──────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into HTTP_REQUEST, labelled by
+    the matched route template (e.g. /api/tasks/{task_id}), not the raw path.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST.labels(scope["method"], route, status[0]).observe(
+                time.perf_counter() - started)
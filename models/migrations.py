@@ -0,0 +1,373 @@
+"""
+YourDiary — Schema Migrations
+Versioned, forward-only schema changes for SQLite and PostgreSQL.
+
+init_db() creates the original tables, then calls run_migrations(), which
+applies every migration newer than the version recorded in schema_version.
+Each migration runs in its own transaction together with its
+schema_version row, under a lock (pg_advisory_xact_lock / BEGIN IMMEDIATE)
+so API workers and trainers starting together apply it exactly once.
+
+Usage:
+  python -m models.migrations    # apply pending migrations, show status
+
+explain_hot_queries() EXPLAINs the request-path queries; tests/test_query_plans.py
+fails if any of them falls back to a full scan.
+
+Adding a migration: append (version, description, fn) to MIGRATIONS, where
+fn(cursor, ph, is_pg) issues the DDL. Never edit a migration once shipped.
+"""
+
+from datetime import date
+
+from models import database as db
+from models.database import _transaction, _add_column_if_missing
+
+_PG_LOCK_ID = 7_355_608   # arbitrary app-wide advisory lock key
+
+
+# ─── Migrations ───────────────────────────────────────────────────────────────
+
+def _m1_model_versions(cursor, ph, is_pg):
+    # Weight version — bumped on every save so API workers can detect updates
+    _add_column_if_missing(cursor, is_pg, "user_models", "version", "INTEGER DEFAULT 0")
+    # Training cursor — last message trained on and chars of it consumed
+    _add_column_if_missing(cursor, is_pg, "user_models", "cursor_message_id", "INTEGER DEFAULT 0")
+    _add_column_if_missing(cursor, is_pg, "user_models", "cursor_offset", "INTEGER DEFAULT 0")
+
+
+def _m2_training_jobs(cursor, ph, is_pg):
+    pk = "SERIAL PRIMARY KEY" if is_pg else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    # Training jobs claimed by the standalone trainer (python -m models.trainer)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS training_jobs (
+            id {pk},
+            user_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            priority INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            worker TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            claimed_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    # At most one pending job per user — lets enqueue coalesce with a single UPSERT
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_training_jobs_pending_user
+        ON training_jobs (user_id) WHERE status = 'pending'
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_training_jobs_status
+        ON training_jobs (status, priority, id)
+    """)
+
+
+def _m3_user_messages_indexes(cursor, ph, is_pg):
+    # get_user_messages: WHERE user_id = ? ORDER BY timestamp DESC [LIMIT n]
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_messages_user_ts
+        ON user_messages (user_id, timestamp DESC)
+    """)
+    # get_messages_from (training cursor): WHERE user_id = ? AND id >= ? ORDER BY id
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_messages_user_id
+        ON user_messages (user_id, id)
+    """)
+
+
+def _m4_tasks_indexes(cursor, ph, is_pg):
+    # get_user_tasks and every get_task_stats count filter on these columns
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status_due
+        ON tasks (user_id, status, due_date)
+    """)
+
+
+def _m5_user_entry_count(cursor, ph, is_pg):
+    # Per-user diary entry counter, maintained by save_message
+    _add_column_if_missing(cursor, is_pg, "users", "entry_count", "INTEGER DEFAULT 0")
+    cursor.execute("""
+        UPDATE users SET entry_count =
+            (SELECT COUNT(*) FROM user_messages m WHERE m.user_id = users.id)
+    """)
+
+
+def _m6_user_messages_keyset_index(cursor, ph, is_pg):
+    # Keyset pagination: WHERE user_id = ? AND (timestamp, id) < (?, ?)
+    #                    ORDER BY timestamp DESC, id DESC
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_messages_user_ts_id
+        ON user_messages (user_id, timestamp DESC, id DESC)
+    """)
+    # Superseded — the new index serves the same prefix
+    cursor.execute("DROP INDEX IF EXISTS idx_user_messages_user_ts")
+
+
+def _m7_user_messages_search(cursor, ph, is_pg):
+    if is_pg:
+        # Generated tsvector (PostgreSQL 12+) — kept in sync by the database itself
+        cursor.execute("""
+            ALTER TABLE user_messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', COALESCE(message, ''))) STORED
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_messages_search
+            ON user_messages USING GIN (search_vector)
+        """)
+        return
+
+    # SQLite builds without FTS5 fall back to LIKE search (see search_messages)
+    cursor.execute("SELECT COUNT(*) FROM pragma_module_list WHERE name = 'fts5'")
+    if not cursor.fetchone()[0]:
+        print("⚠️  YourDiary DB: SQLite has no FTS5 — diary search will use LIKE scans")
+        return
+    # External-content index over user_messages, maintained by triggers.
+    # user_id is indexed too, so a query can be scoped to one user's entries
+    # inside the index (user_id : "7" AND ...) instead of filtering afterwards.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_messages_fts USING fts5(
+            user_id, message, content='user_messages', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_fts_insert AFTER INSERT ON user_messages BEGIN
+            INSERT INTO user_messages_fts (rowid, user_id, message)
+            VALUES (new.id, new.user_id, new.message);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_fts_delete AFTER DELETE ON user_messages BEGIN
+            INSERT INTO user_messages_fts (user_messages_fts, rowid, user_id, message)
+            VALUES ('delete', old.id, old.user_id, old.message);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_fts_update
+        AFTER UPDATE OF user_id, message ON user_messages BEGIN
+            INSERT INTO user_messages_fts (user_messages_fts, rowid, user_id, message)
+            VALUES ('delete', old.id, old.user_id, old.message);
+            INSERT INTO user_messages_fts (rowid, user_id, message)
+            VALUES (new.id, new.user_id, new.message);
+        END
+    """)
+    # Index existing entries
+    cursor.execute("INSERT INTO user_messages_fts (user_messages_fts) VALUES ('rebuild')")
+
+
+def _m8_weight_store(cursor, ph, is_pg):
+    blob = "BYTEA" if is_pg else "BLOB"
+    pk = "SERIAL PRIMARY KEY" if is_pg else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    # Content-addressed weight payloads: keyframes (base_hash NULL) and
+    # compressed deltas against base_hash (see models/weight_store.py)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS weight_blobs (
+            hash TEXT PRIMARY KEY,
+            base_hash TEXT,
+            depth INTEGER NOT NULL DEFAULT 0,
+            data {blob} NOT NULL,
+            raw_size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Every saved version of every user's model, with its training metadata
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS weight_versions (
+            id {pk},
+            user_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            loss REAL,
+            entry_count INTEGER DEFAULT 0,
+            cursor_message_id INTEGER,
+            cursor_offset INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, version),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    # user_models becomes the head pointer; weights stays for pre-store rows
+    _add_column_if_missing(cursor, is_pg, "user_models", "weights_hash", "TEXT")
+
+
+def _m9_user_messages_prefix_search(cursor, ph, is_pg):
+    # Prefix matches need the words as typed: the stemmed index holds
+    # "running" as "run", so a half-typed "runn" finds nothing there
+    if is_pg:
+        cursor.execute("""
+            ALTER TABLE user_messages ADD COLUMN IF NOT EXISTS search_prefix tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(message, ''))) STORED
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_messages_search_prefix
+            ON user_messages USING GIN (search_prefix)
+        """)
+        return
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_messages_fts'")
+    if cursor.fetchone() is None:
+        return   # no FTS5, search uses LIKE scans (see migration 7)
+    # Unstemmed twin of user_messages_fts, with 2- and 3-char prefix indexes
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_messages_prefix USING fts5(
+            user_id, message, content='user_messages', content_rowid='id',
+            tokenize='unicode61', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_prefix_insert AFTER INSERT ON user_messages BEGIN
+            INSERT INTO user_messages_prefix (rowid, user_id, message)
+            VALUES (new.id, new.user_id, new.message);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_prefix_delete AFTER DELETE ON user_messages BEGIN
+            INSERT INTO user_messages_prefix (user_messages_prefix, rowid, user_id, message)
+            VALUES ('delete', old.id, old.user_id, old.message);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_messages_prefix_update
+        AFTER UPDATE OF user_id, message ON user_messages BEGIN
+            INSERT INTO user_messages_prefix (user_messages_prefix, rowid, user_id, message)
+            VALUES ('delete', old.id, old.user_id, old.message);
+            INSERT INTO user_messages_prefix (rowid, user_id, message)
+            VALUES (new.id, new.user_id, new.message);
+        END
+    """)
+    cursor.execute("INSERT INTO user_messages_prefix (user_messages_prefix) VALUES ('rebuild')")
+
+
+MIGRATIONS = [
+    (1, "user_models version and training cursor columns", _m1_model_versions),
+    (2, "training_jobs table", _m2_training_jobs),
+    (3, "user_messages (user_id, timestamp DESC) and (user_id, id) indexes", _m3_user_messages_indexes),
+    (4, "tasks (user_id, status, due_date) index", _m4_tasks_indexes),
+    (5, "users.entry_count counter", _m5_user_entry_count),
+    (6, "user_messages (user_id, timestamp DESC, id DESC) keyset index", _m6_user_messages_keyset_index),
+    (7, "user_messages full-text search (FTS5 / tsvector + GIN)", _m7_user_messages_search),
+    (8, "versioned weight store (weight_blobs, weight_versions)", _m8_weight_store),
+    (9, "user_messages prefix search (unstemmed FTS5 / tsvector + GIN)", _m9_user_messages_prefix_search),
+]
+
+
+# ─── Runner ───────────────────────────────────────────────────────────────────
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _current_version(cursor):
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def current_version():
+    """Return the highest applied migration version (0 on a fresh database)."""
+    with _transaction() as (cursor, ph, is_pg):
+        _ensure_version_table(cursor)
+        return _current_version(cursor)
+
+
+def run_migrations():
+    """Apply all pending migrations in order. Returns the list of applied versions."""
+    with _transaction() as (cursor, ph, is_pg):
+        _ensure_version_table(cursor)
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with _transaction() as (cursor, ph, is_pg):
+            # Serialize concurrent runners, then re-check under the lock
+            if is_pg:
+                cursor.execute(f"SELECT pg_advisory_xact_lock({ph})", (_PG_LOCK_ID,))
+            else:
+                cursor.execute("BEGIN IMMEDIATE")
+            if _current_version(cursor) >= version:
+                continue
+            fn(cursor, ph, is_pg)
+            cursor.execute(
+                f"INSERT INTO schema_version (version, description) VALUES ({ph}, {ph})",
+                (version, description)
+            )
+        applied.append(version)
+        print(f"🧱 YourDiary DB: applied migration {version} — {description}")
+    return applied
+
+
+# ─── Query plan checks ────────────────────────────────────────────────────────
+
+def _hot_queries(ph, is_pg):
+    """
+    The request-path queries that must be served by an index, built from the
+    SQL templates models.database runs, with sample parameters.
+    """
+    today = date.today().isoformat()
+    queries = [
+        ("get_user_messages", db._RECENT_MESSAGES.format(ph=ph) + f" LIMIT {ph}", (1, 10)),
+        ("get_user_messages_page",
+         db._MESSAGES_PAGE.format(ph=ph, after=db._PAGE_AFTER.format(ph=ph)),
+         (1, "2100-01-01 00:00:00", 0, 51)),
+        ("get_messages_from", db._MESSAGES_FROM.format(ph=ph), (1, 0)),
+        ("get_user_tasks", db._USER_TASKS.format(ph=ph), (1,)),
+        ("get_user_tasks_with_stats", db._USER_TASKS_WITH_STATS.format(ph=ph), (today, 1)),
+        ("get_task_stats", db._TASK_STATS.format(ph=ph), (today, 1)),
+        ("get_weight_versions", db._WEIGHT_VERSIONS.format(ph=ph), (1, 20)),
+    ]
+    search = db._SEARCH_PG if is_pg else db._SEARCH_FTS5
+    queries.append(("search_messages", search.format(ph=ph), db._search_params(1, "diary", 20, 0, is_pg)))
+    return queries
+
+
+def _sqlite_full_scans(plan):
+    """
+    SCAN lines over a table without an index. Scans of a materialized
+    subquery or co-routine read rows an index already selected, so they pass.
+    """
+    lines = plan.splitlines()
+    derived = {line.split()[1] for line in lines if line.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+    return [line for line in lines
+            if line.startswith("SCAN") and "INDEX" not in line and line.split()[1] not in derived]
+
+
+def explain_hot_queries():
+    """
+    EXPLAIN every hot query. Returns [(name, uses_index, plan_text)].
+    On PostgreSQL sequential scans are disabled for the check, so a small
+    table still shows whether an index *can* serve the query.
+    """
+    results = []
+    with _transaction() as (cursor, ph, is_pg):
+        if is_pg:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, sql, params in _hot_queries(ph, is_pg):
+            if is_pg:
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                uses_index = "Index" in plan and "Seq Scan" not in plan
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+                uses_index = "USING" in plan and "INDEX" in plan and not _sqlite_full_scans(plan)
+            results.append((name, uses_index, plan))
+    return results
+
+
+def main():
+    from models.database import init_db
+    init_db()
+    print(f"📐 Schema version: {current_version()} (latest {MIGRATIONS[-1][0]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+YourDiary — Write-Behind Weight Persistence
+Decouples training rounds from the cost of writing ~1 MB of weights.
+
+Trained models are marked dirty instead of being written immediately.
+A flusher thread wakes every WEIGHT_FLUSH_INTERVAL seconds and writes all
+dirty models in one batch (one transaction in the versioned weight store),
+so repeated saves for the same user inside the window collapse into one
+write. Evicted models are written by the flusher straight away, and
+everything dirty is written on shutdown. A write only lands if the user's
+head is still at the version the model was trained from. The flusher also
+prunes old versions every WEIGHT_GC_INTERVAL seconds.
+
+Configure with environment variables:
+  WEIGHT_FLUSH_INTERVAL=10   debounce window in seconds
+  WEIGHT_EVICT_QUEUE=256     evicted models waiting to be written
+  WEIGHT_GC_INTERVAL=3600    weight store garbage collection (0 = off)
+  WEIGHTS_FS_MIRROR=1        also write yourdiary_users/user_{id}.npz (async)
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+from models import weight_store
+
+log = logging.getLogger(__name__)
+
+WEIGHT_FLUSH_INTERVAL = float(os.getenv("WEIGHT_FLUSH_INTERVAL", "10"))
+WEIGHT_EVICT_QUEUE = int(os.getenv("WEIGHT_EVICT_QUEUE", "256"))
+WEIGHT_GC_INTERVAL = float(os.getenv("WEIGHT_GC_INTERVAL", "3600"))
+WEIGHTS_FS_MIRROR = os.getenv("WEIGHTS_FS_MIRROR", "1") == "1"
+WEIGHTS_FS_DIR = "yourdiary_users"
+
+
+class DirtyModel:
+    """Latest unsaved snapshot for a user (models are immutable once published)."""
+
+    __slots__ = ("model", "entry_count", "cursor", "loss", "base_version", "marked_at", "saves")
+
+    def __init__(self, model, entry_count, cursor, loss=None, base_version=None):
+        self.model = model
+        self.entry_count = entry_count
+        self.cursor = cursor
+        self.loss = loss
+        self.base_version = base_version   # stored version it was trained from (None = unchecked)
+        self.marked_at = time.monotonic()
+        self.saves = 1
+
+
+class WeightWriter:
+    def __init__(self, flush_interval=WEIGHT_FLUSH_INTERVAL, mirror_to_fs=WEIGHTS_FS_MIRROR,
+                 gc_interval=WEIGHT_GC_INTERVAL, evict_queue=WEIGHT_EVICT_QUEUE):
+        self.flush_interval = flush_interval
+        self.mirror_to_fs = mirror_to_fs
+        self.gc_interval = gc_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()   # one flush writes at a time
+        self._dirty = {}                      # user_id → DirtyModel
+        self._evicted = queue.Queue(max(1, evict_queue))   # user ids to write now (None = wake up)
+        self.on_saved = None                  # callback(user_id, version) once a write commits
+        self.on_conflict = None               # callback(user_id) when a write is discarded
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._flushes = 0
+        self._rows_written = 0
+        self._saves_merged = 0
+        self._bytes_written = 0
+        self._conflicts = 0
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="yourdiary-weights", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop the flusher and write everything still dirty."""
+        self._stop.set()
+        try:
+            self._evicted.put_nowait(None)
+        except queue.Full:
+            pass   # the flusher is awake anyway
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        last_gc = last_flush = time.monotonic()
+        while not self._stop.is_set():
+            evicted = self._take_evicted(last_flush + self.flush_interval - time.monotonic())
+            if self._stop.is_set():
+                break
+            try:
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    self.flush()
+                elif evicted:
+                    self.flush(evicted)
+            except Exception as e:
+                log.error("weight flush failed", extra={"error": str(e)})
+            if self.gc_interval > 0 and time.monotonic() - last_gc >= self.gc_interval:
+                last_gc = time.monotonic()
+                self.collect_garbage()
+
+    def _take_evicted(self, timeout):
+        """Wait up to `timeout` seconds for an evicted user, then take all that are queued."""
+        user_ids = set()
+        try:
+            user_ids.add(self._evicted.get(timeout=max(0.0, timeout)))
+            while True:
+                user_ids.add(self._evicted.get_nowait())
+        except queue.Empty:
+            pass
+        user_ids.discard(None)
+        return user_ids
+
+    def collect_garbage(self):
+        """Prune old weight versions and blobs nothing refers to any more."""
+        try:
+            versions, blobs, freed = weight_store.gc()
+            if blobs:
+                log.info("weight store garbage-collected", extra={"versions": versions, "blobs": blobs,
+                                                                  "bytes": freed})
+        except Exception as e:
+            log.error("weight store GC failed", extra={"error": str(e)})
+
+    # ─── Dirty tracking ───────────────────────────────────────────────────────
+
+    def mark_dirty(self, user_id, model, entry_count=0, cursor=None, loss=None, base_version=None):
+        """
+        Record the newest snapshot for user_id; it replaces any unsaved one.
+        base_version: the stored version the model was trained from. A
+        replaced snapshot was trained from the same one, so its value is kept.
+        """
+        with self._lock:
+            previous = self._dirty.get(user_id)
+            entry = DirtyModel(model, entry_count, cursor, loss, base_version)
+            if previous is not None:
+                entry.base_version = previous.base_version
+                entry.marked_at = previous.marked_at
+                entry.saves = previous.saves + 1
+                self._saves_merged += 1
+            self._dirty[user_id] = entry
+
+    def write_evicted(self, user_id):
+        """
+        Write user_id's unsaved snapshot soon, on the flusher thread; called
+        when the model cache evicts it. Blocks only while the queue is full.
+        The snapshot stays in pending() until its write commits, so a reload
+        in the meantime gets these weights rather than the older stored ones.
+        """
+        with self._lock:
+            if user_id not in self._dirty:
+                return
+        if self._thread is None:
+            self.flush([user_id])   # no flusher running (stopped, or never started)
+        else:
+            self._evicted.put(user_id)
+
+    def pending(self, user_id):
+        """
+        Return the unsaved DirtyModel for user_id, or None.
+        Entries stay visible until their write has committed, so callers that
+        would otherwise read stale weights or cursors from the DB see them.
+        """
+        with self._lock:
+            return self._dirty.get(user_id)
+
+    # ─── Flushing ─────────────────────────────────────────────────────────────
+
+    def flush(self, user_ids=None):
+        """
+        Write dirty models (all, or only user_ids) as new weight-store
+        versions in one transaction. A model whose user's head moved past its
+        base_version is dropped, not written. Returns the number written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if user_ids is None:
+                    batch = dict(self._dirty)
+                else:
+                    batch = {u: self._dirty[u] for u in user_ids if u in self._dirty}
+            if not batch:
+                return 0
+
+            written = weight_store.save_versions(
+                (user_id, entry.model.weight_arrays(), entry.entry_count, entry.cursor, entry.loss,
+                 entry.base_version)
+                for user_id, entry in batch.items()
+            )
+            if written is None:
+                log.warning("saving weights failed, will retry", extra={"users": len(batch)})
+                return 0
+
+            conflicts = set(written["conflicts"])
+            with self._lock:
+                for user_id, entry in batch.items():
+                    current = self._dirty.get(user_id)
+                    if current is entry or user_id in conflicts:
+                        # Re-marked snapshots share the stale base, so they go too
+                        self._dirty.pop(user_id, None)
+                    elif current is not None:
+                        # Re-marked while we were writing: it builds on what we just wrote
+                        current.base_version = written["heads"][user_id]
+                self._flushes += 1
+                self._rows_written += len(batch) - len(conflicts)
+                self._bytes_written += written["bytes"]
+                self._conflicts += len(conflicts)
+
+            log.info("weights flushed", extra={"users": len(batch) - len(conflicts),
+                                               "bytes": written["bytes"], "blobs": written["blobs"]})
+            for user_id in conflicts:
+                log.warning("stored model changed since training, unsaved weights discarded",
+                            extra={"user_id": user_id, "version": batch[user_id].base_version})
+                if self.on_conflict is not None:
+                    self.on_conflict(user_id)
+            if self.on_saved is not None:
+                for user_id, version in written["heads"].items():
+                    self.on_saved(user_id, version)
+
+            if self.mirror_to_fs:
+                for user_id, entry in batch.items():
+                    if user_id not in conflicts:
+                        self._write_file(user_id, entry.model)
+            return len(batch) - len(conflicts)
+
+    def _write_file(self, user_id, model):
+        """Filesystem mirror (local dev fallback) — runs on the flusher thread."""
+        try:
+            os.makedirs(WEIGHTS_FS_DIR, exist_ok=True)
+            model.save_weights(f"{WEIGHTS_FS_DIR}/user_{user_id}.npz")
+        except Exception as e:
+            log.warning("saving weights to filesystem failed", extra={"user_id": user_id, "error": str(e)})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "dirty": len(self._dirty),
+                "flushes": self._flushes,
+                "rows_written": self._rows_written,
+                "saves_merged": self._saves_merged,
+                "bytes_written": self._bytes_written,
+                "conflicts": self._conflicts,
+            }
@@ -0,0 +1,215 @@
+"""
+YourDiary — Profiling
+Two opt-in tools for finding where request time goes, both free when unused.
+
+Sampler is a statistical profiler: a background thread reads every thread's
+Python stack (sys._current_frames) every few milliseconds and counts them.
+The result is in the collapsed-stack format ("thread;module:func;... count"
+per line) that flamegraph.pl, speedscope and inferno read directly. Nothing
+is sampled unless a profile is running; GET /api/admin/profile runs one.
+
+Request tracing: send a request with an `X-Trace: 1` header and the response
+carries a Server-Timing header with the time that request spent in each
+pipeline stage (auth, db, model_load, encode, decode, sample), e.g.
+
+  Server-Timing: auth;dur=0.05, db;dur=1.92;desc="3 calls", encode;dur=0.31, ...
+
+Browsers show it in the network panel. Stages report through record(),
+which is a single context-variable lookup when the request is not traced.
+The response also carries an X-Trace-Id, logged with the spans: the header's
+value if it is a short token ([A-Za-z0-9._-], up to 64 chars, not "1"),
+otherwise a generated one. /metrics and the profiler endpoint are never
+traced.
+
+Configure with environment variables:
+  PROFILE_INTERVAL_MS=5      default sampling interval
+  PROFILE_MAX_SECONDS=60     longest profile one request may ask for
+"""
+
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+TRACE_HEADER = b"x-trace"
+UNTRACED_PATHS = ("/metrics", "/api/admin/profile")   # scrapes, and the profiler itself
+_TRACE_ID = re.compile(rb"[A-Za-z0-9._-]{1,64}")
+
+# (module, function) of leaf frames whose thread is parked rather than working
+_IDLE_LEAVES = {
+    ("threading", "wait"), ("selectors", "select"), ("queue", "get"),
+    ("multiprocessing.connection", "wait"), ("concurrent.futures.thread", "_worker"),
+}
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already running."""
+
+
+# ─── Sampling profiler ────────────────────────────────────────────────────────
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _is_idle(frame):
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+class Sampler:
+    """Counts the Python stacks of all threads at a fixed interval."""
+
+    _active = threading.Lock()    # one profile per process at a time
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000, include_idle=False):
+        self.interval = max(0.001, interval)
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = 0.0
+        self.elapsed = 0.0
+
+    def start(self):
+        if not Sampler._active.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the collapsed stacks."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.elapsed = time.perf_counter() - self._started
+            Sampler._active.release()
+        return self.collapsed()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not self.include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "elapsed_s": round(self.elapsed, 3),
+            "stacks": len(self.stacks),
+            "interval_ms": round(self.interval * 1000, 2),
+        }
+
+
+# ─── Per-request tracing ──────────────────────────────────────────────────────
+
+_trace = contextvars.ContextVar("yourdiary_trace", default=None)
+
+
+class Trace:
+    __slots__ = ("spans", "_lock")
+
+    def __init__(self):
+        self.spans = {}               # name → [seconds, calls], in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def server_timing(self, total=None):
+        with self._lock:
+            spans = [(name, s, n) for name, (s, n) in self.spans.items()]
+        if total is not None:
+            spans.append(("total", total, 1))
+        parts = []
+        for name, seconds, calls in spans:
+            part = f"{name};dur={seconds * 1000:.2f}"
+            if calls > 1:
+                part += f';desc="{calls} calls"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+def record(name, seconds):
+    """Add seconds to the current request's span `name`, if it is being traced."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def _trace_id(value):
+    """The client's id if it is a short token, else a new one (so "X-Trace: 1" gets one)."""
+    if value not in (b"1", b"true") and _TRACE_ID.fullmatch(value):
+        return value.decode("ascii")
+    return os.urandom(8).hex()
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware: for requests with an X-Trace header, collect spans from
+    record() and return them (plus the total) in a Server-Timing header,
+    with the request's trace id in X-Trace-Id. Each traced request is logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        value = None
+        if scope["type"] == "http" and scope["path"] not in UNTRACED_PATHS:
+            value = next((v for k, v in scope["headers"] if k == TRACE_HEADER), None)
+        if value is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        trace_id = _trace_id(value)
+        started = time.perf_counter()
+        timing = None
+
+        async def send_wrapper(message):
+            nonlocal timing
+            if message["type"] == "http.response.start":
+                timing = trace.server_timing(time.perf_counter() - started)
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode("latin-1")),
+                    (b"x-trace-id", trace_id.encode("ascii"))]
+            await send(message)
+
+        token = _trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            log.info("request traced", extra={
+                "trace_id": trace_id, "method": scope["method"], "path": scope["path"],
+                "server_timing": timing or trace.server_timing(time.perf_counter() - started)})
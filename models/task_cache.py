@@ -0,0 +1,102 @@
+"""
+YourDiary — Task List Cache
+Per-user cache of the GET /api/tasks payload (task list + stats) and its ETag.
+
+Entries are dropped by invalidate() whenever the user's tasks change, and are
+also keyed by today's date so the overdue count rolls over at midnight.
+Every process has its own cache, so with several API workers a mutation
+served by one worker is only seen by the others once TASK_CACHE_TTL expires.
+
+Configure with environment variables:
+  TASK_CACHE_SIZE=1000   max users cached (least recently used evicted)
+  TASK_CACHE_TTL=30      seconds an entry may be served without a mutation
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+TASK_CACHE_SIZE = int(os.getenv("TASK_CACHE_SIZE", "1000"))
+TASK_CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", "30"))
+
+
+class CachedTasks:
+    __slots__ = ("payload", "etag", "day", "stored_at")
+
+    def __init__(self, payload, etag, day):
+        self.payload = payload
+        self.etag = etag
+        self.day = day
+        self.stored_at = time.monotonic()
+
+
+class TaskListCache:
+    def __init__(self, max_size=TASK_CACHE_SIZE, ttl=TASK_CACHE_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # user_id → CachedTasks
+        self._loading = {}              # user_id → [loads in flight, invalidations], while loading
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_etag(payload):
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+    async def get_or_load(self, user_id, loader):
+        """
+        Return (payload, etag) for user_id, awaiting loader() on a miss.
+        A load that races with invalidate() is returned but not cached.
+        """
+        today = date.today().isoformat()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if (entry is not None and entry.day == today
+                    and time.monotonic() - entry.stored_at < self.ttl):
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+                return entry.payload, entry.etag
+            self._misses += 1
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            generation = loading[1]
+
+        try:
+            payload = await loader()
+            etag = self.make_etag(payload)
+        except BaseException:
+            with self._lock:
+                self._end_load(user_id, loading)
+            raise
+
+        with self._lock:
+            self._end_load(user_id, loading)
+            if loading[1] == generation:
+                self._entries[user_id] = CachedTasks(payload, etag, today)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return payload, etag
+
+    def _end_load(self, user_id, loading):
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loading[user_id]
+
+    def invalidate(self, user_id):
+        """Drop the cached list for user_id (call after every task mutation)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            loading = self._loading.get(user_id)
+            if loading is not None:
+                loading[1] += 1   # loads in flight read the old list: don't cache them
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
@@ -0,0 +1,102 @@
+"""
+YourDiary — Standalone Trainer
+Runs per-user LSTM training outside the API process so training CPU never
+competes with suggestion latency.
+
+Usage:
+  python -m models.trainer                  # run until SIGINT/SIGTERM
+  python -m models.trainer --once           # drain the queue, then exit
+  python -m models.trainer --poll 1 --stale-after 900
+
+Flow:
+  1. The API (TRAINING_MODE=external) queues jobs in the training_jobs table
+  2. Any number of trainer processes claim jobs safely from that table
+  3. Trained weights are saved as a new version in the weight store
+     (models/weight_store.py), which bumps the model version. Each job
+     trains from the stored head, and its save is dropped if another
+     trainer saved a newer version in the meantime (the job is queued again)
+  4. API workers notice the new version and hot-reload only that user's model
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+
+from models.database import (
+    init_db, claim_training_job, finish_training_job,
+    requeue_stale_training_jobs, enqueue_training_job
+)
+from models.lstm_model import LSTMModelManager
+from models.logs import setup_logging
+
+log = logging.getLogger(__name__)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="YourDiary out-of-process LSTM trainer")
+    p.add_argument("--poll",        type=float, default=2.0,   help="Seconds to sleep when the queue is empty (default: 2)")
+    p.add_argument("--stale-after", type=float, default=600.0, help="Requeue jobs running longer than this many seconds (default: 600)")
+    p.add_argument("--worker-id",   type=str,   default=None,  help="Name recorded on claimed jobs (default: host:pid)")
+    p.add_argument("--once",        action="store_true",       help="Exit once the queue is empty")
+    return p.parse_args()
+
+
+def run_job(manager, job_id, user_id):
+    """
+    Train one user's model and record the job outcome. A round discarded
+    because another trainer saved first is queued again, so its text gets
+    trained on top of the newer version.
+    """
+    try:
+        outcome = manager.train_user_model_background(user_id)
+    except Exception as e:
+        log.exception("training job failed", extra={"job_id": job_id, "user_id": user_id})
+        finish_training_job(job_id, error=str(e)[:500])
+        return
+    finish_training_job(job_id)
+    if outcome == "conflict":
+        enqueue_training_job(user_id)
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+    worker = args.worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+
+    def _request_stop(signum, frame):
+        log.info("stopping after the current job")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    init_db()
+    manager = LSTMModelManager()
+    manager.load_base_model()
+    log.info("trainer waiting for jobs", extra={"worker": worker})
+
+    while not stop.is_set():
+        requeued = requeue_stale_training_jobs(args.stale_after)
+        if requeued:
+            log.warning("requeued stale training jobs", extra={"count": requeued})
+
+        job = claim_training_job(worker)
+        if job is None:
+            if args.once:
+                break
+            stop.wait(args.poll)
+            continue
+
+        job_id, user_id = job
+        log.info("claimed training job", extra={"job_id": job_id, "user_id": user_id})
+        run_job(manager, job_id, user_id)
+
+    log.info("trainer exited")
+
+
+if __name__ == "__main__":
+    main()
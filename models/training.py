@@ -0,0 +1,246 @@
+"""
+YourDiary — Training Scheduler
+Runs per-user LSTM training jobs on a small, bounded pool of worker threads.
+
+Instead of spawning a new daemon thread for every training trigger, jobs are
+submitted to a single scheduler that:
+  - coalesces pending jobs for the same user into one job
+  - never runs two jobs for the same user at the same time
+  - orders pending jobs by priority (higher first), then submission order
+  - applies backpressure once too many users are waiting
+  - drains or cancels pending work gracefully on shutdown
+
+Configure with environment variables:
+  TRAINING_WORKERS=1        number of worker threads
+  TRAINING_QUEUE_SIZE=100   max distinct users waiting for training
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+from models import metrics
+
+log = logging.getLogger(__name__)
+
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", "1"))
+TRAINING_QUEUE_SIZE = int(os.getenv("TRAINING_QUEUE_SIZE", "100"))
+
+
+class TrainingJob:
+    """A pending training request for one user (merged across submissions)."""
+
+    __slots__ = ("user_id", "payload", "priority", "enqueued_at", "submissions", "seq")
+
+    def __init__(self, user_id, payload, priority, seq):
+        self.user_id = user_id
+        self.payload = payload
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.submissions = 1
+        self.seq = seq
+
+    def merge(self, payload, priority):
+        """Fold a newer submission into this job — latest payload wins."""
+        self.payload = payload
+        self.priority = max(self.priority, priority)
+        self.submissions += 1
+
+
+class TrainingScheduler:
+    def __init__(self, train_fn, workers=TRAINING_WORKERS, max_pending=TRAINING_QUEUE_SIZE):
+        """
+        train_fn(user_id, payload) is called on a worker thread for every job.
+        """
+        self.train_fn = train_fn
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+
+        self._cond = threading.Condition()
+        self._heap = []                 # (-priority, seq, user_id)
+        self._pending = {}              # user_id → TrainingJob (queued, not running)
+        self._running = set()           # user_ids currently training
+        self._seq = itertools.count()
+        self._threads = []
+        self._accepting = False
+        self._stopping = False
+        metrics.TRAINING_QUEUE_DEPTH.set_function(lambda: len(self._pending))
+
+        # Counters / timings exposed through stats()
+        self._submitted = 0
+        self._coalesced = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._cond:
+            if self._threads:
+                return
+            self._accepting = True
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"yourdiary-train-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        log.info("training scheduler started", extra={"workers": self.workers,
+                                                      "queue_size": self.max_pending})
+
+    def shutdown(self, drain=True, timeout=30.0):
+        """
+        Stop accepting jobs and stop the workers.
+        With drain=True, pending jobs are run first (bounded by timeout);
+        otherwise they are discarded and only running jobs are waited on.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            if not drain:
+                self._discard_pending()
+            self._cond.notify_all()
+            while drain and (self._pending or self._running):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    log.warning("training drain timed out", extra={"pending": len(self._pending)})
+                    self._discard_pending()
+                    break
+                self._cond.wait(remaining)
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        log.info("training scheduler stopped")
+
+    def _discard_pending(self):
+        self._heap.clear()
+        self._pending.clear()
+
+    # ─── Submission ───────────────────────────────────────────────────────────
+
+    def submit(self, user_id, payload=None, priority=0):
+        """
+        Queue a training job for user_id.
+        Returns True if the job was queued or merged into a pending job for the
+        same user, False if the scheduler is stopped or the queue is full.
+        """
+        with self._cond:
+            if not self._accepting:
+                self._rejected += 1
+                metrics.TRAINING_JOBS.labels("rejected").inc()
+                return False
+
+            self._submitted += 1
+            job = self._pending.get(user_id)
+            if job is not None:
+                old_priority = job.priority
+                job.merge(payload, priority)
+                self._coalesced += 1
+                metrics.TRAINING_JOBS.labels("coalesced").inc()
+                if job.priority != old_priority:
+                    heapq.heappush(self._heap, (-job.priority, job.seq, user_id))
+                return True
+
+            if len(self._pending) >= self.max_pending:
+                self._rejected += 1
+                metrics.TRAINING_JOBS.labels("rejected").inc()
+                return False
+
+            job = TrainingJob(user_id, payload, priority, next(self._seq))
+            self._pending[user_id] = job
+            heapq.heappush(self._heap, (-priority, job.seq, user_id))
+            self._cond.notify()
+            return True
+
+    # ─── Workers ──────────────────────────────────────────────────────────────
+
+    def _next_job(self):
+        """Pop the highest-priority job whose user is not already training."""
+        deferred = []
+        job = None
+        while self._heap:
+            neg_priority, seq, user_id = heapq.heappop(self._heap)
+            candidate = self._pending.get(user_id)
+            # Stale heap entry (job merged with a new priority, or already taken)
+            if candidate is None or candidate.seq != seq or -neg_priority != candidate.priority:
+                continue
+            if user_id in self._running:
+                deferred.append((neg_priority, seq, user_id))
+                continue
+            job = self._pending.pop(user_id)
+            break
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running.add(job.user_id)
+                wait = time.monotonic() - job.enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            metrics.TRAINING_QUEUE_WAIT.observe(wait)
+
+            started = time.monotonic()
+            ok = True
+            try:
+                self.train_fn(job.user_id, job.payload)
+            except Exception:
+                ok = False
+                log.exception("training job failed", extra={"user_id": job.user_id,
+                                                            "queue_wait_ms": round(wait * 1000, 1)})
+            run = time.monotonic() - started
+            metrics.TRAINING_RUN.observe(run)
+            metrics.TRAINING_JOBS.labels("completed" if ok else "failed").inc()
+
+            with self._cond:
+                self._running.discard(job.user_id)
+                self._run_total += run
+                self._run_max = max(self._run_max, run)
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                # Wake workers waiting on this user's deferred job and drainers
+                self._cond.notify_all()
+
+    # ─── Introspection ────────────────────────────────────────────────────────
+
+    def stats(self):
+        """Return queue depth, counters, and wait/run time aggregates (seconds)."""
+        with self._cond:
+            finished = self._completed + self._failed
+            started = finished + len(self._running)
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._pending),
+                "running": len(self._running),
+                "max_pending": self.max_pending,
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "wait_avg_s": round(self._wait_total / started, 4) if started else 0.0,
+                "wait_max_s": round(self._wait_max, 4),
+                "run_avg_s": round(self._run_total / finished, 4) if finished else 0.0,
+                "run_max_s": round(self._run_max, 4),
+            }
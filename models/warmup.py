@@ -0,0 +1,125 @@
+"""
+YourDiary — Model Warm-Up
+Preloads recently active users' personal models after a restart.
+
+After a deploy the model cache is empty, and every active user's first
+suggestion would pay for a weight store read, npz parse and model build.
+ModelWarmer runs in the background from startup: it asks the database for
+the users with the newest entries and loads their models into the cache,
+most recently active first, on a few threads. The API serves requests the
+whole time; warm-up only gets ahead of them.
+
+Warm-up stays inside the cache budget: it loads at most WARMUP_USERS models
+(never more than MODEL_CACHE_SIZE), stops once the cache is full, and
+installs warmed models as least recently used, so it never evicts a model
+a request has used. GET /api/ready reports its progress.
+
+Configure with environment variables:
+  WARMUP_USERS=100          most models to preload (0 = no warm-up)
+  WARMUP_DAYS=14            only users with an entry in the last N days
+  WARMUP_CONCURRENCY=2      loader threads
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import database as db
+
+log = logging.getLogger(__name__)
+
+WARMUP_USERS = int(os.getenv("WARMUP_USERS", "100"))
+WARMUP_DAYS = float(os.getenv("WARMUP_DAYS", "14"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "2"))
+
+
+class ModelWarmer:
+    def __init__(self, manager, users=WARMUP_USERS, days=WARMUP_DAYS, concurrency=WARMUP_CONCURRENCY):
+        self.manager = manager
+        self.users = users
+        self.days = days
+        self.concurrency = max(1, concurrency)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._state = "disabled" if users <= 0 else "pending"
+        self._started = None
+        self._finished = None
+        self._counts = {"loaded": 0, "cached": 0, "full": 0, "failed": 0, "stopped": 0}
+        self._total = 0
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start warming in the background; returns immediately."""
+        if self._state != "pending" or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="yourdiary-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Skip the models not loaded yet and wait for the ones loading."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    @property
+    def done(self):
+        return self._state in ("done", "failed", "disabled")
+
+    # ─── Warm-up ──────────────────────────────────────────────────────────────
+
+    def _run(self):
+        self._started = time.monotonic()
+        self._state = "running"
+        try:
+            budget = min(self.users, self.manager.cache_size)
+            since = datetime.utcnow() - timedelta(days=self.days) if self.days > 0 else None
+            user_ids = [row[0] for row in db.get_recently_active_users(budget, since)]
+            self._total = len(user_ids)
+
+            # The pool runs submissions in order, so the most recent users load first
+            with ThreadPoolExecutor(self.concurrency, thread_name_prefix="yourdiary-warmup") as pool:
+                for user_id in user_ids:
+                    pool.submit(self._load, user_id)
+            self._state = "done"
+        except Exception:
+            self._state = "failed"
+            log.exception("model warm-up failed")
+        self._finished = time.monotonic()
+        log.info("model warm-up finished", extra=self.stats())
+
+    def _load(self, user_id):
+        if self._stop.is_set() or self._counts["full"]:
+            outcome = "stopped" if self._stop.is_set() else "full"
+        else:
+            try:
+                outcome = self.manager.preload(user_id)
+            except Exception as e:
+                outcome = "failed"
+                log.warning("warm-up load failed", extra={"user_id": user_id, "error": str(e)})
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        processed = sum(counts.values())
+        if self._started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._finished or time.monotonic()) - self._started
+        return {
+            "state": self._state,
+            "users": self._total,
+            "processed": processed,
+            "progress": round(processed / self._total, 3) if self._total else (1.0 if self.done else 0.0),
+            "elapsed_s": round(elapsed, 3),
+            **counts,
+        }
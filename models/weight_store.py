@@ -0,0 +1,397 @@
+"""
+YourDiary — Versioned Weight Store
+Content-addressed, delta-compressed history of every user's LSTM weights.
+
+A version is named by the SHA-256 of its canonical encoding (a small JSON
+header listing the arrays, then their raw bytes), so identical weights are
+stored once however many users or versions point at them. Each blob is
+either a keyframe (the whole payload) or a delta against its parent: the
+XOR of the two payloads' bit patterns. A training round leaves the sign,
+exponent and top mantissa bits of almost every weight unchanged, so after
+byte-shuffling (all first bytes, then all second bytes, ...) the XOR has
+long zero runs and zlib packs it into roughly 60% of a full save.
+
+A user's first version is a delta against the base model, which is itself
+stored once and shared. Chains are capped at WEIGHT_KEYFRAME_INTERVAL
+deltas, after which the next version is re-based on the base model (or
+written as a keyframe, whichever is smaller). Reconstruction reads the
+chain's metadata in one recursive query, starts from the nearest payload
+already in memory, and applies at most that many deltas.
+
+Tables (migration 8):
+  weight_blobs     hash → keyframe or delta (+ base_hash, chain depth)
+  weight_versions  (user_id, version) → hash, loss, entry_count, cursor
+  user_models      each user's head: weights_hash, version, training cursor
+
+Usage:
+  python -m models.weight_store stats
+  python -m models.weight_store history USER_ID
+  python -m models.weight_store rollback USER_ID VERSION
+  python -m models.weight_store gc [--keep N]
+
+A rollback is safe while the API runs. It is recorded as a new version, so
+every API process reloads the user's model within MODEL_RELOAD_INTERVAL,
+and weights they trained from the replaced head are discarded instead of
+being written back over it (saves check the version they started from).
+
+Configure with environment variables:
+  WEIGHT_KEYFRAME_INTERVAL=2   max deltas in a chain (1 = always against the base)
+  WEIGHT_KEEP_VERSIONS=5       versions kept per user (0 = keep all)
+  WEIGHT_STORE_CACHE=8         decoded payloads kept in memory (~1 MB each)
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from models import database as db
+
+log = logging.getLogger(__name__)
+
+WEIGHT_KEYFRAME_INTERVAL = max(1, int(os.getenv("WEIGHT_KEYFRAME_INTERVAL", "2")))
+WEIGHT_KEEP_VERSIONS = int(os.getenv("WEIGHT_KEEP_VERSIONS", "5"))
+WEIGHT_STORE_CACHE = int(os.getenv("WEIGHT_STORE_CACHE", "8"))
+
+_ZLIB_LEVEL = 6
+_DELTA_CHECK_RATIO = 0.8   # deltas this large are compared against a keyframe
+
+_cache = OrderedDict()     # hash → (header, payload), LRU
+_cache_lock = threading.Lock()
+_base = None               # (hash, header, payload, keyframe blob) of the base model
+
+class VersionConflict(Exception):
+    """A user's head moved past the version new weights were trained from."""
+
+
+STORE_STATS = {"versions": 0, "blobs_written": 0, "bytes_written": 0,
+               "deduplicated": 0, "reconstructions": 0, "deltas_applied": 0, "conflicts": 0}
+
+
+# ─── Encoding ─────────────────────────────────────────────────────────────────
+
+def encode(arrays):
+    """Canonical (header, payload) bytes for an ordered {name: ndarray} dict."""
+    header, parts = [], []
+    for name, value in arrays.items():
+        value = np.ascontiguousarray(value)
+        header.append([name, value.dtype.str, list(value.shape)])
+        parts.append(value.tobytes())
+    return json.dumps(header, separators=(",", ":")).encode(), b"".join(parts)
+
+
+def decode(header, payload):
+    """Inverse of encode(): {name: read-only ndarray} views over payload."""
+    arrays, offset = {}, 0
+    for name, dtype, shape in json.loads(header):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(payload, dtype, count, offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return arrays
+
+
+def content_hash(header, payload):
+    digest = hashlib.sha256(header)
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def _itemsize(header):
+    """Shuffle width: the arrays' common item size (1 = no shuffle)."""
+    sizes = {np.dtype(dtype).itemsize for _, dtype, _ in json.loads(header)}
+    return sizes.pop() if len(sizes) == 1 else 1
+
+
+def _shuffle(data, width):
+    if width == 1:
+        return data
+    return np.frombuffer(data, np.uint8).reshape(-1, width).T.tobytes()
+
+
+def _unshuffle(data, width):
+    if width == 1:
+        return data
+    return np.frombuffer(data, np.uint8).reshape(width, -1).T.tobytes()
+
+
+def _xor(a, b):
+    return np.bitwise_xor(np.frombuffer(a, np.uint8), np.frombuffer(b, np.uint8)).tobytes()
+
+
+def _keyframe_blob(header, payload):
+    framed = len(header).to_bytes(4, "big") + header + _shuffle(payload, _itemsize(header))
+    return zlib.compress(framed, _ZLIB_LEVEL)
+
+
+def _delta_blob(header, payload, parent_payload):
+    return zlib.compress(_shuffle(_xor(payload, parent_payload), _itemsize(header)), _ZLIB_LEVEL)
+
+
+def _read_keyframe(data):
+    framed = zlib.decompress(data)
+    size = int.from_bytes(framed[:4], "big")
+    header = framed[4:4 + size]
+    return header, _unshuffle(framed[4 + size:], _itemsize(header))
+
+
+def _apply_delta(header, parent_payload, data):
+    return _xor(parent_payload, _unshuffle(zlib.decompress(data), _itemsize(header)))
+
+
+# ─── Payload cache ────────────────────────────────────────────────────────────
+
+def _cache_get(weights_hash):
+    with _cache_lock:
+        entry = _cache.get(weights_hash)
+        if entry is not None:
+            _cache.move_to_end(weights_hash)
+        return entry
+
+
+def _cache_put(weights_hash, header, payload):
+    if WEIGHT_STORE_CACHE <= 0:
+        return
+    with _cache_lock:
+        _cache[weights_hash] = (header, payload)
+        _cache.move_to_end(weights_hash)
+        while len(_cache) > WEIGHT_STORE_CACHE:
+            _cache.popitem(last=False)
+
+
+def set_base(arrays):
+    """
+    Register the base model's weights: new users' first versions (and
+    re-based chains) are stored as deltas against it.
+    """
+    global _base
+    header, payload = encode(arrays)
+    _base = (content_hash(header, payload), header, payload, None)
+
+
+def _base_keyframe():
+    """The base model's keyframe blob, compressed once on first use."""
+    global _base
+    weights_hash, header, payload, blob = _base
+    if blob is None:
+        blob = _keyframe_blob(header, payload)
+        _base = (weights_hash, header, payload, blob)
+    return blob
+
+
+# ─── Reconstruction ───────────────────────────────────────────────────────────
+
+def load_payload(weights_hash):
+    """Rebuild (header, payload) for a stored hash; None if it is not stored."""
+    cached = _cache_get(weights_hash)
+    if cached is not None:
+        return cached
+    if _base is not None and _base[0] == weights_hash:
+        return _base[1], _base[2]
+
+    chain = db.get_weight_chain(weights_hash)          # head → keyframe
+    if not chain or chain[-1][1] is not None:
+        return None
+    # Start from the newest ancestor already in memory, else the keyframe
+    start, header, payload = len(chain) - 1, None, None
+    for i, (h, _) in enumerate(chain):
+        known = _cache_get(h) or ((_base[1], _base[2]) if _base and _base[0] == h else None)
+        if known is not None:
+            start, (header, payload) = i, known
+            break
+    blobs = db.load_weight_blobs(h for h, _ in chain[:start + (header is None)])
+    if header is None:
+        header, payload = _read_keyframe(blobs[chain[start][0]])
+    for h, _ in reversed(chain[:start]):
+        payload = _apply_delta(header, payload, blobs[h])
+    STORE_STATS["reconstructions"] += 1
+    STORE_STATS["deltas_applied"] += start
+
+    if content_hash(header, payload) != weights_hash:
+        raise ValueError(f"weight blob {weights_hash[:12]} failed its integrity check")
+    _cache_put(weights_hash, header, payload)
+    return header, payload
+
+
+def load_user_weights(user_id):
+    """
+    Load a user's current weights.
+    Returns ({name: ndarray}, entry_count, version), or (None, 0, 0) if none
+    are stored. Rows saved before the weight store are read from their npz BLOB.
+    """
+    head = db.load_user_model_head(user_id)
+    if head is None:
+        return None, 0, 0
+    weights_hash, legacy, entry_count, version = head
+    if weights_hash is None:
+        npz = np.load(io.BytesIO(legacy), allow_pickle=True)
+        return {name: npz[name] for name in npz.files}, entry_count, version
+    loaded = load_payload(weights_hash)
+    if loaded is None:
+        raise LookupError(f"weights {weights_hash[:12]} for user {user_id} are not stored")
+    return decode(*loaded), entry_count, version
+
+
+# ─── Saving ───────────────────────────────────────────────────────────────────
+
+def _choose_blob(weights_hash, header, payload, head, extra_blobs, stored):
+    """
+    Encode one new version as a (hash, base_hash, depth, data, raw_size) row:
+    a delta against the user's head while its chain is short, otherwise a
+    delta against the base model — or a keyframe when that is smaller.
+    """
+    parents = []
+    if head is not None and head[1] < WEIGHT_KEYFRAME_INTERVAL:
+        parents.append(head)
+    if _base is not None:
+        parents.append((_base[0], 0))
+
+    row = None
+    for parent_hash, parent_depth in parents:
+        if parent_hash == weights_hash:
+            continue    # weights equal to the base model: store its keyframe, not a delta on itself
+        parent = load_payload(parent_hash)
+        if parent is not None and parent[0] == header:
+            row = (weights_hash, parent_hash, parent_depth + 1,
+                   _delta_blob(header, payload, parent[1]), len(payload))
+            break
+    if row is None or len(row[3]) >= _DELTA_CHECK_RATIO * len(payload):
+        keyframe = _keyframe_blob(header, payload)
+        if row is None or len(keyframe) < len(row[3]):
+            return weights_hash, None, 0, keyframe, len(payload)
+
+    base_hash = row[1]
+    if _base is not None and base_hash == _base[0] and base_hash not in stored:
+        extra_blobs[base_hash] = (base_hash, None, 0, _base_keyframe(), len(_base[2]))
+    return row
+
+
+def save_versions(entries, keep=WEIGHT_KEEP_VERSIONS):
+    """
+    Save new versions for many users in one transaction.
+    entries: iterable of (user_id, {name: ndarray}, entry_count, cursor, loss
+    [, expected_version]) with cursor = (message_id, offset) or None to keep
+    the stored one. An entry with an expected_version is only saved if the
+    user's head is still at that version — the weights were trained from it.
+    Returns {"versions", "blobs", "bytes"} written plus "heads" ({user_id:
+    new version}) and "conflicts" (users whose head had moved on), or None
+    on failure.
+    """
+    entries = list(entries)
+    if not entries:
+        return {"versions": 0, "blobs": 0, "bytes": 0, "heads": {}, "conflicts": []}
+
+    encoded = []
+    for user_id, arrays, entry_count, cursor, loss, *expected in entries:
+        header, payload = encode(arrays)
+        encoded.append((user_id, content_hash(header, payload), header, payload,
+                        entry_count, cursor, loss, expected[0] if expected else None))
+
+    blobs, versions, deduplicated = {}, [], 0
+    try:
+        heads = db.get_weight_heads(e[0] for e in encoded)
+        wanted = {e[1] for e in encoded} | ({_base[0]} if _base is not None else set())
+        stored = db.get_stored_weight_hashes(wanted)
+        for user_id, weights_hash, header, payload, entry_count, cursor, loss, expected in encoded:
+            if weights_hash in stored or weights_hash in blobs:
+                deduplicated += 1
+            else:
+                blobs[weights_hash] = _choose_blob(weights_hash, header, payload,
+                                                   heads.get(user_id), blobs, stored)
+            cursor_id, cursor_offset = cursor if cursor else (None, None)
+            versions.append((user_id, weights_hash, entry_count, cursor_id, cursor_offset,
+                             None if loss is None else float(loss), expected))
+    except Exception:
+        log.exception("encoding model weights failed", extra={"users": len(encoded)})
+        return None
+
+    rows = list(blobs.values())
+    heads = db.save_weight_versions(rows, versions, keep)
+    if heads is None:
+        return None
+
+    for _, weights_hash, header, payload, _, _, _, _ in encoded:
+        _cache_put(weights_hash, header, payload)
+    conflicts = [user_id for user_id, version in heads.items() if version is None]
+    written = sum(len(row[3]) for row in rows)
+    STORE_STATS["versions"] += len(versions) - len(conflicts)
+    STORE_STATS["blobs_written"] += len(rows)
+    STORE_STATS["bytes_written"] += written
+    STORE_STATS["deduplicated"] += deduplicated
+    STORE_STATS["conflicts"] += len(conflicts)
+    return {"versions": len(versions) - len(conflicts), "blobs": len(rows), "bytes": written,
+            "heads": {u: v for u, v in heads.items() if v is not None}, "conflicts": conflicts}
+
+
+# ─── History / maintenance ────────────────────────────────────────────────────
+
+def history(user_id, limit=20):
+    return db.get_weight_versions(user_id, limit)
+
+
+def rollback(user_id, version, keep=WEIGHT_KEEP_VERSIONS):
+    """Make a stored version current again. Returns the new version number or None."""
+    return db.rollback_user_model(user_id, version, keep)
+
+
+def gc(keep=WEIGHT_KEEP_VERSIONS):
+    """
+    Prune versions beyond `keep` per user and delete unreachable blobs.
+    Returns (versions_deleted, blobs_deleted, bytes_freed).
+    """
+    return db.gc_weight_store(keep)
+
+
+def stats():
+    return dict(STORE_STATS, cached_payloads=len(_cache))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Inspect and maintain the versioned weight store")
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Blob and version totals")
+    h = sub.add_parser("history", help="List a user's stored versions")
+    h.add_argument("user_id", type=int)
+    h.add_argument("--limit", type=int, default=20)
+    r = sub.add_parser("rollback", help="Make an earlier version current again")
+    r.add_argument("user_id", type=int)
+    r.add_argument("version", type=int)
+    g = sub.add_parser("gc", help="Prune old versions and unreachable blobs")
+    g.add_argument("--keep", type=int, default=WEIGHT_KEEP_VERSIONS,
+                   help=f"Versions to keep per user, 0 = all (default: {WEIGHT_KEEP_VERSIONS})")
+    args = p.parse_args()
+
+    db.init_db()
+    if args.command == "stats":
+        s = db.get_weight_store_stats()
+        ratio = s["stored_bytes"] / s["raw_bytes"] if s["raw_bytes"] else 0
+        print(f"📦 {s['versions']} versions for {s['users']} users in {s['blobs']} blobs "
+              f"({s['keyframes']} keyframes, {s['deltas']} deltas)")
+        print(f"   {s['stored_bytes']:,} bytes stored for {s['raw_bytes']:,} raw ({ratio:.0%})")
+    elif args.command == "history":
+        for v in history(args.user_id, args.limit):
+            loss = f"{v['loss']:.4f}" if v["loss"] is not None else "-"
+            size = f"{v['stored_bytes']:,}" if v["stored_bytes"] is not None else "-"
+            print(f"v{v['version']:<5} {v['created_at']}  loss {loss:>8}  "
+                  f"{v['entry_count']:>6} entries  {v['kind']:<8} {size:>10} B  {v['hash'][:12]}")
+    elif args.command == "rollback":
+        version = rollback(args.user_id, args.version)
+        if version is None:
+            print(f"❌ Version {args.version} of user {args.user_id} is not stored")
+            raise SystemExit(1)
+        print(f"⏪ User {args.user_id} rolled back to v{args.version} (now v{version})")
+    else:
+        versions, blobs, freed = gc(args.keep)
+        print(f"🧹 Removed {versions} versions and {blobs} blobs ({freed:,} bytes)")
+    db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
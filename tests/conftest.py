@@ -0,0 +1,13 @@
+import pytest
+
+from models import database as db
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """A fresh, fully migrated SQLite database for one test."""
+    db.close_connections()
+    monkeypatch.setattr(db, "SQLITE_PATH", str(tmp_path / "yourdiary.db"))
+    db.init_db()
+    yield
+    db.close_connections()
@@ -0,0 +1,12 @@
+"""
+Every hot query must be served by an index. Run with: python -m pytest tests
+"""
+
+from models import migrations
+
+
+def test_hot_queries_use_an_index(sqlite_db):
+    results = migrations.explain_hot_queries()
+    assert results
+    full_scans = {name: plan for name, uses_index, plan in results if not uses_index}
+    assert not full_scans, full_scans
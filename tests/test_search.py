@@ -0,0 +1,29 @@
+"""
+Diary search regressions. Run with: python -m pytest tests
+"""
+
+import pytest
+
+from models import database as db
+
+
+@pytest.fixture
+def diary(sqlite_db, monkeypatch):
+    """A user with a few entries; yields their id."""
+    monkeypatch.setattr(db, "_fts_sqlite", None)
+    assert db.insert_user("alice", "x")
+    user_id = db.get_user_by_username("alice")[0]
+    db.save_message(user_id, "Went running by the river <b>before</b> work & coffee")
+    db.save_message(user_id, "Quiet evening with a book")
+    return user_id
+
+
+@pytest.mark.parametrize("query", ["run", "runn", "running", "runs", "river runn"])
+def test_partial_and_stemmed_words_match(diary, query):
+    assert [m for _, m, *_ in db.search_messages(diary, query)] == [
+        "Went running by the river <b>before</b> work & coffee"]
+
+
+def test_snippet_escapes_entry_text(diary):
+    snippet = db.search_messages(diary, "befo")[0][4]
+    assert snippet == "Went running by the river &lt;b&gt;<mark>before</mark>&lt;/b&gt; work &amp; coffee"
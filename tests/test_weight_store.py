@@ -0,0 +1,55 @@
+"""
+Weight store regressions. Run with: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from models import database as db
+from models import weight_store
+
+
+@pytest.fixture
+def store(sqlite_db, monkeypatch):
+    """A user in a fresh database, with an empty weight store cache."""
+    monkeypatch.setattr(weight_store, "_base", None)
+    weight_store._cache.clear()
+    assert db.insert_user("alice", "x")
+    yield db.get_user_by_username("alice")[0]
+    weight_store._cache.clear()
+
+
+def _weights(seed):
+    rng = np.random.default_rng(seed)
+    return {"Wf": rng.standard_normal((8, 4)), "bf": rng.standard_normal((8, 1))}
+
+
+def test_saving_same_weights_twice_loads_its_chain(store):
+    weights = _weights(0)
+    weight_store.set_base(weights)
+
+    for _ in range(2):
+        assert weight_store.save_versions([(store, weights, 1, None, None)]) is not None
+
+    weights_hash = weight_store.content_hash(*weight_store.encode(weights))
+    assert db.get_weight_chain(weights_hash) == [(weights_hash, None)]
+
+    # Drop everything held in memory so the load goes through the chain query
+    weight_store._base = None
+    weight_store._cache.clear()
+    loaded, entry_count, version = weight_store.load_user_weights(store)
+    assert version == 2
+    for name, value in weights.items():
+        np.testing.assert_array_equal(loaded[name], value)
+
+
+def test_save_is_skipped_when_the_head_moved(store):
+    assert weight_store.save_versions([(store, _weights(2), 1, None, None, 0)])["heads"] == {store: 1}
+
+    # Trained from version 0, but version 1 has been saved since
+    written = weight_store.save_versions([(store, _weights(3), 2, None, None, 0)])
+    assert written["conflicts"] == [store] and written["heads"] == {}
+    assert db.get_user_model_versions([store]) == {store: 1}
+
+    written = weight_store.save_versions([(store, _weights(3), 2, None, None, 1)])
+    assert written["heads"] == {store: 2}
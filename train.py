@@ -6,6 +6,8 @@ Usage:
   python3 train.py --data corpus.txt --epochs 20 --lr 0.003 --seq 30
   python3 train.py --data diary_samples.txt --epochs 5 --lr 0.001  # light fine-tune
   python3 train.py --data corpus.txt --from-scratch               # fresh weights
+  python3 train.py --data corpus.txt --distill-from base_model.npz --hidden 64
+  python3 train.py --data corpus.txt --epochs 50 --resume base_model_epoch20.npz
 
 This script:
   1. Loads current base_model.npz weights (fine-tune) OR starts fresh (--from-scratch)
@@ -13,6 +15,29 @@ This script:
   3. Saves updated weights back to base_model.npz
   4. Shows loss curve and improvement over time
 
+Distillation (--distill-from TEACHER.npz --hidden 48|64):
+  Trains a smaller student LSTM to match the teacher's next-char distributions,
+  softened with --temperature, mixed with the true next char (--alpha = weight
+  of the teacher). A report on the validation split compares teacher and student on quality (loss, bits per char, accuracy,
+  agreement with the teacher), suggestion latency and memory. The student is
+  saved to base_model_small.npz by default — serve it with MODEL_TIER=small.
+
+Validation (--val-split 0.1):
+  The last 10% of the corpus is held out. After every epoch the whole split
+  is scored in one batched forward pass (LSTM.evaluate: cross-entropy and
+  bits per char, no gradients). The best epoch by validation loss is saved to
+  <output>_best.npz, training stops after --patience epochs without
+  improvement, and the best weights — not the last — are saved to --output.
+
+Checkpoints (--save-every N epochs, default 1):
+  Each checkpoint holds the full training state — weights, numpy RNG state,
+  epoch, loss history and the training settings — so --resume continues the
+  run exactly where it stopped (same shuffles, same weights as an
+  uninterrupted run). --epochs is the total, counting the resumed epochs.
+  Checkpoints are written by a background thread (temp file + atomic rename,
+  so a crash never leaves a half-written file) while training continues;
+  only the newest --keep-checkpoints are kept.
+
 Fine-tuning tips:
   - Use a lower learning rate (0.001–0.003) when fine-tuning existing weights
   - Use a higher learning rate (0.005–0.01) when training from scratch
@@ -22,7 +47,13 @@ Fine-tuning tips:
 
 import numpy as np
 import argparse
+import glob
+import hashlib
+import json
 import os
+import queue
+import re
+import threading
 import time
 
 try:
@@ -40,19 +71,156 @@ def parse_args():
     p.add_argument("--lr",           type=float, default=0.003,  help="Learning rate (default: 0.003 for fine-tune)")
     p.add_argument("--seq",          type=int,   default=25,     help="Sequence length (default: 25)")
     p.add_argument("--max-seqs",     type=int,   default=200,    help="Max sequences per epoch (default: 200)")
-    p.add_argument("--save-every",   type=int,   default=5,      help="Save checkpoint every N epochs (default: 5)")
-    p.add_argument("--output",       type=str,   default="base_model.npz", help="Output weights file")
+    p.add_argument("--val-split",    type=float, default=0.1,    help="Fraction of the corpus held out for validation "
+                                                                      "(default: 0.1, 0 = none)")
+    p.add_argument("--patience",     type=int,   default=5,      help="Stop after N epochs without validation "
+                                                                      "improvement (default: 5, 0 = never)")
+    p.add_argument("--save-every",   type=int,   default=1,      help="Save checkpoint every N epochs (default: 1)")
+    p.add_argument("--keep-checkpoints", type=int, default=3,    help="Newest checkpoints to keep (default: 3, 0 = all)")
+    p.add_argument("--resume",       type=str,   default=None,   help="Checkpoint to resume training from")
+    p.add_argument("--output",       type=str,   default=None,   help="Output weights file (default: base_model.npz, "
+                                                                      "base_model_small.npz with --distill-from)")
     p.add_argument("--from-scratch", action="store_true", help="Train with fresh random weights (ignore existing model)")
-    p.add_argument("--hidden",       type=int,   default=128,    help="Hidden size (must match base model — default: 128)")
-    return p.parse_args()
+    p.add_argument("--hidden",       type=int,   default=None,   help="Hidden size (must match base model — default: 128; "
+                                                                      "student size with --distill-from, default: 64)")
+    p.add_argument("--distill-from", type=str,   default=None,   help="Teacher weights to distill a smaller student from")
+    p.add_argument("--temperature",  type=float, default=2.0,    help="Distillation softmax temperature (default: 2.0)")
+    p.add_argument("--alpha",        type=float, default=0.7,    help="Weight of the teacher's soft targets vs the "
+                                                                      "true next char (default: 0.7)")
+    args = p.parse_args()
+    if args.output is None:
+        args.output = "base_model_small.npz" if args.distill_from else "base_model.npz"
+    if args.hidden is None:
+        args.hidden = 64 if args.distill_from else 128
+    return args
+
+
+# ─── Checkpoints ──────────────────────────────────────────────────────────────
+
+# Settings restored from a checkpoint on --resume (so the run continues unchanged)
+RESUMED_SETTINGS = ("lr", "seq", "max_seqs", "hidden", "output", "distill_from", "temperature", "alpha",
+                    "val_split")
+
+
+def corpus_fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def checkpoint_state(model, epoch, history, best_loss, best_epoch, settings):
+    """Snapshot of everything needed to resume after `epoch` (arrays are copies)."""
+    algorithm, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    meta = {
+        "epoch": epoch,
+        "history": history,
+        "best_loss": best_loss,
+        "best_epoch": best_epoch,
+        "rng": {"algorithm": algorithm, "pos": int(pos), "has_gauss": int(has_gauss),
+                "cached_gaussian": float(cached_gaussian)},
+        "settings": settings,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    arrays = {name: array.copy() for name, array in model.weight_arrays().items()}
+    arrays["rng_keys"] = keys.copy()
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+def read_checkpoint(path):
+    """
+    Returns (meta, weights) of a checkpoint; meta["rng_state"] is ready for
+    np.random.set_state. Checkpoints are also plain weight files
+    (LSTM.load_weights reads them).
+    """
+    with np.load(path) as data:
+        if "meta" not in data:
+            raise ValueError(f"{path} holds only weights, not a training checkpoint")
+        meta = json.loads(str(data["meta"]))
+        weights = {name: data[name] for name in LSTM.WEIGHT_NAMES + ("h", "c")}
+        rng = meta["rng"]
+        meta["rng_state"] = (rng["algorithm"], data["rng_keys"], rng["pos"], rng["has_gauss"],
+                             rng["cached_gaussian"])
+    return meta, weights
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints on a background thread so the training loop never waits
+    on disk. Each file is written to a temp name, fsynced and renamed into
+    place; afterwards only the newest `keep` checkpoints of the run are left.
+    """
+
+    def __init__(self, output, keep=3):
+        self.pattern = output.replace(".npz", "_epoch*.npz")
+        self.keep = keep
+        self._queue = queue.Queue(maxsize=2)
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, arrays):
+        """Queue a snapshot; blocks only if two writes are already pending."""
+        self._queue.put((path, arrays))
+
+    def close(self):
+        """Finish every pending write."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, arrays = item
+            tmp = f"{path}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    np.savez(f, **arrays)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+                self._prune()
+            except Exception as e:
+                print(f"⚠️  Checkpoint {path} not written: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def _prune(self):
+        if self.keep <= 0:
+            return
+
+        def epoch_of(path):
+            match = re.search(r"_epoch(\d+)\.npz$", path)
+            return int(match.group(1)) if match else -1
+
+        for old in sorted(glob.glob(self.pattern), key=epoch_of)[:-self.keep]:
+            os.remove(old)
 
 
 # ─── Training loop ────────────────────────────────────────────────────────────
 
-def train(model, text, epochs, lr, seq_length, max_seqs, save_every, output):
+def soft_targets(teacher, X, y_true, temperature, alpha):
+    """Teacher's next-char distributions at `temperature`, mixed with the true chars."""
+    teacher.h = np.zeros((teacher.hidden_size, 1))
+    teacher.c = np.zeros((teacher.hidden_size, 1))
+    logits = teacher.forw_prop(X)[:, :, 0] / temperature
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    return alpha * probs + (1 - alpha) * y_true
+
+
+def train(model, text, epochs, lr, seq_length, max_seqs, save_every, output,
+          teacher=None, temperature=1.0, alpha=1.0, checkpoints=None, settings=None, resume=None,
+          val_text="", patience=0):
     """
     Full training loop with epoch tracking and loss reporting.
-    Returns list of (epoch, loss) tuples.
+    With a teacher, the targets are its softened distributions (distillation).
+    checkpoints: CheckpointWriter for the full-state checkpoints every
+    save_every epochs (settings are stored in them). resume: metadata from
+    read_checkpoint() to continue from. With val_text, every epoch is scored
+    on it; the best epoch is checkpointed to <output>_best.npz, training stops
+    after `patience` epochs without improvement, and the model is left with
+    the best epoch's weights.
+    Returns list of (epoch, loss, val_loss) tuples (val_loss None without val_text).
     """
     # Encode entire corpus once
     encoded = model.one_hot_encoder.encode(text)
@@ -75,9 +243,27 @@ def train(model, text, epochs, lr, seq_length, max_seqs, save_every, output):
     print()
 
     history = []
-    best_loss = float('inf')
-
-    for epoch in range(1, epochs + 1):
+    best_loss = float('inf')         # validation loss if there is a split, else training loss
+    best_epoch = 0
+    best_weights = None
+    best_path = output.replace(".npz", "_best.npz")
+    start_epoch = 1
+    if resume is not None:
+        history = [tuple(h) + (None,) * (3 - len(h)) for h in resume["history"]]
+        best_loss = resume["best_loss"]
+        best_epoch = resume.get("best_epoch", 0)
+        start_epoch = resume["epoch"] + 1
+        np.random.set_state(resume["rng_state"])
+        for epoch, loss, val_loss in history:
+            val = f"  val: {val_loss:.4f}" if val_loss is not None else ""
+            print(f"Epoch {epoch:>3}/{epochs}  loss: {loss:.4f}{val}  (resumed)")
+        if val_text and os.path.exists(best_path):
+            meta, best_weights = read_checkpoint(best_path)
+            if meta["epoch"] != best_epoch:
+                best_weights = None
+    first_loss = history[0][1] if history else None
+
+    for epoch in range(start_epoch, epochs + 1):
         epoch_start = time.time()
 
         # Shuffle and sample sequences each epoch
@@ -91,39 +277,131 @@ def train(model, text, epochs, lr, seq_length, max_seqs, save_every, output):
 
             # Forward + backward
             model.forw_prop(X_all[idx])
-            loss = model.back_prop(y_all[idx], learning_rate=lr)
+            if teacher is not None:
+                targets = soft_targets(teacher, X_all[idx], y_all[idx], temperature, alpha)
+                loss = model.back_prop(targets, learning_rate=lr, temperature=temperature)
+            else:
+                loss = model.back_prop(y_all[idx], learning_rate=lr)
             epoch_loss += loss
 
         avg_loss = epoch_loss / seqs_per_epoch
+        val = model.evaluate(val_text) if val_text else None
+        val_loss = val["loss"] if val else None
         elapsed = time.time() - epoch_start
-        history.append((epoch, avg_loss))
+        history.append((epoch, avg_loss, val_loss))
 
         # Visual loss bar
         bar_len = 20
-        if epoch == 1:
+        if first_loss is None:
             first_loss = avg_loss
         normalized = min(avg_loss / (first_loss + 1e-8), 1.0)
         bar = "█" * int(normalized * bar_len) + "░" * (bar_len - int(normalized * bar_len))
 
-        improved = " ← best" if avg_loss < best_loss else ""
-        if avg_loss < best_loss:
-            best_loss = avg_loss
+        score = val_loss if val_loss is not None else avg_loss
+        improved = " ← best" if score < best_loss else ""
+        if score < best_loss:
+            best_loss, best_epoch = score, epoch
+
+        val_info = f"  val: {val_loss:.4f} ({val['bpc']:.3f} bpc)" if val else ""
+        print(f"Epoch {epoch:>3}/{epochs}  loss: {avg_loss:.4f}{val_info}  [{bar}]  ({elapsed:.1f}s){improved}")
 
-        print(f"Epoch {epoch:>3}/{epochs}  loss: {avg_loss:.4f}  [{bar}]  ({elapsed:.1f}s){improved}")
+        if val and best_epoch == epoch:
+            state = checkpoint_state(model, epoch, history, best_loss, best_epoch, settings)
+            best_weights = {name: state[name] for name in model.WEIGHT_NAMES + ("h", "c")}
+            if checkpoints is not None:
+                checkpoints.submit(best_path, state)
 
-        if epoch % save_every == 0:
+        stop = bool(val) and patience > 0 and epoch - best_epoch >= patience
+        if checkpoints is not None and (epoch % save_every == 0 or epoch == epochs or stop):
             ckpt = output.replace(".npz", f"_epoch{epoch}.npz")
-            model.save_weights(ckpt)
-            print(f"💾 Checkpoint saved → {ckpt}")
+            checkpoints.submit(ckpt, checkpoint_state(model, epoch, history, best_loss, best_epoch, settings))
+            print(f"💾 Checkpoint queued → {ckpt}")
             try:
                 from IPython.display import display, FileLink
                 display(FileLink(ckpt))
             except Exception:
                 pass
 
+        if stop:
+            print(f"⏹️  Early stop: no validation improvement for {patience} epochs")
+            break
+
+    if best_weights is not None and best_epoch != history[-1][0]:
+        model.set_weight_arrays(best_weights)
+        print(f"↩️  Keeping epoch {best_epoch} weights (best validation loss {best_loss:.4f})")
     return history
 
 
+# ─── Distillation report ──────────────────────────────────────────────────────
+
+def _predict(model, encoded, seq_length, max_windows=100):
+    """Log-probabilities of each next char over non-overlapping held-out windows
+    (a sample, for teacher/student agreement)."""
+    model = model.clone()
+    log_probs, targets = [], []
+    for start in range(0, len(encoded) - seq_length - 1, seq_length)[:max_windows]:
+        model.h = np.zeros((model.hidden_size, 1))
+        model.c = np.zeros((model.hidden_size, 1))
+        logits = model.forw_prop(encoded[start:start + seq_length])[:, :, 0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        log_probs.append(logits - np.log(np.exp(logits).sum(axis=1, keepdims=True)))
+        targets.append(encoded[start + 1:start + seq_length + 1].argmax(axis=1))
+    return np.concatenate(log_probs), np.concatenate(targets)
+
+
+def _suggestion_ms(model, prompt, runs=20):
+    """Median time of one 3 × 20-char suggestion request, as the API serves it."""
+    frozen = model.clone().freeze()
+    np.random.seed(0)
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        frozen.get_completions(prompt, num_suggestions=3, max_length=20)
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000
+
+
+def distill_report(teacher, student, heldout, seq_length, teacher_path, student_path):
+    """Print quality vs latency vs memory for teacher and student on held-out text."""
+    encoded = teacher.one_hot_encoder.encode(heldout)
+    if len(encoded) < 2 * seq_length + 2:
+        print("⚠️  Held-out text too short for a report")
+        return
+    teacher_logp, targets = _predict(teacher, encoded, seq_length)
+    student_logp, _ = _predict(student, encoded, seq_length)
+
+    rows = {}
+    for name, model, logp, path in (("teacher", teacher, teacher_logp, teacher_path),
+                                    ("student", student, student_logp, student_path)):
+        scores = model.evaluate(heldout)
+        rows[name] = {
+            "hidden": model.hidden_size,
+            "loss": scores["loss"],
+            "bpc": scores["bpc"],
+            "accuracy": scores["accuracy"],
+            "agreement": float((logp.argmax(axis=1) == teacher_logp.argmax(axis=1)).mean()),
+            "latency_ms": _suggestion_ms(model, heldout[:50]),
+            "params": sum(getattr(model, n).size for n in model.WEIGHT_NAMES),
+            "weights_kb": sum(getattr(model, n).nbytes for n in model.WEIGHT_NAMES) / 1024,
+            "file_kb": os.path.getsize(path) / 1024 if os.path.exists(path) else 0.0,
+        }
+
+    t, st = rows["teacher"], rows["student"]
+    print()
+    print("─" * 60)
+    print(f"  Distillation report ({scores['chars']:,} held-out chars)")
+    print(f"  {'':<22}{'teacher':>12}{'student':>12}{'ratio':>10}")
+    for label, key, fmt in (("Hidden units", "hidden", "{:.0f}"), ("Loss (nats/char)", "loss", "{:.3f}"),
+                            ("Bits per char", "bpc", "{:.3f}"), ("Top-1 accuracy", "accuracy", "{:.1%}"),
+                            ("Agrees with teacher", "agreement", "{:.1%}"),
+                            ("Suggestion (ms)", "latency_ms", "{:.2f}"), ("Parameters", "params", "{:,.0f}"),
+                            ("Weights in RAM (KB)", "weights_kb", "{:,.0f}"), ("File size (KB)", "file_kb", "{:,.0f}")):
+        ratio = st[key] / t[key] if t[key] else 0.0
+        print(f"  {label:<22}{fmt.format(t[key]):>12}{fmt.format(st[key]):>12}{ratio:>9.2f}x")
+    print("─" * 60)
+    print(f"  Serve it with MODEL_TIER=small (SMALL_MODEL_PATH={student_path})")
+
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -147,15 +425,59 @@ def main():
         print(f"   Skipped     : {skipped:,} chars not in vocabulary (emojis, special chars)")
     print()
 
+    # ── Resume ───────────────────────────────────────────────────────────────
+    resume, resume_weights = None, None
+    corpus = corpus_fingerprint(filtered)
+    if args.resume:
+        try:
+            resume, resume_weights = read_checkpoint(args.resume)
+        except Exception as e:
+            print(f"❌ Cannot resume from {args.resume}: {e}")
+            return
+        for key in RESUMED_SETTINGS:
+            setattr(args, key, resume["settings"].get(key, getattr(args, key)))
+        print(f"⏯️  Resuming {args.resume} after epoch {resume['epoch']} "
+              f"(lr={args.lr}, seq={args.seq}, hidden={args.hidden}, output={args.output})")
+        if resume["settings"]["corpus"] != corpus:
+            print("⚠️  The training text differs from the checkpoint's — the run will not match exactly")
+        if resume["epoch"] >= args.epochs:
+            print(f"❌ Checkpoint is already at epoch {resume['epoch']}; pass a larger --epochs")
+            return
+
     if len(filtered) < args.seq + 1:
         print(f"❌ Not enough in-vocabulary text to train (need > {args.seq} chars).")
         return
 
+    # ── Validation split (the tail of the corpus) ───────────────────────────
+    val_text = ""
+    if args.val_split > 0:
+        cut = int(len(filtered) * (1 - args.val_split))
+        if cut >= args.seq + 1 and len(filtered) - cut > 1:
+            filtered, val_text = filtered[:cut], filtered[cut:]
+            print(f"🧪 Validation  : last {len(val_text):,} chars held out")
+        else:
+            print("⚠️  Corpus too short for a validation split — training on all of it")
+
+    # ── Teacher (distillation) ───────────────────────────────────────────────
+    teacher = None
+    if args.distill_from:
+        if not os.path.exists(args.distill_from):
+            print(f"❌ Teacher weights not found: {args.distill_from}")
+            return
+        teacher = LSTM(voc, hidden_size=LSTM.hidden_size_of(args.distill_from))
+        teacher.load_weights(args.distill_from)
+        print(f"🎓 Teacher: {args.distill_from} (hidden {teacher.hidden_size}) → student hidden {args.hidden}")
+
     # ── Initialize model ─────────────────────────────────────────────────────
     model = LSTM(voc, hidden_size=args.hidden)
 
-    if args.from_scratch:
+    if resume is not None:
+        model.set_weight_arrays(resume_weights)
+    elif args.from_scratch:
         print("🆕 Starting with fresh random weights")
+    elif os.path.exists(args.output) and LSTM.hidden_size_of(args.output) != args.hidden:
+        print(f"⚠️  {args.output} has hidden size {LSTM.hidden_size_of(args.output)}, not {args.hidden} "
+              f"— starting with fresh weights")
     elif os.path.exists(args.output):
         try:
             model.load_weights(args.output)
@@ -173,12 +495,31 @@ def main():
     print(f"  ├─ Learning rate: {args.lr}")
     print(f"  ├─ Seq length  : {args.seq}")
     print(f"  ├─ Max seqs/ep : {args.max_seqs}")
+    if val_text:
+        print(f"  ├─ Validation  : {len(val_text):,} chars, patience {args.patience or 'off'}")
+    print(f"  ├─ Checkpoints : every {args.save_every} epoch(s), keep {args.keep_checkpoints or 'all'}")
+    if teacher is not None:
+        print(f"  ├─ Distill     : T={args.temperature}, alpha={args.alpha}, hidden {args.hidden}")
     print(f"  └─ Output      : {args.output}")
     print("─" * 60)
     print()
 
     # ── Train ────────────────────────────────────────────────────────────────
-    history = train(model, filtered, args.epochs, args.lr, args.seq, args.max_seqs, args.save_every, args.output)
+    settings = {key: getattr(args, key) for key in RESUMED_SETTINGS}
+    settings["corpus"] = corpus
+    checkpoints = CheckpointWriter(args.output, keep=args.keep_checkpoints)
+    try:
+        history = train(model, filtered, args.epochs, args.lr, args.seq, args.max_seqs, args.save_every,
+                        args.output, teacher=teacher, temperature=args.temperature if teacher else 1.0,
+                        alpha=args.alpha, checkpoints=checkpoints, settings=settings, resume=resume,
+                        val_text=val_text, patience=args.patience)
+    except KeyboardInterrupt:
+        checkpoints.close()
+        print()
+        print("⏸️  Interrupted. Continue with --resume and the newest checkpoint:")
+        print(f"   {args.output.replace('.npz', '_epoch*.npz')}")
+        return
+    checkpoints.close()
 
     if not history:
         return
@@ -194,6 +535,9 @@ def main():
     model.save_weights(ckpt)
     print(f"💾 Checkpoint  → {ckpt}")
 
+    if teacher is not None:
+        distill_report(teacher, model, val_text, args.seq, args.distill_from, args.output)
+
     # ── Summary ──────────────────────────────────────────────────────────────
     first_loss = history[0][1]
     final_loss = history[-1][1]
@@ -204,7 +548,10 @@ def main():
     print(f"  Training complete!")
     print(f"  ├─ Start loss  : {first_loss:.4f}")
     print(f"  ├─ Final loss  : {final_loss:.4f}")
-    print(f"  └─ Improvement : {improvement:.1f}%")
+    print(f"  {'├' if val_text else '└'}─ Improvement : {improvement:.1f}%")
+    if val_text:
+        best_epoch, _, best_val = min((h for h in history if h[2] is not None), key=lambda h: h[2])
+        print(f"  └─ Best val    : {best_val:.4f} ({best_val / np.log(2):.3f} bpc, epoch {best_epoch})")
     print("─" * 60)
 
     if improvement > 5: